@@ -6,4 +6,15 @@
 // Aplica o filtro Kuwahara na imagem de entrada
 void kuwahara_filter(int image[IMG_SIZE][IMG_SIZE], int window);
 
+// Mesmo filtro com dimensões em tempo de execução: lê 'input' e escreve
+// 'output' (buffers distintos, width*height inteiros em ordem de linhas)
+void kuwahara_filter_buffer(const int *input, int *output, int width, int height, int window);
+
+// Igual a kuwahara_filter_buffer, gravando também (se não forem NULL) o
+// índice 0-3 do quadrante escolhido, na ordem {1,1},{0,1},{1,0},{0,0}, e
+// o desvio padrão vencedor de cada pixel
+void kuwahara_filter_buffer_maps(const int *input, int *output,
+                                 unsigned char *quadrant_map, float *std_map,
+                                 int width, int height, int window);
+
 #endif
\ No newline at end of file
@@ -0,0 +1,301 @@
+"""
+Escolha automática de engine (main.py --engine auto).
+
+A engine mais rápida depende do tamanho da imagem, da janela e do número
+de CPUs. Na primeira vez, um micro-benchmark mede pykuwahara,
+pykuwahara-tiles e c em alguns tamanhos e janelas e ajusta, por engine,
+o modelo
+
+    tempo = a + b * pixels + c * pixels * (raio + 1)^2
+
+por mínimos quadrados com coeficientes >= 0 (conjunto ativo, nnls()). A
+escolha fica entre as engines de mesma saída na janela pedida: pykuwahara
+e pykuwahara-tiles sempre coincidem, mas o c só coincide com elas na
+janela 3 (nas maiores a pykuwahara se afasta do kernel em C, ver
+fuzz_filters.py da v2). O modelo fica em disco junto com a identidade da
+máquina (host, CPU, número de núcleos, versões do Python, numpy,
+pykuwahara e OpenCV, hash do kernel em C e método do ajuste); se algo
+disso muda, recalibra. Cada decisão (previsões e tempo real) vai para um log
+JSON Lines ao lado do modelo.
+
+Arquivos (em $KUWAHARA_CACHE, padrão ~/.cache/kuwahara):
+    autotune.json            modelo calibrado
+    autotune-decisions.jsonl decisões do --engine auto
+
+Uso:
+    python3 autotune.py                 (mostra o modelo e as escolhas previstas)
+    python3 autotune.py --recalibrate
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import time
+from datetime import datetime
+from importlib import metadata
+
+import numpy as np
+
+from main import ENGINES
+
+CACHE_DIR = os.environ.get('KUWAHARA_CACHE') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'kuwahara')
+MODEL_PATH = os.path.join(CACHE_DIR, 'autotune.json')
+DECISIONS_PATH = os.path.join(CACHE_DIR, 'autotune-decisions.jsonl')
+
+# Engines calibradas; o --engine auto escolhe entre as de mesma saída
+CANDIDATES = ('pykuwahara', 'pykuwahara-tiles', 'c')
+# Janelas em que a engine tem a mesma saída da pykuwahara (None = todas)
+PARITY_WINDOWS = {'pykuwahara': None, 'pykuwahara-tiles': None, 'c': (3,)}
+CALIBRATION_SIDES = (48, 160, 400)
+CALIBRATION_WINDOWS = (3, 9, 17)
+CALIBRATION_REPEAT = 3  # melhor de N
+MODEL_FIT = 'nnls'  # método do ajuste (modelos de outro método são refeitos)
+
+_model = None
+
+
+def package_version(*names):
+    """Versão do primeiro pacote instalado entre 'names'."""
+    for name in names:
+        try:
+            return metadata.version(name)
+        except metadata.PackageNotFoundError:
+            continue
+    return None
+
+
+def kernel_hash():
+    """Hash do fonte do kernel em C (muda quando o kernel é alterado)."""
+    from kuwahara_c import HEADER, SOURCE
+    digest = hashlib.sha1()
+    for path in (SOURCE, HEADER):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def fingerprint():
+    """O que, se mudar, invalida a calibração."""
+    return {
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pykuwahara': package_version('pykuwahara'),
+        'opencv': package_version('opencv-python', 'opencv-python-headless',
+                                  'opencv-contrib-python'),
+        'kernel': kernel_hash(),
+        'fit': MODEL_FIT,
+    }
+
+
+def features(pixels, window):
+    """Termos do modelo: constante, pixels, pixels * área do quadrante."""
+    return [1.0, pixels, pixels * (window // 2 + 1) ** 2]
+
+
+def nnls(a, b):
+    """
+    Mínimos quadrados com coeficientes >= 0 (conjunto ativo de
+    Lawson-Hanson; as colunas são normalizadas antes, os termos do modelo
+    têm escalas muito diferentes).
+
+    Returns:
+        np.ndarray: x >= 0 que minimiza |a @ x - b|
+    """
+    scale = np.linalg.norm(a, axis=0)
+    scale[scale == 0] = 1.0
+    a = a / scale
+    n = a.shape[1]
+    tol = 1e-10 * max(np.abs(a.T @ b).max(), 1e-300)
+    x = np.zeros(n)
+    passive = np.zeros(n, dtype=bool)
+    for _ in range(3 * n):
+        gradient = a.T @ (b - a @ x)
+        if passive.all() or gradient[~passive].max() <= tol:
+            break
+        passive[np.argmax(np.where(passive, -np.inf, gradient))] = True
+        while True:
+            z = np.zeros(n)
+            z[passive] = np.linalg.lstsq(a[:, passive], b, rcond=None)[0]
+            if (z[passive] > 0).all():
+                x = z
+                break
+            # Anda até o primeiro coeficiente zerar e o tira do conjunto
+            blocked = passive & (z <= 0)
+            step = np.min(x[blocked] / (x[blocked] - z[blocked]))
+            x = x + step * (z - x)
+            passive &= x > 0
+            x[~passive] = 0.0
+    return x / scale
+
+
+def calibrate(verbose=True):
+    """
+    Mede as engines candidatas e ajusta o modelo de cada uma.
+
+    Returns:
+        dict: {'fingerprint', 'created', 'engines': {nome: coeficientes},
+               'samples'}
+    """
+    rng = np.random.default_rng(0)
+    samples = []
+    engines = {}
+    for name in CANDIDATES:
+        filter_fn = ENGINES[name][0]
+        try:
+            filter_fn(rng.integers(0, 256, (16, 16)).astype(np.uint8), 3)  # aquecimento
+        except Exception as e:
+            if verbose:
+                print(f"  {name:<17} ✗ indisponível: {e}")
+            continue
+        rows, times = [], []
+        for side in CALIBRATION_SIDES:
+            image = rng.integers(0, 256, (side, side)).astype(np.uint8)
+            for window in CALIBRATION_WINDOWS:
+                best = float('inf')
+                for _ in range(CALIBRATION_REPEAT):
+                    start = time.perf_counter()
+                    filter_fn(image, window)
+                    best = min(best, time.perf_counter() - start)
+                rows.append(features(side * side, window))
+                times.append(best)
+                samples.append({'engine': name, 'side': side, 'window': window,
+                                'seconds': best})
+        engines[name] = [float(c) for c in nnls(np.array(rows), np.array(times))]
+        if verbose:
+            print(f"  {name:<17} calibrada ({len(times)} medidas, "
+                  f"maior {max(times) * 1000:.1f} ms)")
+    if not engines:
+        raise RuntimeError("Nenhuma engine candidata disponível para calibrar")
+    return {'fingerprint': fingerprint(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'engines': engines, 'samples': samples}
+
+
+def save_model(model, path=MODEL_PATH):
+    """Grava o modelo (escrita atômica)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(model, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_model(recalibrate=False, path=MODEL_PATH):
+    """
+    Modelo desta máquina: do disco se a identidade confere, senão calibra
+    (imprimindo o motivo) e grava.
+    """
+    global _model
+    if _model is not None and not recalibrate:
+        return _model
+    current = fingerprint()
+    reason = "recalibração pedida" if recalibrate else None
+    if reason is None:
+        try:
+            with open(path) as f:
+                model = json.load(f)
+        except FileNotFoundError:
+            reason = "primeiro uso"
+        except (OSError, ValueError) as e:
+            reason = f"modelo ilegível ({e})"
+        else:
+            changed = sorted(key for key in current
+                             if model.get('fingerprint', {}).get(key) != current[key])
+            if changed:
+                reason = f"mudou: {', '.join(changed)}"
+    if reason is not None:
+        print(f"  Calibrando engines ({reason})...")
+        model = calibrate()
+        save_model(model, path)
+    _model = model
+    return model
+
+
+def predict(model, shape, window):
+    """Tempo previsto (s) de cada engine calibrada."""
+    x = np.array(features(shape[0] * shape[1], window))
+    return {name: float(x @ np.array(coefficients))
+            for name, coefficients in model['engines'].items()}
+
+
+def candidates(window):
+    """Engines com a mesma saída nesta janela (o auto escolhe entre elas)."""
+    return [name for name in CANDIDATES
+            if PARITY_WINDOWS[name] is None or window in PARITY_WINDOWS[name]]
+
+
+def choose_engine(shape, window):
+    """
+    Engine prevista como a mais rápida para esta imagem/janela, entre as
+    de mesma saída (candidates()).
+
+    A escolhida é aquecida (importação, biblioteca C, pool de processos)
+    numa imagem pequena, para o tempo registrado ser só o do filtro.
+
+    Returns:
+        tuple: (nome, {engine: segundos previstos})
+    """
+    allowed = candidates(window)
+    predicted = {name: seconds
+                 for name, seconds in predict(load_model(), shape, window).items()
+                 if name in allowed}
+    if not predicted:
+        raise RuntimeError(f"Nenhuma engine calibrada com saída garantida na "
+                           f"janela {window} ({', '.join(allowed)})")
+    engine = min(predicted, key=predicted.get)
+    ENGINES[engine][0](np.zeros((8, 8), dtype=np.uint8), 3)
+    return engine, predicted
+
+
+def record_decision(image_path, shape, window, engine, predicted, seconds,
+                    path=DECISIONS_PATH):
+    """Acrescenta a decisão tomada ao log JSON Lines."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {'time': datetime.now().isoformat(timespec='seconds'),
+             'image': os.path.abspath(image_path), 'width': shape[1],
+             'height': shape[0], 'window': window, 'engine': engine,
+             'predicted': predicted, 'seconds': seconds}
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Modelo de desempenho das engines (main.py --engine auto)")
+    parser.add_argument('--recalibrate', action='store_true',
+                        help="Refaz a calibração mesmo com a máquina inalterada")
+    args = parser.parse_args()
+
+    model = load_model(recalibrate=args.recalibrate)
+    print(f"Modelo: {MODEL_PATH} (calibrado em {model['created']})")
+    for key, value in model['fingerprint'].items():
+        print(f"  {key:<11} {value}")
+    print("\nEscolha prevista (ms por imagem; * = escolhida, - = saída diferente):")
+    names = list(model['engines'])
+    print(f"  {'imagem':>11} {'janela':>6}  " + "".join(f"{n:>18}" for n in names))
+    for side in (90, 512, 2048):
+        for window in (3, 7, 15):
+            predicted = predict(model, (side, side), window)
+            allowed = [n for n in candidates(window) if n in predicted]
+            best = min(allowed, key=predicted.get)
+            # '-' = fora da escolha nesta janela (saída diferente)
+            cells = "".join(f"{predicted[n] * 1000:>17.2f}"
+                            f"{'*' if n == best else ' ' if n in allowed else '-'}"
+                            for n in names)
+            print(f"  {f'{side}x{side}':>11} {window:>6}  {cells}")
+    if os.path.exists(DECISIONS_PATH):
+        with open(DECISIONS_PATH) as f:
+            print(f"\n{sum(1 for _ in f)} decisões registradas em {DECISIONS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Cliente do filter_server.py, com a mesma interface do main.py.
+
+Não importa numpy nem as engines: manda o pedido pelo socket Unix e
+imprime o resultado, então o custo de cada chamada fica perto do tempo
+do filtro. Se o servidor não estiver rodando, filtra no próprio processo
+com o main.py (mesma saída, com o custo de inicialização de sempre).
+
+Uso:
+    python3 filter_client.py [imagens.pgm ...] [--engine c|auto] [--window 5] [--maps]
+    python3 filter_client.py --benchmark 10
+    python3 filter_client.py --compare ../../imgs_filtered/x.pgm imgs_filtered/x.pgm
+    python3 filter_client.py --status | --shutdown
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+DEFAULT_SOCKET = os.environ.get('KUWAHARA_SOCKET') or os.path.join(
+    tempfile.gettempdir(), f"kuwahara-{getattr(os, 'getuid', lambda: 0)()}.sock")
+
+# Mesma lista padrão do main.py (importá-lo traria o numpy junto)
+DEFAULT_IMAGES = [
+    "../imgs_original/mona_lisa.ascii.pgm",
+]
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class ServerUnavailable(Exception):
+    """Nenhum servidor escutando no socket."""
+
+
+def request(message, path=DEFAULT_SOCKET, timeout=None):
+    """
+    Envia um pedido (dict) e devolve a resposta do servidor.
+
+    Raises:
+        ServerUnavailable: socket inexistente ou sem servidor
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise ServerUnavailable("sem suporte a sockets Unix nesta plataforma")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ServerUnavailable(str(e)) from None
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        reply = bytearray()
+        while not reply.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    finally:
+        sock.close()
+    if not reply:
+        raise ServerUnavailable("conexão encerrada sem resposta")
+    return json.loads(reply)
+
+
+def run_local(args):
+    """Mesmo trabalho no próprio processo (servidor fora do ar)."""
+    sys.path.insert(0, SCRIPT_DIR)
+    if args.compare:
+        sys.path.insert(0, os.path.join(SCRIPT_DIR, 'test'))
+        from compare_images import compare_images, print_comparison_result
+        print_comparison_result(os.path.basename(args.compare[1]),
+                                compare_images(*args.compare))
+        return
+    import main
+    sys.argv = ['main.py', *args.images, '--engine', args.engine,
+                '--window', str(args.window)]
+    if args.maps:
+        sys.argv.append('--maps')
+    if args.benchmark:
+        sys.argv += ['--benchmark', str(args.benchmark)]
+    main.main()
+
+
+def print_filter_reply(images, reply, window, maps=False):
+    """Mesmas mensagens do main.py."""
+    for img_path, item in zip(images, reply['results']):
+        print(f"Processando: {img_path}")
+        if item.get('width'):
+            print(f"  Dimensões: {item['width']}x{item['height']}")
+            if 'predicted' in item:
+                print(f"  Engine automática: {item['engine']} (previsto "
+                      f"{item['predicted'] * 1000:.2f} ms)")
+            print(f"  Aplicando filtro Kuwahara [{item['engine']}] "
+                  f"(window={window}, radius={window // 2})...")
+        if item['ok']:
+            print(f"  ✓ Salvo: imgs_filtered/{os.path.basename(img_path)} "
+                  f"({item['seconds'] * 1000:.2f} ms no servidor)")
+            if 'map' in item:
+                print(f"  ✓ Mapa de quadrantes: imgs_filtered/"
+                      f"{os.path.basename(item['map'])}")
+            elif maps:
+                print(f"  ⚠ Engine {item['engine']} não gera mapa de quadrantes")
+            print()
+        else:
+            print(f"  ✗ Erro: {item['error']}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Filtro Kuwahara via servidor residente (interface do main.py)")
+    parser.add_argument('images', nargs='*', default=DEFAULT_IMAGES,
+                        help="Imagens PGM P2 de entrada")
+    parser.add_argument('--engine', default='pykuwahara',
+                        help="Implementação do filtro (padrão: pykuwahara; "
+                             "auto = mais rápida prevista na máquina do servidor)")
+    parser.add_argument('--window', type=int, default=3,
+                        help="Tamanho da janela, ímpar (padrão: 3)")
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help="Mede todas as engines (N repetições) sem gravar")
+    parser.add_argument('--maps', action='store_true',
+                        help="Grava também o mapa de quadrantes (<nome>.qmap; "
+                             "engines c, median)")
+    parser.add_argument('--compare', nargs=2, metavar=('C', 'PYTHON'),
+                        help="Compara duas imagens PGM (métricas do compare_images.py)")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help=f"Socket do servidor (padrão: {DEFAULT_SOCKET})")
+    parser.add_argument('--status', action='store_true', help="Estado do servidor")
+    parser.add_argument('--shutdown', action='store_true', help="Encerra o servidor")
+    args = parser.parse_args()
+
+    if args.status or args.shutdown:
+        try:
+            reply = request({'op': 'status' if args.status else 'shutdown'},
+                            args.socket)
+        except ServerUnavailable:
+            print(f"✗ Nenhum servidor em {args.socket}")
+            sys.exit(1)
+        print(json.dumps(reply, indent=2, ensure_ascii=False))
+        return
+
+    if args.compare:
+        message = {'op': 'compare',
+                   'pairs': [[os.path.abspath(p) for p in args.compare]]}
+    elif args.benchmark:
+        message = {'op': 'benchmark', 'window': args.window,
+                   'repeat': args.benchmark,
+                   'images': [os.path.abspath(p) for p in args.images]}
+    else:
+        message = {'op': 'filter', 'engine': args.engine, 'window': args.window,
+                   'images': [os.path.abspath(p) for p in args.images],
+                   'output_dir': os.path.abspath('imgs_filtered'),
+                   'maps': args.maps}
+
+    try:
+        reply = request(message, args.socket)
+    except ServerUnavailable:
+        print(f"(servidor indisponível em {args.socket}; executando localmente)",
+              file=sys.stderr)
+        run_local(args)
+        return
+
+    if not reply.get('ok', True):
+        # compare: relatório com o erro de cada par; demais: só 'error'
+        if reply.get('report'):
+            print(reply['report'], end='')
+        else:
+            print(f"✗ Erro: {reply.get('error', 'falha no servidor')}")
+        sys.exit(1)
+    if 'report' in reply:
+        print(reply['report'], end='')
+    else:
+        print_filter_reply(args.images, reply, args.window, args.maps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Servidor de filtragem residente (socket Unix)
+
+Cada execução do main.py paga a importação do numpy e do pykuwahara e a
+carga da biblioteca C antes do primeiro pixel, o que leva mais tempo que o
+próprio filtro numa imagem 90x90. Este servidor carrega tudo uma vez,
+aquece as engines e atende pedidos do filter_client.py (mesma interface do
+main.py) por um socket Unix.
+
+- Fila limitada (--queue): com a fila cheia o pedido é recusado com erro
+  em vez de acumular trabalho sem limite.
+- Workers aquecidos (--workers): cada um retira até --batch trabalhos de
+  uma vez e os executa agrupados por engine/janela.
+- Buffers pré-alocados: a engine 'c' reaproveita, por worker e por forma
+  de imagem, os arrays int32 de entrada e saída passados ao kernel.
+
+Protocolo: uma conexão por pedido, uma linha JSON de ida e uma de volta.
+    {"op": "filter", "images": [...], "engine": "c", "window": 3,
+     "output_dir": "/abs/imgs_filtered", "maps": false}
+     (engine "auto" escolhe por imagem com o autotune.py, como o main.py)
+    {"op": "compare", "pairs": [["c.pgm", "python.pgm"], ...]}
+    {"op": "benchmark", "images": [...], "window": 3, "repeat": 10}
+    {"op": "status"}   {"op": "shutdown"}
+
+Uso:
+    python3 filter_server.py [--socket CAMINHO] [--workers 1] [--queue 64]
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from filter_client import DEFAULT_SOCKET, ServerUnavailable, request
+from main import (ENGINES, MAP_ENGINES, QUADRANT_MAP_SUFFIX, benchmark,
+                  read_pgm_p2, write_pgm_p2, write_quadrant_map)
+from pgm_io import pgm_stem
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test'))
+from compare_images import compare_images, print_comparison_result  # noqa: E402
+
+DEFAULT_WORKERS = 1
+DEFAULT_QUEUE = 64
+DEFAULT_BATCH = 8
+SUBMIT_TIMEOUT = 0.5  # s esperando vaga na fila antes de recusar
+WARMUP_SHAPE = (16, 16)
+
+# benchmark() e print_comparison_result() escrevem em sys.stdout, que não
+# é por thread: a captura da saída é serializada
+_stdout_lock = threading.Lock()
+
+
+class Job:
+    """Um trabalho na fila: filtrar uma imagem, comparar um par, etc."""
+
+    __slots__ = ('kind', 'key', 'params', 'result', 'done')
+
+    def __init__(self, kind, params, key=()):
+        self.kind = kind
+        self.key = key
+        self.params = params
+        self.result = None
+        self.done = threading.Event()
+
+
+def captured(fn, *args):
+    """Executa fn capturando o que ela imprime."""
+    buffer = io.StringIO()
+    with _stdout_lock, contextlib.redirect_stdout(buffer):
+        fn(*args)
+    return buffer.getvalue()
+
+
+def to_json(value):
+    """Converte tipos numpy (e tuplas/infinito) para JSON."""
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return str(value)
+    return value
+
+
+class Worker:
+    """Thread de filtragem com os buffers da engine C pré-alocados."""
+
+    def __init__(self, server):
+        self.server = server
+        self.buffers = {}  # forma -> (entrada int32, saída int32)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def filter_image(self, engine, image, window):
+        if engine != 'c':
+            return ENGINES[engine][0](image, window)
+        if image.shape not in self.buffers:
+            self.buffers[image.shape] = (np.empty(image.shape, np.intc),
+                                         np.empty(image.shape, np.intc))
+        src, out = self.buffers[image.shape]
+        np.copyto(src, image)
+        self.server.kuwahara_c(src, window, out=out)
+        return np.clip(out, 0, 255).astype(np.uint8)
+
+    def execute(self, job):
+        p = job.params
+        if job.kind == 'filter':
+            start = time.perf_counter()
+            image = read_pgm_p2(p['image'])
+            engine, predicted = p['engine'], None
+            if engine == 'auto':
+                from autotune import choose_engine
+                engine, predicted = choose_engine(image.shape, p['window'])
+            filter_start = time.perf_counter()
+            maps = None
+            if p.get('maps') and engine in MAP_ENGINES:
+                filtered, *maps = MAP_ENGINES[engine](image, p['window'])
+            else:
+                filtered = self.filter_image(engine, image, p['window'])
+            if predicted is not None:
+                from autotune import record_decision
+                record_decision(p['image'], image.shape, p['window'], engine,
+                                predicted, time.perf_counter() - filter_start)
+            filename = os.path.basename(p['image'])
+            output_path = os.path.join(p['output_dir'], filename)
+            write_pgm_p2(output_path, filtered, ENGINES[engine][1])
+            result = {'ok': True, 'engine': engine, 'width': image.shape[1],
+                      'height': image.shape[0], 'output': output_path}
+            if predicted is not None:
+                result['predicted'] = predicted[engine]
+            if maps is not None:
+                result['map'] = os.path.join(
+                    p['output_dir'], pgm_stem(filename) + QUADRANT_MAP_SUFFIX)
+                write_quadrant_map(result['map'], *maps)
+            result['seconds'] = time.perf_counter() - start
+            return result
+        if job.kind == 'compare':
+            result = compare_images(p['c'], p['python'])
+            report = captured(print_comparison_result,
+                              os.path.basename(p['python']), result)
+            return {'ok': 'error' not in result, 'result': to_json(result),
+                    'report': report}
+        if job.kind == 'benchmark':
+            return {'ok': True, 'report': captured(benchmark, p['images'],
+                                                   p['window'], p['repeat'])}
+        raise ValueError(f"Trabalho desconhecido: {job.kind}")
+
+    def run(self):
+        jobs = self.server.jobs
+        while True:
+            batch = [jobs.get()]
+            while len(batch) < self.server.batch_size:
+                try:
+                    batch.append(jobs.get_nowait())
+                except queue.Empty:
+                    break
+            # Agrupa por engine/janela: mesmo buffer e mesmo código quentes
+            batch.sort(key=lambda job: (job is None, job and job.key))
+            for job in batch:
+                if job is None:  # sentinela de encerramento
+                    return
+                try:
+                    job.result = self.execute(job)
+                except Exception as e:
+                    job.result = {'ok': False, 'error': str(e)}
+                with self.server.lock:
+                    self.server.stats['jobs'] += 1
+                job.done.set()
+            with self.server.lock:
+                self.server.stats['batches'] += 1
+
+
+class FilterServer:
+    """Aceita conexões, enfileira trabalhos e devolve os resultados."""
+
+    def __init__(self, path, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE,
+                 batch_size=DEFAULT_BATCH):
+        self.path = path
+        self.batch_size = batch_size
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.started = time.time()
+        self.stats = {'requests': 0, 'jobs': 0, 'batches': 0, 'rejected': 0}
+        self.engines = {}
+        self.kuwahara_c = None
+        self.workers = [Worker(self) for _ in range(workers)]
+
+    def warm_up(self):
+        """Importa e executa cada engine uma vez (compila o kernel C se preciso)."""
+        image = np.random.default_rng(0).integers(0, 256, WARMUP_SHAPE, np.uint8)
+        for name, (filter_fn, _) in ENGINES.items():
+            start = time.perf_counter()
+            try:
+                filter_fn(image, 3)
+                self.engines[name] = f"ok ({(time.perf_counter() - start) * 1000:.0f} ms)"
+            except Exception as e:
+                self.engines[name] = f"indisponível: {e}"
+        if self.engines['c'].startswith('ok'):
+            from kuwahara_c import kuwahara_c
+            self.kuwahara_c = kuwahara_c
+
+    def submit(self, jobs):
+        """Enfileira os trabalhos; os que não couberem recebem erro de fila cheia."""
+        for job in jobs:
+            try:
+                self.jobs.put(job, timeout=SUBMIT_TIMEOUT)
+            except queue.Full:
+                job.result = {'ok': False, 'error': "servidor ocupado (fila cheia)"}
+                with self.lock:
+                    self.stats['rejected'] += 1
+                job.done.set()
+        for job in jobs:
+            job.done.wait()
+        return [job.result for job in jobs]
+
+    def handle(self, message):
+        op = message.get('op')
+        if op == 'status':
+            with self.lock:
+                stats = dict(self.stats)
+            return {'ok': True, 'pid': os.getpid(), 'socket': self.path,
+                    'uptime_s': round(time.time() - self.started, 1),
+                    'engines': self.engines, 'workers': len(self.workers),
+                    'queue': f"{self.jobs.qsize()}/{self.jobs.maxsize}", **stats}
+        if op == 'shutdown':
+            self.stop.set()
+            return {'ok': True, 'message': "servidor encerrando"}
+
+        if op == 'filter':
+            engine, window = message.get('engine'), int(message.get('window', 3))
+            if engine not in ENGINES and engine != 'auto':
+                return {'ok': False, 'error': f"Engine desconhecida: {engine} "
+                                              f"(disponíveis: {', '.join(sorted(ENGINES))}, auto)"}
+            os.makedirs(message['output_dir'], exist_ok=True)
+            jobs = [Job('filter', {'image': path, 'engine': engine, 'window': window,
+                                   'output_dir': message['output_dir'],
+                                   'maps': bool(message.get('maps'))},
+                        key=(engine, window))
+                    for path in message['images']]
+            return {'ok': True, 'results': self.submit(jobs)}
+        if op == 'compare':
+            jobs = [Job('compare', {'c': c_path, 'python': py_path})
+                    for c_path, py_path in message['pairs']]
+            results = self.submit(jobs)
+            return {'ok': all(r['ok'] for r in results), 'results': results,
+                    'report': ''.join(r.get('report', f"[X] ERRO: {r.get('error')}\n")
+                                      for r in results)}
+        if op == 'benchmark':
+            (result,) = self.submit([Job('benchmark', {
+                'images': message['images'], 'window': int(message.get('window', 3)),
+                'repeat': int(message.get('repeat', 10))})])
+            return result
+        return {'ok': False, 'error': f"Operação desconhecida: {op}"}
+
+    def serve_connection(self, conn):
+        with conn:
+            data = bytearray()
+            while not data.endswith(b'\n'):
+                chunk = conn.recv(65536)
+                if not chunk:
+                    return
+                data += chunk
+            with self.lock:
+                self.stats['requests'] += 1
+            try:
+                reply = self.handle(json.loads(data))
+            except Exception as e:
+                reply = {'ok': False, 'error': f"Pedido inválido: {e}"}
+            with contextlib.suppress(OSError):
+                conn.sendall(json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def bind(self):
+        """Cria o socket, removendo um arquivo órfão de execução anterior."""
+        if os.path.exists(self.path):
+            try:
+                request({'op': 'status'}, self.path, timeout=1)
+            except (ServerUnavailable, OSError, ValueError):
+                os.unlink(self.path)
+            else:
+                raise RuntimeError(f"Já existe um servidor em {self.path}")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)  # socket acessível só ao dono
+        try:
+            listener.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        listener.listen(self.jobs.maxsize)
+        listener.settimeout(0.2)
+        return listener
+
+    def serve(self):
+        listener = self.bind()
+        for worker in self.workers:
+            worker.thread.start()
+        print(f"Servidor Kuwahara em {self.path} (pid {os.getpid()}, "
+              f"{len(self.workers)} worker(s), fila {self.jobs.maxsize})")
+        for name, state in self.engines.items():
+            print(f"  {name:<12} {state}")
+        try:
+            while not self.stop.is_set():
+                try:
+                    conn, _ = listener.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                threading.Thread(target=self.serve_connection, args=(conn,),
+                                 daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+            for _ in self.workers:
+                self.jobs.put(None)
+            print("Servidor encerrado")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Servidor residente do filtro Kuwahara (socket Unix)")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help=f"Caminho do socket (padrão: {DEFAULT_SOCKET}, "
+                             "ou $KUWAHARA_SOCKET)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Threads de filtragem (padrão: {DEFAULT_WORKERS})")
+    parser.add_argument('--queue', type=int, default=DEFAULT_QUEUE,
+                        help=f"Tamanho máximo da fila (padrão: {DEFAULT_QUEUE})")
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH,
+                        help=f"Trabalhos por rodada de cada worker (padrão: {DEFAULT_BATCH})")
+    args = parser.parse_args()
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print("[X] Sockets Unix não disponíveis nesta plataforma")
+        sys.exit(1)
+
+    server = FilterServer(args.socket, args.workers, args.queue, args.batch)
+    server.warm_up()
+    try:
+        server.serve()
+    except RuntimeError as e:
+        print(f"[X] {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
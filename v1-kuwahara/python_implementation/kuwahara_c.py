@@ -0,0 +1,140 @@
+"""
+Binding ctypes do kernel em C (src/kuwahara.c).
+
+Compila o kernel como biblioteca compartilhada (build/libkuwahara.so, ou
+kuwahara.dll no Windows) na primeira chamada e sempre que o fonte muda, e
+chama kuwahara_filter_buffer() com largura, altura e janela em tempo de
+execução. Os arrays numpy vão direto para o C: uma imagem int32 contígua
+não é copiada e a saída é escrita no array devolvido, sem arquivos PGM
+no meio. Com maps=True chama kuwahara_filter_buffer_maps(), que devolve
+também o quadrante escolhido (0-3) e o desvio vencedor de cada pixel.
+
+Compilação manual (equivalente):
+    gcc -O2 -shared -fPIC ../src/kuwahara.c -o build/libkuwahara.so -lm
+
+Autor: Roberta Alanis
+"""
+
+import ctypes
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+V1_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(V1_DIR, 'src', 'kuwahara.c')
+HEADER = os.path.join(V1_DIR, 'include', 'kuwahara.h')
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build')
+LIB_PATH = os.path.join(BUILD_DIR, 'kuwahara.dll' if sys.platform == 'win32'
+                        else 'libkuwahara.so')
+
+_lib = None
+
+
+def build_library(force=False):
+    """
+    Compila o kernel se a biblioteca não existe ou é mais velha que o fonte.
+
+    O compilador vem de $CC (padrão: gcc). A saída vai para um arquivo
+    temporário em BUILD_DIR e é movida para LIB_PATH com os.replace(), então
+    processos que compilam ao mesmo tempo (servidor, fuzzer, autotune, vários
+    main.py) nunca carregam uma biblioteca pela metade.
+
+    Returns:
+        str: Caminho da biblioteca
+    """
+    sources_mtime = max(os.path.getmtime(SOURCE), os.path.getmtime(HEADER))
+    if (not force and os.path.exists(LIB_PATH)
+            and os.path.getmtime(LIB_PATH) >= sources_mtime):
+        return LIB_PATH
+
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(LIB_PATH)[1],
+                                    dir=BUILD_DIR)
+    os.close(fd)
+    cmd = [os.environ.get('CC', 'gcc'), '-O2', '-shared', SOURCE,
+           '-o', tmp_path, '-lm']
+    if sys.platform != 'win32':
+        cmd.insert(2, '-fPIC')
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        os.replace(tmp_path, LIB_PATH)
+    except FileNotFoundError:
+        raise RuntimeError(f"Compilador não encontrado: {cmd[0]} "
+                           "(defina CC)") from None
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Falha ao compilar {SOURCE}:\n{e.stderr}") from None
+    except OSError:
+        # Windows: a DLL em uso por outro processo não pode ser trocada;
+        # serve se esse processo já a compilou do fonte atual
+        if not (os.path.exists(LIB_PATH)
+                and os.path.getmtime(LIB_PATH) >= sources_mtime):
+            raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return LIB_PATH
+
+
+def load_library():
+    """Carrega a biblioteca (compilando se preciso) e declara a assinatura."""
+    global _lib
+    if _lib is None:
+        lib = ctypes.CDLL(build_library())
+        buffer = np.ctypeslib.ndpointer(dtype=np.intc, ndim=2,
+                                        flags='C_CONTIGUOUS')
+        lib.kuwahara_filter_buffer.argtypes = [buffer, buffer, ctypes.c_int,
+                                               ctypes.c_int, ctypes.c_int]
+        lib.kuwahara_filter_buffer.restype = None
+        quadrants = np.ctypeslib.ndpointer(dtype=np.uint8, ndim=2,
+                                           flags='C_CONTIGUOUS')
+        stds = np.ctypeslib.ndpointer(dtype=np.float32, ndim=2,
+                                      flags='C_CONTIGUOUS')
+        lib.kuwahara_filter_buffer_maps.argtypes = [
+            buffer, buffer, quadrants, stds, ctypes.c_int, ctypes.c_int,
+            ctypes.c_int]
+        lib.kuwahara_filter_buffer_maps.restype = None
+        _lib = lib
+    return _lib
+
+
+def kuwahara_c(image, window=3, out=None, maps=False):
+    """
+    Aplica o filtro Kuwahara do kernel em C.
+
+    Args:
+        image: Imagem 2D (qualquer inteiro; int32 contíguo vai sem cópia)
+        window: Tamanho da janela (ímpar, >= 3)
+        out: Array int32 contíguo de mesma forma para receber o resultado
+             (reaproveitado entre chamadas; padrão: um novo); não pode
+             sobrepor a imagem
+        maps: Devolve também o mapa de quadrantes e o desvio vencedor
+
+    Returns:
+        np.ndarray: Imagem filtrada (int32, mesmas dimensões); com maps,
+        tupla (imagem, quadrante uint8, desvio float32)
+    """
+    if window < 3 or window % 2 == 0:
+        raise ValueError(f"Janela deve ser ímpar e >= 3, recebido {window}")
+    src = np.ascontiguousarray(image, dtype=np.intc)
+    if src.ndim != 2:
+        raise ValueError(f"Esperada imagem 2D, recebido shape {src.shape}")
+    if out is None:
+        out = np.empty_like(src)
+    elif (out.shape != src.shape or out.dtype != np.intc
+          or not out.flags.c_contiguous):
+        raise ValueError("'out' deve ser int32 contíguo com a forma da imagem")
+    elif np.shares_memory(src, out):
+        # O kernel leria vizinhos já sobrescritos
+        raise ValueError("'out' não pode compartilhar memória com a imagem")
+    height, width = src.shape
+    if not maps:
+        load_library().kuwahara_filter_buffer(src, out, width, height, window)
+        return out
+    quadrant = np.empty(src.shape, dtype=np.uint8)
+    std = np.empty(src.shape, dtype=np.float32)
+    load_library().kuwahara_filter_buffer_maps(src, out, quadrant, std,
+                                               width, height, window)
+    return out, quadrant, std
@@ -0,0 +1,247 @@
+"""
+Kuwahara generalizado com setores suaves (método 'sectors').
+
+Os 4 quadrantes quadrados do kernel em C geram artefatos em blocos. Aqui
+a vizinhança circular de raio r é dividida em N setores angulares (8 por
+padrão) com pesos suaves: cada pixel da vizinhança pesa
+exp(sharpness * cos(ângulo - centro do setor)), normalizado para que os
+setores somem 1, vezes uma gaussiana radial de sigma r/2. Para cada setor
+saem média e variância ponderadas, e a saída combina as médias com peso
+1 / (1 + (variância / 255) ^ (q / 2)), como no Kuwahara generalizado de
+Papari/Kyprianidis: setores homogêneos dominam, sem escolha dura.
+
+Médias e variâncias são convoluções da imagem e do seu quadrado com os
+kernels dos setores: direto (soma das fatias deslocadas) para kernels
+pequenos e por FFT para os grandes, com bordas BORDER_REFLECT_101. Os
+kernels ficam em cache por (raio, setores, sharpness) e os seus
+espectros também pela forma da imagem.
+
+Uso:
+    python3 kuwahara_sectors.py --check            (direto x FFT, imagem constante)
+    python3 kuwahara_sectors.py --benchmark 256    (tempo direto x FFT por raio)
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import functools
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+DEFAULT_SECTORS = 8
+DEFAULT_SHARPNESS = 8.0
+DEFAULT_Q = 8.0
+# Acima deste número de taps (2r+1)^2 a FFT ganha da convolução direta
+# (medido com --benchmark em 90x90 e 256x256: a partir da janela 9)
+DIRECT_MAX_TAPS = 49
+MODES = ('auto', 'direct', 'fft')
+
+
+def reflect_indices(indices, size):
+    """BORDER_REFLECT_101 seguido de clamp, como em src/kuwahara.c."""
+    indices = np.where(indices < 0, -indices, indices)
+    indices = np.where(indices >= size, 2 * size - indices - 2, indices)
+    return np.clip(indices, 0, size - 1)
+
+
+@functools.lru_cache(maxsize=32)
+def sector_kernels(radius, sectors=DEFAULT_SECTORS, sharpness=DEFAULT_SHARPNESS):
+    """
+    Kernels dos setores, cada um normalizado para somar 1.
+
+    Returns:
+        np.ndarray: (setores, 2r+1, 2r+1), float64, somente leitura
+    """
+    offsets = np.arange(-radius, radius + 1)
+    dy, dx = np.meshgrid(offsets, offsets, indexing='ij')
+    distance = np.hypot(dy, dx)
+    angle = np.arctan2(dy, dx)
+    centers = 2 * np.pi * np.arange(sectors) / sectors
+
+    angular = np.exp(sharpness * np.cos(angle[None] - centers[:, None, None]))
+    angular /= angular.sum(axis=0)
+    # O pixel central não tem direção: conta igual para todos os setores
+    angular[:, radius, radius] = 1.0 / sectors
+
+    radial = np.exp(-distance ** 2 / (2 * (radius / 2) ** 2))
+    radial[distance > radius + 0.5] = 0.0
+
+    kernels = angular * radial
+    kernels /= kernels.sum(axis=(1, 2), keepdims=True)
+    kernels.flags.writeable = False
+    return kernels
+
+
+def fast_length(n):
+    """Menor inteiro >= n sem fatores primos além de 2, 3 e 5 (FFT rápida)."""
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
+@functools.lru_cache(maxsize=16)
+def kernel_spectra(radius, sectors, sharpness, shape):
+    """Espectros (rfft2) dos kernels espelhados no tamanho da FFT."""
+    flipped = sector_kernels(radius, sectors, sharpness)[:, ::-1, ::-1]
+    spectra = np.fft.rfft2(flipped, s=shape)
+    spectra.flags.writeable = False
+    return spectra
+
+
+def correlate_direct(padded, kernels):
+    """Correlação 'valid' somando as fatias deslocadas: (N, H, W)."""
+    size = kernels.shape[-1]
+    windows = sliding_window_view(padded, (size, size))
+    return np.einsum('yxij,nij->nyx', windows, kernels, optimize=True)
+
+
+def correlate_fft(padded, radius, sectors, sharpness):
+    """
+    Correlação 'valid' por FFT circular (tamanho >= imagem com borda,
+    arredondado para uma FFT rápida): a região sem efeito da volta começa
+    em 2r.
+    """
+    height, width = padded.shape
+    shape = (fast_length(height), fast_length(width))
+    spectra = kernel_spectra(radius, sectors, sharpness, shape)
+    full = np.fft.irfft2(np.fft.rfft2(padded, s=shape)[None] * spectra, s=shape)
+    return full[:, 2 * radius:height, 2 * radius:width]
+
+
+def sector_statistics(image, radius, sectors=DEFAULT_SECTORS,
+                      sharpness=DEFAULT_SHARPNESS, mode='auto'):
+    """
+    Médias e variâncias ponderadas de cada setor em cada pixel.
+
+    Returns:
+        tuple: (médias, variâncias), cada uma (setores, altura, largura)
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo desconhecido: {mode} (use {', '.join(MODES)})")
+    height, width = image.shape
+    ys = reflect_indices(np.arange(-radius, height + radius), height)
+    xs = reflect_indices(np.arange(-radius, width + radius), width)
+    padded = image.astype(np.float64)[ys[:, None], xs[None, :]]
+
+    if mode == 'auto':
+        mode = 'direct' if (2 * radius + 1) ** 2 <= DIRECT_MAX_TAPS else 'fft'
+    if mode == 'direct':
+        kernels = sector_kernels(radius, sectors, sharpness)
+        means = correlate_direct(padded, kernels)
+        squares = correlate_direct(padded * padded, kernels)
+    else:
+        means = correlate_fft(padded, radius, sectors, sharpness)
+        squares = correlate_fft(padded * padded, radius, sectors, sharpness)
+    return means, np.maximum(squares - means * means, 0.0)
+
+
+def kuwahara_sectors(image, window=3, sectors=DEFAULT_SECTORS,
+                     sharpness=DEFAULT_SHARPNESS, q=DEFAULT_Q, mode='auto'):
+    """
+    Filtro Kuwahara generalizado por setores.
+
+    Args:
+        image: Imagem 2D em tons de cinza (0..255)
+        window: Tamanho da janela (ímpar, >= 3); raio = window // 2
+        sectors: Número de setores angulares
+        sharpness: Nitidez da fronteira entre setores (0 = todos iguais)
+        q: Expoente da ponderação pela variância (maior = escolha mais dura)
+        mode: 'direct', 'fft' ou 'auto' (pelo tamanho do kernel)
+
+    Returns:
+        np.ndarray: Imagem filtrada (uint8, mesmas dimensões)
+    """
+    return np.clip(np.rint(kuwahara_sectors_float(
+        image, window, sectors, sharpness, q, mode)), 0, 255).astype(np.uint8)
+
+
+def kuwahara_sectors_float(image, window=3, sectors=DEFAULT_SECTORS,
+                           sharpness=DEFAULT_SHARPNESS, q=DEFAULT_Q, mode='auto'):
+    """kuwahara_sectors() antes do arredondamento (float64)."""
+    if window < 3 or window % 2 == 0:
+        raise ValueError(f"Janela deve ser ímpar e >= 3, recebido {window}")
+    image = np.asarray(image)
+    if image.ndim != 2:
+        raise ValueError(f"Esperada imagem 2D, recebido shape {image.shape}")
+    means, variances = sector_statistics(image, window // 2, sectors,
+                                         float(sharpness), mode)
+    weights = 1.0 / (1.0 + (variances / 255.0) ** (q / 2))
+    return (weights * means).sum(axis=0) / weights.sum(axis=0)
+
+
+def check(seed=0):
+    """
+    Confere direto x FFT em imagens aleatórias e que uma imagem constante
+    não muda.
+
+    Returns:
+        int: Número de falhas
+    """
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for case in range(40):
+        height, width = rng.integers(1, 40, size=2)
+        image = rng.integers(0, 256, size=(height, width)).astype(np.uint8)
+        window = int(rng.choice([3, 5, 7, 9, 13]))
+        sectors = int(rng.choice([4, 8, 12]))
+        direct = kuwahara_sectors_float(image, window, sectors, mode='direct')
+        fft = kuwahara_sectors_float(image, window, sectors, mode='fft')
+        error = np.abs(direct - fft).max()
+        if error > 1e-6:
+            failures += 1
+            print(f"  ✗ caso {case}: {width}x{height}, janela {window}, "
+                  f"{sectors} setores: direto x FFT diferem {error:.2e}")
+    for mode in ('direct', 'fft'):
+        flat = np.full((17, 23), 137, dtype=np.uint8)
+        if not np.array_equal(kuwahara_sectors(flat, 7, mode=mode), flat):
+            failures += 1
+            print(f"  ✗ imagem constante alterada ({mode})")
+    return failures
+
+
+def benchmark(side, windows=(3, 5, 7, 9, 11, 15, 21, 31)):
+    """Tempo direto x FFT numa imagem side x side, por janela."""
+    image = np.random.default_rng(0).integers(0, 256, (side, side)).astype(np.uint8)
+    print(f"Imagem {side}x{side}, {DEFAULT_SECTORS} setores")
+    for window in windows:
+        times = {}
+        for mode in ('direct', 'fft'):
+            kuwahara_sectors(image, window, mode=mode)  # cache dos kernels
+            start = time.perf_counter()
+            kuwahara_sectors(image, window, mode=mode)
+            times[mode] = time.perf_counter() - start
+        auto = 'direct' if (window // 2 * 2 + 1) ** 2 <= DIRECT_MAX_TAPS else 'fft'
+        print(f"  janela {window:3d}: direto {times['direct'] * 1000:8.1f} ms   "
+              f"FFT {times['fft'] * 1000:8.1f} ms   (auto: {auto})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kuwahara generalizado por setores")
+    parser.add_argument('--check', action='store_true',
+                        help="Confere direto x FFT e imagem constante")
+    parser.add_argument('--benchmark', type=int, metavar='LADO',
+                        help="Mede direto x FFT numa imagem LADO x LADO")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    if args.check:
+        failures = check()
+        if failures:
+            print(f"✗ {failures} falhas")
+            sys.exit(1)
+        print("✓ Direto e FFT concordam; imagem constante preservada")
+    if not (args.check or args.benchmark):
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
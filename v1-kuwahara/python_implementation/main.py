@@ -1,17 +1,56 @@
 """
 Filtro Kuwahara usando biblioteca pykuwahara
 Lê imagens PGM formato P2, aplica o filtro e salva em P2
+
+Engines (--engine):
+    pykuwahara  biblioteca pykuwahara (padrão)
+    pykuwahara-tiles
+                pykuwahara em faixas de linhas num pool de processos
+    c           kernel em C da v1 (src/kuwahara.c) via ctypes, ver kuwahara_c.py
+    median      variante de mediana por histograma deslizante, ver
+                kuwahara_median.py (method='median')
+    gaussian    pykuwahara com method='gaussian'
+    sectors     Kuwahara generalizado de 8 setores suaves, ver
+                kuwahara_sectors.py (method='sectors')
+    auto        escolhe entre pykuwahara, pykuwahara-tiles e c pelo modelo
+                de desempenho calibrado nesta máquina, ver autotune.py
+
+Com --maps, as engines c e median gravam também o mapa do quadrante
+escolhido (0-3) e do desvio vencedor de cada pixel em
+imgs_filtered/<nome>.qmap (formato .npz, arrays 'quadrant' e 'std'),
+lido pela camada de quadrantes do test/compare_images.py e do
+compare_filtered.py da v2.
+
+Entradas e saídas podem ser .pgm, .pgm.gz/.zst/.xz/.bz2 ou .npz (pgm_io.py
+da v2, importado de v2-kuwahara/python_script); a saída mantém o formato
+da entrada.
+
+Uso:
+    python3 main.py [imagens.pgm ...] [--engine c] [--window 5] [--maps]
+    python3 main.py --benchmark 10     (tempo de cada engine, sem E/S)
 """
 
-import cv2
-import numpy as np
-from pykuwahara import kuwahara
+import argparse
 import os
+import sys
+import time
+
+import numpy as np
+
+# pgm_io.py é um só, o da v2 (no fim do caminho: os módulos da v1 vêm antes)
+V2_PYTHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', 'v2-kuwahara', 'python_script')
+if V2_PYTHON_DIR not in sys.path:
+    sys.path.append(V2_PYTHON_DIR)
+from pgm_io import open_pgm, pgm_stem, read_npz, storage_format, write_npz  # noqa: E402
 
 
 def read_pgm_p2(filepath):
-    """Lê arquivo PGM formato P2 (ASCII)"""
-    with open(filepath, 'r') as f:
+    """Lê arquivo PGM formato P2 (ASCII), comprimido ou .npz"""
+    if storage_format(filepath) == 'npz':
+        return read_npz(filepath)[0].astype(np.uint8)
+
+    with open_pgm(filepath, 'rt') as f:
         # Lê o número mágico
         magic = f.readline().strip()
         if magic != 'P2':
@@ -38,13 +77,17 @@ def read_pgm_p2(filepath):
         return image
 
 
-def write_pgm_p2(filepath, image):
-    """Escreve arquivo PGM formato P2 (ASCII)"""
+def write_pgm_p2(filepath, image, comment="Kuwahara filtered (pykuwahara library)"):
+    """Escreve arquivo PGM formato P2 (ASCII), comprimido ou .npz pelo sufixo"""
+    if storage_format(filepath) == 'npz':
+        write_npz(filepath, image, 255)
+        return
+
     height, width = image.shape
 
-    with open(filepath, 'w') as f:
+    with open_pgm(filepath, 'wt') as f:
         f.write("P2\n")
-        f.write("# Kuwahara filtered (pykuwahara library)\n")
+        f.write(f"# {comment}\n")
         f.write(f"{width} {height}\n")
         f.write("255\n")
 
@@ -61,21 +104,170 @@ def write_pgm_p2(filepath, image):
             f.write("\n")
 
 
-def main():
-    # Lista de imagens para processar
-    images = [
-        "../imgs_original/mona_lisa.ascii.pgm",
-        # "../imgs_original/pepper.ascii.pgm",
-    ]
+def filter_pykuwahara(image, window):
+    """Kuwahara (média) da biblioteca pykuwahara, radius = window // 2."""
+    from pykuwahara import kuwahara
+    filtered = kuwahara(image, method='mean', radius=window // 2)
+    # Garante que valores estão no range correto
+    return np.clip(filtered, 0, 255).astype(np.uint8)
+
+
+_tile_pool = None
+
+
+def filter_pykuwahara_tiles(image, window):
+    """
+    pykuwahara em faixas de linhas, uma por CPU, num pool de processos.
+
+    Cada faixa leva 'raio' linhas vizinhas de cada lado (descartadas
+    depois), então o resultado é idêntico ao da imagem inteira.
+    """
+    global _tile_pool
+    from concurrent.futures import ProcessPoolExecutor
+    workers = os.cpu_count() or 1
+    if _tile_pool is None:
+        _tile_pool = ProcessPoolExecutor(workers)
+    height = image.shape[0]
+    radius = window // 2
+    bounds = np.linspace(0, height, min(workers, height) + 1).astype(int)
+    tops = [max(0, start - radius) for start in bounds[:-1]]
+    tiles = [image[top:min(height, end + radius)]
+             for top, end in zip(tops, bounds[1:])]
+    filtered = _tile_pool.map(filter_pykuwahara, tiles, [window] * len(tiles))
+    return np.concatenate([tile[start - top:end - top] for tile, top, start, end
+                           in zip(filtered, tops, bounds[:-1], bounds[1:])])
+
+
+def filter_c(image, window):
+    """Kuwahara do kernel em C da v1, chamado em processo."""
+    from kuwahara_c import kuwahara_c
+    return np.clip(kuwahara_c(image, window), 0, 255).astype(np.uint8)
+
+
+def filter_gaussian(image, window):
+    """Kuwahara gaussiano da biblioteca pykuwahara (method='gaussian')."""
+    from pykuwahara import kuwahara
+    filtered = kuwahara(image, method='gaussian', radius=window // 2)
+    return np.clip(filtered, 0, 255).astype(np.uint8)
+
 
+def filter_sectors(image, window):
+    """Kuwahara generalizado por setores (method='sectors')."""
+    from kuwahara_sectors import kuwahara_sectors
+    return kuwahara_sectors(image, window)
+
+
+def filter_median(image, window):
+    """Kuwahara de mediana (histograma deslizante, method='median')."""
+    from kuwahara_median import kuwahara_histogram
+    return kuwahara_histogram(image, window, method='median')
+
+
+def filter_c_maps(image, window):
+    """filter_c() com o mapa de quadrantes e o desvio vencedor."""
+    from kuwahara_c import kuwahara_c
+    filtered, quadrant, std = kuwahara_c(image, window, maps=True)
+    return np.clip(filtered, 0, 255).astype(np.uint8), quadrant, std
+
+
+def filter_median_maps(image, window):
+    """filter_median() com o mapa de quadrantes e o desvio vencedor."""
+    from kuwahara_median import kuwahara_histogram
+    return kuwahara_histogram(image, window, method='median', return_maps=True)
+
+
+def write_quadrant_map(filepath, quadrant, std):
+    """Grava o mapa de quadrantes (.npz com o nome dado, ex.: .qmap)."""
+    with open(filepath, 'wb') as f:
+        np.savez_compressed(f, quadrant=quadrant, std=std)
+
+
+# nome -> (função, comentário gravado no PGM)
+ENGINES = {
+    'pykuwahara': (filter_pykuwahara, "Kuwahara filtered (pykuwahara library)"),
+    'pykuwahara-tiles': (filter_pykuwahara_tiles,
+                         "Kuwahara filtered (pykuwahara library, row tiles)"),
+    'c': (filter_c, "Kuwahara filtered (v1 C kernel via ctypes)"),
+    'median': (filter_median, "Kuwahara filtered (median, sliding histogram)"),
+    'gaussian': (filter_gaussian, "Kuwahara filtered (pykuwahara library, gaussian)"),
+    'sectors': (filter_sectors, "Kuwahara filtered (generalized, 8 sectors)"),
+}
+
+# Engines que não calculam a média: no benchmark não entram na conferência
+# de paridade com as demais
+NON_MEAN_ENGINES = {'median', 'gaussian', 'sectors'}
+
+# Engines que devolvem (imagem, quadrante, desvio) com --maps; as demais
+# não expõem a escolha (o compare_images.py a deduz da imagem original)
+MAP_ENGINES = {'c': filter_c_maps, 'median': filter_median_maps}
+QUADRANT_MAP_SUFFIX = '.qmap'
+
+DEFAULT_IMAGES = [
+    "../imgs_original/mona_lisa.ascii.pgm",
+    # "../imgs_original/pepper.ascii.pgm",
+]
+
+
+def benchmark(images, window, repeat):
+    """
+    Mede cada engine nas imagens já carregadas (sem E/S de arquivo) e
+    confere se todas produzem a mesma saída.
+    """
+    loaded = [(path, read_pgm_p2(path)) for path in images]
+    for path, image in loaded:
+        print(f"{os.path.basename(path)} ({image.shape[1]}x{image.shape[0]}, "
+              f"window={window}, {repeat} repetições)")
+        outputs = {}
+        for name, (filter_fn, _) in ENGINES.items():
+            try:
+                outputs[name] = filter_fn(image, window)  # aquecimento/compilação
+            except Exception as e:
+                print(f"  {name:<17} ✗ {e}")
+                continue
+            start = time.perf_counter()
+            for _ in range(repeat):
+                filter_fn(image, window)
+            elapsed = (time.perf_counter() - start) / repeat
+            print(f"  {name:<17} {elapsed * 1000:9.3f} ms/imagem")
+
+        names = [name for name in outputs if name not in NON_MEAN_ENGINES]
+        for name in names[1:]:
+            same = np.array_equal(outputs[names[0]], outputs[name])
+            print(f"  {names[0]} vs {name}: "
+                  f"{'✓ idênticas' if same else '✗ diferentes'}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filtro Kuwahara em PGM P2")
+    parser.add_argument('images', nargs='*', default=DEFAULT_IMAGES,
+                        help="Imagens PGM P2 de entrada")
+    parser.add_argument('--engine', choices=sorted(ENGINES) + ['auto'],
+                        default='pykuwahara',
+                        help="Implementação do filtro (padrão: pykuwahara; "
+                             "auto = mais rápida prevista nesta máquina)")
     # Tamanho da janela (radius no pykuwahara)
-    window = 3
+    parser.add_argument('--window', type=int, default=3,
+                        help="Tamanho da janela, ímpar (padrão: 3)")
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help="Mede todas as engines (N repetições) sem gravar")
+    parser.add_argument('--maps', action='store_true',
+                        help="Grava também o mapa de quadrantes "
+                             f"(<nome>{QUADRANT_MAP_SUFFIX}; engines "
+                             f"{', '.join(sorted(MAP_ENGINES))})")
+    args = parser.parse_args()
+
+    window = args.window
     radius = window // 2  # radius = 1 para window=3
 
+    if args.benchmark:
+        benchmark(args.images, window, args.benchmark)
+        return
+
     # Criar pasta de saída
     os.makedirs("imgs_filtered", exist_ok=True)
 
-    for img_path in images:
+    for img_path in args.images:
         try:
             print(f"Processando: {img_path}")
 
@@ -83,22 +275,44 @@ def main():
             image = read_pgm_p2(img_path)
             print(f"  Dimensões: {image.shape[1]}x{image.shape[0]}")
 
-            # Aplica filtro Kuwahara usando pykuwahara
-            print(
-                f"  Aplicando filtro Kuwahara (window={window}, radius={radius})...")
-            filtered = kuwahara(image, method='mean', radius=radius)
+            # Escolhe a engine (auto: pelo modelo calibrado nesta máquina)
+            engine = args.engine
+            if engine == 'auto':
+                from autotune import choose_engine
+                engine, predicted = choose_engine(image.shape, window)
+                print(f"  Engine automática: {engine} (previsto "
+                      f"{predicted[engine] * 1000:.2f} ms)")
+            filter_fn, comment = ENGINES[engine]
 
-            # Garante que valores estão no range correto
-            filtered = np.clip(filtered, 0, 255).astype(np.uint8)
+            # Aplica filtro Kuwahara com a engine escolhida
+            print(f"  Aplicando filtro Kuwahara [{engine}] "
+                  f"(window={window}, radius={radius})...")
+            start = time.perf_counter()
+            maps = None
+            if args.maps and engine in MAP_ENGINES:
+                filtered, *maps = MAP_ENGINES[engine](image, window)
+            else:
+                filtered = filter_fn(image, window)
+            if args.engine == 'auto':
+                from autotune import record_decision
+                record_decision(img_path, image.shape, window, engine, predicted,
+                                time.perf_counter() - start)
 
             # Controi caminho de saída
             filename = os.path.basename(img_path)
             output_path = f"imgs_filtered/{filename}"
 
             # Salva em formato P2
-            write_pgm_p2(output_path, filtered)
+            write_pgm_p2(output_path, filtered, comment)
 
-            print(f"  ✓ Salvo: {output_path}\n")
+            print(f"  ✓ Salvo: {output_path}")
+            if maps is not None:
+                map_path = f"imgs_filtered/{pgm_stem(filename)}{QUADRANT_MAP_SUFFIX}"
+                write_quadrant_map(map_path, *maps)
+                print(f"  ✓ Mapa de quadrantes: {map_path}")
+            elif args.maps:
+                print(f"  ⚠ Engine {engine} não gera mapa de quadrantes")
+            print()
 
         except Exception as e:
             print(f"  ✗ Erro: {e}\n")
@@ -0,0 +1,197 @@
+"""
+Pré-visualização progressiva em múltiplas resoluções.
+
+Para decidir se um raio serve não é preciso esperar o filtro na imagem
+inteira. Monta uma pirâmide (média 2x2 por nível), filtra primeiro o nível
+mais grosso com o raio reduzido na mesma escala e depois refina nível a
+nível até a resolução pedida. Cada estágio é entregue assim que fica
+pronto (progressive() é um gerador), e o refinamento pode se limitar a uma
+janela de interesse (viewport): só a região dela, com margem do raio, é
+filtrada em cada nível, e no nível 0 o resultado é idêntico ao da imagem
+inteira naquela região.
+
+Usa as mesmas engines do main.py (--engine).
+
+Uso:
+    python3 preview.py imagem.pgm [--window 7] [--engine c]
+                       [--viewport X,Y,L,A] [--stop-level 1] [--save-dir previews]
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from main import ENGINES, read_pgm_p2, write_pgm_p2
+
+MIN_LEVEL_SIDE = 32  # não desce abaixo disso na pirâmide
+
+
+def downsample(image):
+    """Metade da resolução por média 2x2 (lado ímpar repete a borda)."""
+    height, width = image.shape
+    if height % 2 or width % 2:
+        image = np.pad(image, ((0, height % 2), (0, width % 2)), mode='edge')
+    # Soma das 4 fases em uint16, no lugar (evita cópias em int32)
+    total = image[0::2, 0::2].astype(np.uint16)
+    total += image[1::2, 0::2]
+    total += image[0::2, 1::2]
+    total += image[1::2, 1::2]
+    total += 2
+    total >>= 2
+    return total.astype(np.uint8)
+
+
+def build_pyramid(image, levels=None):
+    """
+    Pirâmide [nível 0 = original, 1 = metade, ...].
+
+    Sem 'levels', desce enquanto o menor lado do próximo nível for
+    >= MIN_LEVEL_SIDE.
+    """
+    pyramid = [image]
+    while levels is None or len(pyramid) < levels + 1:
+        if levels is None and min(pyramid[-1].shape) // 2 < MIN_LEVEL_SIDE:
+            break
+        if min(pyramid[-1].shape) < 2:
+            break
+        pyramid.append(downsample(pyramid[-1]))
+    return pyramid
+
+
+def level_window(window, level):
+    """Janela ímpar com o raio dividido por 2^level (raio mínimo 1)."""
+    radius = max(1, round((window // 2) / 2 ** level))
+    return 2 * radius + 1
+
+
+def clip_viewport(viewport, shape):
+    """
+    Recorta o viewport (x, y, largura, altura) à imagem de forma 'shape'.
+
+    Raises:
+        ValueError: Se nada do viewport cair dentro da imagem
+    """
+    height, width = shape
+    x0, y0 = min(viewport[0], width), min(viewport[1], height)
+    x1 = min(width, viewport[0] + viewport[2])
+    y1 = min(height, viewport[1] + viewport[3])
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"viewport {','.join(map(str, viewport))} fora da "
+                         f"imagem {width}x{height}")
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def level_region(viewport, level, shape, margin):
+    """
+    Região do viewport (x, y, largura, altura em coordenadas do nível 0)
+    no nível dado, com e sem a margem do raio.
+
+    Returns:
+        tuple: (fatias com margem, fatias do viewport relativas a elas)
+    """
+    height, width = shape
+    scale = 2 ** level
+    x0, y0 = min(width, viewport[0] // scale), min(height, viewport[1] // scale)
+    x1 = min(width, -(-(viewport[0] + viewport[2]) // scale))
+    y1 = min(height, -(-(viewport[1] + viewport[3]) // scale))
+    top, left = max(0, y0 - margin), max(0, x0 - margin)
+    bottom, right = min(height, y1 + margin), min(width, x1 + margin)
+    return ((slice(top, bottom), slice(left, right)),
+            (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left)))
+
+
+def progressive(image, window=3, engine='pykuwahara', levels=None,
+                viewport=None, stop_level=0):
+    """
+    Filtra do nível mais grosso ao mais fino, entregando cada estágio.
+
+    Args:
+        image: Imagem 2D (uint8)
+        window: Janela no nível 0
+        engine: Nome em main.ENGINES
+        levels: Níveis da pirâmide (padrão: automático)
+        viewport: (x, y, largura, altura) no nível 0, ou None para a imagem
+                  toda (recortado à imagem; ValueError se ficar vazio)
+        stop_level: Último nível a filtrar (0 = resolução cheia)
+
+    Yields:
+        dict: level, scale, window, offset (x, y do recorte no nível),
+              image (filtrada), elapsed (s desde o início)
+    """
+    filter_fn = ENGINES[engine][0]
+    if viewport is not None:
+        viewport = clip_viewport(viewport, image.shape)
+    start = time.perf_counter()
+    pyramid = build_pyramid(image, levels)
+    coarsest = len(pyramid) - 1
+    for level in range(coarsest, min(stop_level, coarsest) - 1, -1):
+        level_image = pyramid[level]
+        win = level_window(window, level)
+        if viewport is None:
+            filtered, offset = filter_fn(level_image, win), (0, 0)
+        else:
+            outer, inner = level_region(viewport, level, level_image.shape, win // 2)
+            filtered = filter_fn(np.ascontiguousarray(level_image[outer]), win)[inner]
+            offset = (outer[1].start + inner[1].start, outer[0].start + inner[0].start)
+        yield {'level': level, 'scale': 2 ** level, 'window': win, 'offset': offset,
+               'image': filtered, 'elapsed': time.perf_counter() - start}
+
+
+def parse_viewport(text):
+    """'X,Y,L,A' -> tupla de inteiros."""
+    values = tuple(int(v) for v in text.split(','))
+    if len(values) != 4 or values[2] <= 0 or values[3] <= 0 or min(values[:2]) < 0:
+        raise argparse.ArgumentTypeError("viewport deve ser X,Y,LARGURA,ALTURA")
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pré-visualização progressiva do filtro Kuwahara")
+    parser.add_argument('image', help="Imagem PGM P2 de entrada")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='pykuwahara',
+                        help="Implementação do filtro (padrão: pykuwahara)")
+    parser.add_argument('--window', type=int, default=3,
+                        help="Tamanho da janela na resolução cheia (padrão: 3)")
+    parser.add_argument('--levels', type=int,
+                        help="Níveis da pirâmide (padrão: até lado "
+                             f"{MIN_LEVEL_SIDE})")
+    parser.add_argument('--viewport', type=parse_viewport, metavar='X,Y,L,A',
+                        help="Refina só esta região (coordenadas da resolução cheia)")
+    parser.add_argument('--stop-level', type=int, default=0,
+                        help="Para ao chegar neste nível (0 = resolução cheia)")
+    parser.add_argument('--save-dir',
+                        help="Grava cada estágio como <nome>.L<nível>.pgm")
+    args = parser.parse_args()
+
+    image = read_pgm_p2(args.image)
+    if args.viewport is not None:
+        try:
+            args.viewport = clip_viewport(args.viewport, image.shape)
+        except ValueError as e:
+            parser.error(str(e))
+    print(f"{args.image}: {image.shape[1]}x{image.shape[0]}, engine {args.engine}, "
+          f"janela {args.window}")
+    if args.save_dir:
+        os.makedirs(args.save_dir, exist_ok=True)
+    base = os.path.basename(args.image).split('.')[0]
+    for stage in progressive(image, args.window, args.engine, args.levels,
+                             args.viewport, args.stop_level):
+        height, width = stage['image'].shape
+        line = (f"  nível {stage['level']} (1/{stage['scale']}): {width}x{height} "
+                f"em ({stage['offset'][0]}, {stage['offset'][1]}), "
+                f"janela {stage['window']}, pronto em {stage['elapsed'] * 1000:.1f} ms")
+        if args.save_dir:
+            path = os.path.join(args.save_dir, f"{base}.L{stage['level']}.pgm")
+            write_pgm_p2(path, stage['image'],
+                         f"Kuwahara preview level {stage['level']} ({args.engine})")
+            line += f" -> {path}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
 """
 Script para comparar imagens PGM geradas pela implementação em C e Python.
-Calcula métricas estatísticas de diferença entre as implementações.
+Calcula métricas estatísticas de diferença entre as implementações,
+incluindo PSNR e SSIM (janela 7x7 uniforme, por imagens integrais).
+Aceita .pgm, .pgm.gz/.zst/.xz/.bz2 e .npz (pgm_io.py da v2); as pastas C e
+Python são casadas pelo nome sem o sufixo.
+
+Com --quadrants gera também a camada de discordância de quadrantes
+(quadrants_<nome>.png): o mapa do quadrante escolhido de cada lado vem do
+.qmap gravado pelo main.py --maps ou, se não houver, é deduzido da
+imagem original (kuwahara_median.infer_quadrants), e cada pixel vira
+mesma escolha, empate (escolha diferente, mesmo valor), aritmética (mesmo
+quadrante, valor diferente), seleção divergente ou quadrante desconhecido.
 
 Autor: Hiel Saraiva
 Data: 17 de outubro de 2025
@@ -9,21 +19,45 @@ Data: 17 de outubro de 2025
 from typing import Tuple, Dict
 from matplotlib.colors import ListedColormap, BoundaryNorm
 import matplotlib.pyplot as plt
+import argparse
+import math
 import os
+import sys
 import numpy as np
 import matplotlib
 # Usar backend sem interface gráfica para evitar erro de Tkinter
 matplotlib.use('Agg')
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import V2_PYTHON_DIR  # noqa: E402,F401 (põe o pgm_io da v2 no caminho)
+from pgm_io import is_pgm_path, open_pgm, pgm_stem, read_npz, storage_format  # noqa: E402
+
+# Camada de discordância de quadrantes (mesmas categorias do
+# compare_filtered.py da v2)
+QUADRANT_LABELS = ['Mesma\nescolha', 'Empate', 'Aritmética', 'Seleção\ndivergente',
+                   'Desconhecido']
+QUADRANT_COLORS = ['#000000', '#7f7f7f', '#1f77b4', '#d62728', '#9467bd']
+QUADRANT_MAP_SUFFIX = '.qmap'
+NO_QUADRANT = 255
+
+# SSIM (Wang et al. 2004): janela uniforme, covariância amostral
+SSIM_WINDOW = 7
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+
 
 def read_pgm_p2(filepath: str) -> Tuple[np.ndarray, int, int, int]:
     """
-    Lê arquivo PGM formato P2 (ASCII).
+    Lê arquivo PGM formato P2 (ASCII), comprimido ou .npz.
 
     Returns:
         tuple: (imagem como array numpy, largura, altura, maxval)
     """
-    with open(filepath, 'r') as f:
+    if storage_format(filepath) == 'npz':
+        image, maxval = read_npz(filepath)
+        return image, image.shape[1], image.shape[0], maxval
+
+    with open_pgm(filepath, 'rt') as f:
         # Ler magic number
         magic = f.readline().strip()
         if magic != 'P2':
@@ -50,6 +84,53 @@ def read_pgm_p2(filepath: str) -> Tuple[np.ndarray, int, int, int]:
         return image, width, height, maxval
 
 
+def window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """Soma de cada janela window x window inteira (imagem integral)."""
+    integral = np.zeros((values.shape[0] + 1, values.shape[1] + 1),
+                        dtype=np.int64)
+    integral[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+    return (integral[window:, window:] - integral[:-window, window:]
+            - integral[window:, :-window] + integral[:-window, :-window])
+
+
+def compute_psnr(img1: np.ndarray, img2: np.ndarray, maxval: int) -> float:
+    """PSNR em dB (infinito para imagens idênticas)."""
+    mse = np.mean((img1.astype(np.int64) - img2.astype(np.int64)) ** 2)
+    return 10 * math.log10(maxval * maxval / mse) if mse else math.inf
+
+
+def compute_ssim(img1: np.ndarray, img2: np.ndarray, maxval: int,
+                 window: int = SSIM_WINDOW) -> float:
+    """
+    SSIM médio sobre as janelas window x window inteiras da imagem.
+
+    Médias, variâncias e covariância locais saem de imagens integrais de
+    a, b, a², b² e a*b, sem laço por janela.
+    """
+    if min(img1.shape) < window:
+        return math.nan
+    a = img1.astype(np.int64)
+    b = img2.astype(np.int64)
+    n = window * window
+    s1 = window_sums(a, window)
+    s2 = window_sums(b, window)
+    s11 = window_sums(a * a, window)
+    s22 = window_sums(b * b, window)
+    s12 = window_sums(a * b, window)
+
+    c1 = (SSIM_K1 * maxval) ** 2
+    c2 = (SSIM_K2 * maxval) ** 2
+    norm = n * (n - 1)
+    mu1 = s1 / n
+    mu2 = s2 / n
+    var1 = (n * s11 - s1 * s1) / norm
+    var2 = (n * s22 - s2 * s2) / norm
+    cov = (n * s12 - s1 * s2) / norm
+    ssim_map = (((2 * mu1 * mu2 + c1) * (2 * cov + c2)) /
+                ((mu1 * mu1 + mu2 * mu2 + c1) * (var1 + var2 + c2)))
+    return float(ssim_map.mean())
+
+
 def compare_images(img1_path: str, img2_path: str) -> Dict:
     """
     Compara duas imagens PGM e retorna métricas de diferença.
@@ -62,8 +143,26 @@ def compare_images(img1_path: str, img2_path: str) -> Dict:
         dict: Dicionário com métricas de comparação
     """
     # Ler as imagens
-    img1, w1, h1, maxval1 = read_pgm_p2(img1_path)
-    img2, w2, h2, maxval2 = read_pgm_p2(img2_path)
+    img1, _, _, maxval1 = read_pgm_p2(img1_path)
+    img2, _, _, maxval2 = read_pgm_p2(img2_path)
+    return compare_arrays(img1, img2, maxval1, maxval2)
+
+
+def compare_arrays(img1: np.ndarray, img2: np.ndarray,
+                   maxval1: int = 255, maxval2: int = 255) -> Dict:
+    """
+    Compara duas imagens já carregadas (mesmas métricas de compare_images).
+
+    Args:
+        img1: Primeira imagem (C)
+        img2: Segunda imagem (Python)
+        maxval1, maxval2: Valores máximos das imagens
+
+    Returns:
+        dict: Dicionário com métricas de comparação
+    """
+    h1, w1 = img1.shape
+    h2, w2 = img2.shape
 
     # Verificar se as dimensões são iguais
     if (w1, h1) != (w2, h2):
@@ -140,6 +239,11 @@ def compare_images(img1_path: str, img2_path: str) -> Dict:
     tolerance_5 = np.count_nonzero(diff_abs <= 5)
     percent_similar_tol5 = (tolerance_5 / total_pixels) * 100
 
+    # PSNR e SSIM (métricas usadas na aprovação de qualidade)
+    data_range = max(maxval1, maxval2)
+    psnr = compute_psnr(img1, img2, data_range)
+    ssim = compute_ssim(img1, img2, data_range)
+
     return {
         'identical': identical,
         'dimensions': (w1, h1),
@@ -163,6 +267,8 @@ def compare_images(img1_path: str, img2_path: str) -> Dict:
         'diff_means': diff_means,
         'diff_stds': diff_stds,
         'correlation': correlation,
+        'psnr': psnr,
+        'ssim': ssim,
         'percent_similar_tol1': percent_similar_tol1,
         'percent_similar_tol5': percent_similar_tol5
     }
@@ -286,6 +392,65 @@ def plot_difference_heatmap(img1_path: str, img2_path: str, output_path: str):
     print(f"   Heatmap salvo em: {output_path}")
 
 
+def load_quadrant_map(filepath: str) -> np.ndarray:
+    """Lê o mapa de quadrantes de um .qmap (main.py --maps)."""
+    with np.load(filepath) as data:
+        return data['quadrant']
+
+
+def quadrant_disagreement(img1: np.ndarray, img2: np.ndarray,
+                          quadrant1: np.ndarray, quadrant2: np.ndarray) -> np.ndarray:
+    """Categoria da camada de quadrantes (0-4) de cada pixel."""
+    same_value = img1.astype(int) == img2.astype(int)
+    same_quadrant = quadrant1 == quadrant2
+    categories = np.where(same_quadrant, np.where(same_value, 0, 2),
+                          np.where(same_value, 1, 3))
+    categories[(quadrant1 == NO_QUADRANT) | (quadrant2 == NO_QUADRANT)] = 4
+    return categories
+
+
+def plot_quadrant_layer(img1: np.ndarray, img2: np.ndarray,
+                        quadrant1: np.ndarray, quadrant2: np.ndarray,
+                        title: str, output_path: str):
+    """
+    Gera a camada de discordância de quadrantes entre duas saídas.
+
+    Args:
+        img1, img2: Imagens filtradas (C e Python)
+        quadrant1, quadrant2: Quadrante escolhido em cada pixel (0-3, ou
+                              NO_QUADRANT se desconhecido)
+        title: Título da figura
+        output_path: Caminho para salvar o gráfico
+    """
+    categories = quadrant_disagreement(img1, img2, quadrant1, quadrant2)
+    counts = np.bincount(categories.ravel(), minlength=len(QUADRANT_LABELS))
+
+    cmap = ListedColormap(QUADRANT_COLORS)
+    norm = BoundaryNorm(range(len(QUADRANT_COLORS) + 1), cmap.N)
+
+    fig, ax = plt.subplots(figsize=(7, 6))
+    im = ax.imshow(categories, cmap=cmap, norm=norm)
+    ax.set_xlabel('Pixels (Largura)', fontsize=10)
+    ax.set_ylabel('Pixels (Altura)', fontsize=10)
+    cbar = plt.colorbar(im, ax=ax, fraction=0.046, pad=0.04,
+                        ticks=[i + 0.5 for i in range(len(QUADRANT_LABELS))])
+    cbar.set_ticklabels(QUADRANT_LABELS)
+
+    fig.suptitle(
+        f'Discordância de Quadrantes: {title}\n' +
+        ' | '.join(f"{label.replace(chr(10), ' ')}: {count}"
+                   for label, count in zip(QUADRANT_LABELS, counts)),
+        fontsize=10
+    )
+
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=150, bbox_inches='tight')
+    plt.close()
+
+    print(f"   Camada de quadrantes salva em: {output_path} "
+          f"(seleção divergente: {counts[3]}, desconhecido: {counts[4]})")
+
+
 def print_comparison_result(filename: str, result: Dict):
     """Imprime os resultados da comparação de forma formatada."""
     print(f"\n{'='*70}")
@@ -324,6 +489,8 @@ def print_comparison_result(filename: str, result: Dict):
 
     print(f"\nMétricas de Similaridade:")
     print(f"   Correlação normalizada: {result['correlation']:.4f}")
+    print(f"   PSNR: {result['psnr']:.2f} dB")
+    print(f"   SSIM (janela {SSIM_WINDOW}x{SSIM_WINDOW}): {result['ssim']:.4f}")
 
     # Calcular quantidade de pixels para tolerância
     tolerance_1_count = int(
@@ -350,8 +517,107 @@ def print_comparison_result(filename: str, result: Dict):
         f"   Diferença nos desvios padrão (C - Python): {result['diff_stds']:+.2f}")
 
 
+def compare_engines(engine1: str, engine2: str, window: int,
+                    quadrants: bool = False):
+    """
+    Filtra as imagens originais com duas engines do main.py, em processo,
+    e compara os arrays diretamente (sem gravar PGMs intermediários).
+
+    Com 'quadrants', o mapa de cada engine vem dela mesma (MAP_ENGINES) ou
+    é deduzido da original, e a camada de quadrantes vai para imgs_tests/.
+    """
+    from main import ENGINES, MAP_ENGINES, NON_MEAN_ENGINES, read_pgm_p2 as read_original
+    from kuwahara_median import infer_quadrants
+
+    for name in (engine1, engine2):
+        if name not in ENGINES:
+            print(f"[X] Engine desconhecida: {name} (disponíveis: {', '.join(sorted(ENGINES))})")
+            return
+        if quadrants and name in NON_MEAN_ENGINES and name not in MAP_ENGINES:
+            print(f"[X] Engine {name} não escolhe um quadrante (sem camada de quadrantes)")
+            return
+
+    def run_engine(name, image):
+        """Saída da engine e, com 'quadrants', o seu mapa."""
+        if not quadrants:
+            return ENGINES[name][0](image, window), None
+        if name in MAP_ENGINES:
+            filtered, quadrant, _ = MAP_ENGINES[name](image, window)
+            return filtered, quadrant
+        filtered = ENGINES[name][0](image, window)
+        return filtered, infer_quadrants(image, filtered, window)
+
+    originals_dir = "../../imgs_original"
+    originals = sorted(f for f in os.listdir(originals_dir) if is_pgm_path(f))
+
+    print(f"\n{'='*70}")
+    print(f"COMPARAÇÃO DE ENGINES: {engine1} vs {engine2} (window={window})")
+    print(f"{'='*70}")
+    print(f"(Nas métricas abaixo, 'C' = {engine1} e 'Python' = {engine2})")
+
+    for filename in originals:
+        try:
+            image = read_original(os.path.join(originals_dir, filename))
+            filtered1, quadrant1 = run_engine(engine1, image)
+            filtered2, quadrant2 = run_engine(engine2, image)
+            print_comparison_result(filename, compare_arrays(filtered1, filtered2))
+            if quadrants:
+                os.makedirs("imgs_tests", exist_ok=True)
+                plot_quadrant_layer(
+                    filtered1, filtered2, quadrant1, quadrant2,
+                    f"{engine1} vs {engine2} ({filename})",
+                    os.path.join("imgs_tests", f"quadrants_{engine1}_vs_{engine2}_"
+                                               f"{pgm_stem(filename)}.png"))
+        except Exception as e:
+            print(f"\n[X] Erro ao comparar {filename}: {e}")
+
+
+def folder_quadrants(c_path: str, python_path: str, window: int):
+    """
+    Imagens e mapas de quadrantes de um par das pastas C/Python: o mapa da
+    versão Python vem do .qmap ao lado dela, se houver; o resto é
+    deduzido da original de mesmo nome em imgs_original/.
+
+    Returns:
+        tuple: (imagem C, imagem Python, mapa C, mapa Python)
+    """
+    from kuwahara_median import infer_quadrants
+
+    originals_dir = "../../imgs_original"
+    originals = {pgm_stem(f): f for f in os.listdir(originals_dir) if is_pgm_path(f)}
+    stem = pgm_stem(c_path)
+    if stem not in originals:
+        raise FileNotFoundError(f"Original de {stem} não encontrada em {originals_dir}")
+    original = read_pgm_p2(os.path.join(originals_dir, originals[stem]))[0]
+    img_c = read_pgm_p2(c_path)[0]
+    img_py = read_pgm_p2(python_path)[0]
+
+    map_path = os.path.join(os.path.dirname(python_path),
+                            pgm_stem(python_path) + QUADRANT_MAP_SUFFIX)
+    quadrant_py = (load_quadrant_map(map_path) if os.path.exists(map_path)
+                   else infer_quadrants(original, img_py, window))
+    return img_c, img_py, infer_quadrants(original, img_c, window), quadrant_py
+
+
 def main():
     """Função principal que executa os testes de comparação."""
+    parser = argparse.ArgumentParser(
+        description="Compara as imagens filtradas pelas implementações C e Python")
+    parser.add_argument('--engines', nargs=2, metavar=('A', 'B'),
+                        help="Compara duas engines do main.py em processo "
+                             "(ex.: --engines c pykuwahara)")
+    parser.add_argument('--window', type=int, default=3,
+                        help="Janela usada com --engines e --quadrants (padrão: 3)")
+    parser.add_argument('--quadrants', action='store_true',
+                        help="Gera também a camada de discordância de quadrantes "
+                             f"(mapas {QUADRANT_MAP_SUFFIX} do main.py --maps ou "
+                             "deduzidos da imagem original)")
+    args = parser.parse_args()
+
+    if args.engines:
+        compare_engines(*args.engines, args.window, args.quadrants)
+        return
+
     # Definir caminhos (agora test está dentro de python_implementation)
     c_filtered_dir = "../../imgs_filtered"
     python_filtered_dir = "../imgs_filtered"
@@ -367,8 +633,11 @@ def main():
         print("Execute primeiro o programa Python para gerar as imagens filtradas.")
         return
 
-    # Listar arquivos .pgm do diretório C
-    c_files = [f for f in os.listdir(c_filtered_dir) if f.endswith('.pgm')]
+    # Listar arquivos .pgm (ou comprimidos) do diretório C; os da versão
+    # Python são casados pelo nome sem o sufixo de armazenamento
+    c_files = [f for f in os.listdir(c_filtered_dir) if is_pgm_path(f)]
+    python_files = {pgm_stem(f): f for f in os.listdir(python_filtered_dir)
+                    if is_pgm_path(f)}
 
     if not c_files:
         print("[X] Nenhuma imagem filtrada encontrada no diretório C.")
@@ -387,7 +656,8 @@ def main():
     # Comparar cada arquivo
     for filename in sorted(c_files):
         c_path = os.path.join(c_filtered_dir, filename)
-        python_path = os.path.join(python_filtered_dir, filename)
+        python_path = os.path.join(python_filtered_dir,
+                                   python_files.get(pgm_stem(filename), filename))
 
         if not os.path.exists(python_path):
             print(f"\n[X] Arquivo {filename} não encontrado na versão Python")
@@ -398,9 +668,15 @@ def main():
             print_comparison_result(filename, result)
 
             # Gerar heatmap sempre (mesmo para imagens idênticas)
-            heatmap_filename = f"diff_heatmap_{filename.replace('.pgm', '.png')}"
+            heatmap_filename = f"diff_heatmap_{pgm_stem(filename)}.png"
             heatmap_path = os.path.join(test_imgs_dir, heatmap_filename)
             plot_difference_heatmap(c_path, python_path, heatmap_path)
+
+            if args.quadrants:
+                plot_quadrant_layer(
+                    *folder_quadrants(c_path, python_path, args.window),
+                    filename, os.path.join(test_imgs_dir,
+                                           f"quadrants_{pgm_stem(filename)}.png"))
         except Exception as e:
             print(f"\n[X] Erro ao comparar {filename}: {e}")
 
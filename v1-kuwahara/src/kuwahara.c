@@ -1,13 +1,19 @@
 #include "../include/kuwahara.h"
 #include <math.h>
+#include <stddef.h>
 
-void kuwahara_filter(int image[IMG_SIZE][IMG_SIZE], int window)
+void kuwahara_filter_buffer(const int *input, int *output, int width, int height, int window)
 {
-    // Define dimensões da imagem e calcular tamanho dos quadrantes
-    int width = IMG_SIZE, height = IMG_SIZE;
+    kuwahara_filter_buffer_maps(input, output, NULL, NULL, width, height, window);
+}
+
+void kuwahara_filter_buffer_maps(const int *input, int *output,
+                                 unsigned char *quadrant_map, float *std_map,
+                                 int width, int height, int window)
+{
+    // Calcula tamanho dos quadrantes
     int window_size = window;
     int quadrant_size = (window_size + 1) / 2;
-    int result[IMG_SIZE][IMG_SIZE]; // ESTRUTURA DE DADOS auxiliar para armazenar o resultado (8100 valores inteiros)
 
     // Percorre cada pixel da imagem
     for (int pixel_y = 0; pixel_y < height; ++pixel_y)
@@ -20,7 +26,8 @@ void kuwahara_filter(int image[IMG_SIZE][IMG_SIZE], int window)
 
             // Inicializa busca pelo quadrante com menor desvio padrão
             double best_std_dev = 1e300; // valor inicial muito grande
-            double best_mean = image[pixel_y][pixel_x];
+            double best_mean = input[pixel_y * width + pixel_x];
+            int best_quadrant = 0;
 
             // Analisa os 4 quadrantes sobrepostos
             // Pykuwahara usa "anchors" na ordem: (0,0), (0,1), (1,0), (1,1)
@@ -67,7 +74,7 @@ void kuwahara_filter(int image[IMG_SIZE][IMG_SIZE], int window)
                             read_x = width - 1;
 
                         // Acumula valores para cálculo de média e desvio padrão
-                        int pixel_value = image[read_y][read_x];
+                        int pixel_value = input[read_y * width + read_x];
                         sum += pixel_value;
                         sum_sq += (long long)pixel_value * (long long)pixel_value;
                         pixel_count++;
@@ -89,13 +96,29 @@ void kuwahara_filter(int image[IMG_SIZE][IMG_SIZE], int window)
                     {
                         best_std_dev = std_dev;
                         best_mean = mean; // Armazena sem arredondar
+                        best_quadrant = q;
                     }
                 }
             }
             // Atribui média do melhor quadrante ao pixel de saída
-            result[pixel_y][pixel_x] = (int)(best_mean);
+            output[pixel_y * width + pixel_x] = (int)(best_mean);
+
+            // Mapas opcionais: índice do quadrante vencedor (posição em
+            // quadrant_order) e seu desvio padrão
+            if (quadrant_map)
+                quadrant_map[pixel_y * width + pixel_x] = (unsigned char)best_quadrant;
+            if (std_map)
+                std_map[pixel_y * width + pixel_x] = (float)best_std_dev;
         }
     }
+}
+
+void kuwahara_filter(int image[IMG_SIZE][IMG_SIZE], int window)
+{
+    int result[IMG_SIZE][IMG_SIZE]; // ESTRUTURA DE DADOS auxiliar para armazenar o resultado (8100 valores inteiros)
+    int width = IMG_SIZE, height = IMG_SIZE;
+
+    kuwahara_filter_buffer(&image[0][0], &result[0][0], width, height, window);
 
     // Copia resultado do buffer temporário para a imagem original
     for (int i = 0; i < height; ++i)
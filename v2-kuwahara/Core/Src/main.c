@@ -43,17 +43,41 @@
 // Modo de operação: comente a linha abaixo para usar modo Flash (antigo)
 #define STREAMING_MODE // Habilita recepção via UART (modo streaming)
 
+// Linhas em quadros binários RAW/DELTA/RLE (writer_reader.py --compress)
+// #define WIRE_CODEC
+
+#ifdef WIRE_CODEC
+#define CODEC_TAG_RAW 0x00	  // payload = pixels
+#define CODEC_TAG_DELTA 0x01  // payload = 1o pixel + diferenças em nibbles
+#define CODEC_TAG_RLE 0x02	  // payload = pares (repetições, valor)
+#define CODEC_DELTA_ESCAPE 0x8 // nibble de escape: valor absoluto a seguir
+#define CODEC_CRC_POLY 0x07	   // CRC-8 do quadro (tag + tamanho + payload)
+#endif
+
 #ifndef STREAMING_MODE
 // Modo Flash: escolha a imagem
 #define USE_MONA_LISA
 // #define USE_PEPPER
+// Header gerado por python_script/flash_packer.py (tem prioridade)
+// #define USE_FLASH_IMAGE "image_mona_lisa.h"
 
-#ifdef USE_MONA_LISA
+#if defined(USE_FLASH_IMAGE)
+#include USE_FLASH_IMAGE
+#elif defined(USE_MONA_LISA)
 #include "image_mona_lisa.h"
 #elif defined(USE_PEPPER)
 #include "image_pepper.h"
 #else
-#error "Nenhuma imagem selecionada! Defina USE_MONA_LISA ou USE_PEPPER"
+#error "Nenhuma imagem selecionada! Defina USE_MONA_LISA, USE_PEPPER ou USE_FLASH_IMAGE"
+#endif
+
+// Layout compacto (packed/rows): decodifica as linhas para o buffer e
+// filtra em duas fases, como no streaming
+#if defined(IMAGE_FLASH_LAYOUT) && IMAGE_FLASH_LAYOUT != IMAGE_FLASH_LAYOUT_RAW
+#define FLASH_ROWS_MODE
+#ifdef WIRE_CODEC
+#error "WIRE_CODEC requer STREAMING_MODE"
+#endif
 #endif
 #endif
 
@@ -68,9 +92,16 @@
 UART_HandleTypeDef huart2;
 
 /* USER CODE BEGIN PV */
-#ifdef STREAMING_MODE
+#if defined(STREAMING_MODE) || defined(FLASH_ROWS_MODE)
 // Buffer para 46 linhas da imagem (46x90)
 static pixel_t image_buffer[BUFFER_SIZE][IMG_SIZE];
+#ifdef WIRE_CODEC
+// Linha filtrada e quadro de saída (tag + tamanho + payload + CRC)
+static pixel_t row_out[IMG_SIZE];
+static uint8_t tx_frame[IMG_SIZE + 3];
+// CRC-8 acumulado do quadro em recepção
+static uint8_t rx_crc;
+#endif
 #endif
 /* USER CODE END PV */
 
@@ -288,13 +319,261 @@ int receive_line_uart(pixel_t *line_buffer)
 	return (pixel_count == IMG_SIZE) ? 1 : 0;
 }
 
+#ifdef WIRE_CODEC
+typedef struct
+{
+	uint8_t byte;
+	uint8_t has_low;
+	int remaining;
+} nibble_reader_t;
+
+static uint8_t crc8_update(uint8_t crc, uint8_t b)
+{
+	crc ^= b;
+	for (int i = 0; i < 8; i++)
+		crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ CODEC_CRC_POLY) : (uint8_t)(crc << 1);
+	return crc;
+}
+
+static int uart_read_byte(uint8_t *b)
+{
+	if (HAL_UART_Receive(&huart2, b, 1, 3600000) != HAL_OK)
+		return 0;
+	rx_crc = crc8_update(rx_crc, *b);
+	return 1;
+}
+
+// Lê o próximo nibble (alto, depois baixo) do payload DELTA
+static int read_nibble(nibble_reader_t *r, uint8_t *nib)
+{
+	if (r->has_low)
+	{
+		*nib = r->byte & 0x0F;
+		r->has_low = 0;
+		return 1;
+	}
+	if (r->remaining <= 0 || !uart_read_byte(&r->byte))
+		return 0;
+	r->remaining--;
+	*nib = r->byte >> 4;
+	r->has_low = 1;
+	return 1;
+}
+
+/**
+ * @brief Recebe uma linha codificada (tag + tamanho + payload + CRC) via UART.
+ * @param line_buffer Ponteiro para array onde armazenar a linha.
+ * @return 1 se sucesso, 0 se erro.
+ */
+int receive_line_codec(pixel_t *line_buffer)
+{
+	uint8_t tag, len, b;
+	int pixel_count = 0;
+
+	do
+	{
+		if (!uart_read_byte(&tag))
+			return 0;
+	} while (tag == '\n' || tag == '\r');
+	rx_crc = crc8_update(0, tag);
+
+	if (!uart_read_byte(&len))
+		return 0;
+
+	if (tag == CODEC_TAG_RAW)
+	{
+		for (int i = 0; i < len; i++)
+		{
+			if (!uart_read_byte(&b))
+				return 0;
+			if (pixel_count < IMG_SIZE)
+				line_buffer[pixel_count] = b;
+			pixel_count++;
+		}
+	}
+	else if (tag == CODEC_TAG_RLE)
+	{
+		if (len % 2)
+			return 0;
+		for (int i = 0; i < len; i += 2)
+		{
+			uint8_t count, value;
+			if (!uart_read_byte(&count) || !uart_read_byte(&value))
+				return 0;
+			while (count--)
+			{
+				if (pixel_count < IMG_SIZE)
+					line_buffer[pixel_count] = value;
+				pixel_count++;
+			}
+		}
+	}
+	else if (tag == CODEC_TAG_DELTA)
+	{
+		nibble_reader_t reader = {0, 0, len - 1};
+		uint8_t nib, hi, lo;
+
+		if (len == 0 || !uart_read_byte(&b))
+			return 0;
+		line_buffer[pixel_count++] = b;
+
+		while (pixel_count < IMG_SIZE)
+		{
+			if (!read_nibble(&reader, &nib))
+				return 0;
+			if (nib == CODEC_DELTA_ESCAPE)
+			{
+				if (!read_nibble(&reader, &hi) || !read_nibble(&reader, &lo))
+					return 0;
+				line_buffer[pixel_count] = (pixel_t)((hi << 4) | lo);
+			}
+			else
+			{
+				int delta = (nib > 7) ? (int)nib - 16 : (int)nib;
+				line_buffer[pixel_count] = (pixel_t)(line_buffer[pixel_count - 1] + delta);
+			}
+			pixel_count++;
+		}
+
+		// Descarta bytes de preenchimento restantes
+		while (reader.remaining-- > 0)
+		{
+			if (!uart_read_byte(&b))
+				return 0;
+		}
+	}
+	else
+	{
+		return 0; // Tag desconhecida
+	}
+
+	// CRC do quadro (deve bater com o acumulado até aqui)
+	uint8_t crc = rx_crc;
+	if (!uart_read_byte(&b) || b != crc)
+		return 0;
+
+	return (pixel_count == IMG_SIZE) ? 1 : 0;
+}
+
+// Tamanho do payload RLE da linha
+static int rle_size(const pixel_t *row)
+{
+	int size = 0;
+	for (int i = 0; i < IMG_SIZE;)
+	{
+		int count = 1;
+		while (i + count < IMG_SIZE && row[i + count] == row[i] && count < 255)
+			count++;
+		size += 2;
+		i += count;
+	}
+	return size;
+}
+
+// Tamanho do payload DELTA da linha
+static int delta_size(const pixel_t *row)
+{
+	int nibbles = 0;
+	for (int i = 1; i < IMG_SIZE; i++)
+	{
+		int delta = (int)row[i] - (int)row[i - 1];
+		nibbles += (delta >= -7 && delta <= 7) ? 1 : 3;
+	}
+	return 1 + (nibbles + 1) / 2;
+}
+
+/**
+ * @brief Codifica a linha com a menor codificação (RAW, RLE ou DELTA) e envia.
+ * @param row Linha filtrada (IMG_SIZE pixels).
+ */
+void send_row_codec(const pixel_t *row)
+{
+	uint8_t *payload = tx_frame + 2;
+	int raw_len = IMG_SIZE;
+	int rle_len = rle_size(row);
+	int delta_len = delta_size(row);
+	int len = 0;
+
+	if (raw_len <= rle_len && raw_len <= delta_len)
+	{
+		tx_frame[0] = CODEC_TAG_RAW;
+		memcpy(payload, row, IMG_SIZE);
+		len = IMG_SIZE;
+	}
+	else if (rle_len <= delta_len)
+	{
+		tx_frame[0] = CODEC_TAG_RLE;
+		for (int i = 0; i < IMG_SIZE;)
+		{
+			int count = 1;
+			while (i + count < IMG_SIZE && row[i + count] == row[i] && count < 255)
+				count++;
+			payload[len++] = (uint8_t)count;
+			payload[len++] = row[i];
+			i += count;
+		}
+	}
+	else
+	{
+		int nibble_pos = 0;
+		tx_frame[0] = CODEC_TAG_DELTA;
+		payload[len++] = row[0];
+		memset(payload + 1, 0, (size_t)(delta_len - 1));
+		for (int i = 1; i < IMG_SIZE; i++)
+		{
+			int delta = (int)row[i] - (int)row[i - 1];
+			uint8_t nibs[3];
+			int n = 0;
+			if (delta >= -7 && delta <= 7)
+			{
+				nibs[n++] = (uint8_t)(delta & 0x0F);
+			}
+			else
+			{
+				nibs[n++] = CODEC_DELTA_ESCAPE;
+				nibs[n++] = row[i] >> 4;
+				nibs[n++] = row[i] & 0x0F;
+			}
+			for (int k = 0; k < n; k++, nibble_pos++)
+			{
+				if (nibble_pos % 2 == 0)
+					payload[1 + nibble_pos / 2] = (uint8_t)(nibs[k] << 4);
+				else
+					payload[1 + nibble_pos / 2] |= nibs[k];
+			}
+		}
+		len = delta_len;
+	}
+
+	tx_frame[1] = (uint8_t)len;
+	uint8_t crc = 0;
+	for (int i = 0; i < len + 2; i++)
+		crc = crc8_update(crc, tx_frame[i]);
+	tx_frame[len + 2] = crc;
+	HAL_UART_Transmit(&huart2, tx_frame, (uint16_t)(len + 3), 1000);
+}
+#endif
+
+// Recebe uma linha no formato configurado (texto ou quadro codificado)
+static int receive_line(pixel_t *line_buffer)
+{
+#ifdef WIRE_CODEC
+	return receive_line_codec(line_buffer);
+#else
+	return receive_line_uart(line_buffer);
+#endif
+}
+#endif
+
+#if defined(STREAMING_MODE) || defined(FLASH_ROWS_MODE)
+
 /**
  * @brief Processa e envia linhas filtradas, usando o buffer como fonte.
  * @param start_line Linha inicial na imagem COMPLETA (0-89).
  * @param end_line Linha final na imagem COMPLETA (0-89).
  * @param buffer_start_line Linha inicial no BUFFER (0-45).
  */
-// Aplica o filtro Kuwahara usando o buffer parcial (streaming) e envia linhas filtradas
+// Aplica o filtro Kuwahara usando o buffer parcial (streaming ou flash compacta) e envia linhas filtradas
 void kuwahara_filter_buffered(int start_line, int end_line, int buffer_start_line)
 {
 	const int width = IMG_SIZE;
@@ -391,12 +670,20 @@ void kuwahara_filter_buffered(int start_line, int end_line, int buffer_start_lin
 			}
 
 			int filtered_value = (int)(best_mean);
+#ifdef WIRE_CODEC
+			row_out[pixel_x] = (pixel_t)filtered_value;
+#else
 			if (pixel_x < width - 1)
 				printf("%d ", filtered_value);
 			else
 				printf("%d", filtered_value);
+#endif
 		}
+#ifdef WIRE_CODEC
+		send_row_codec(row_out);
+#else
 		printf("\n");
+#endif
 	}
 }
 #endif
@@ -447,7 +734,7 @@ int main(void)
 		// FASE 1: Recebe linhas 0-45 (primeiras 46 linhas)
 		for (int i = 0; i < BUFFER_SIZE; i++)
 		{
-			if (!receive_line_uart(image_buffer[i]))
+			if (!receive_line(image_buffer[i]))
 			{
 				printf("ERROR: Failed to receive line %d\n", i);
 				break;
@@ -482,7 +769,7 @@ int main(void)
 		for (int i = 0; i < BUFFER_SIZE; i++)
 		{
 			int global_line = 44 + i; // Linhas 44 até 89
-			if (!receive_line_uart(image_buffer[i]))
+			if (!receive_line(image_buffer[i]))
 			{
 				printf("ERROR: Failed to receive line %d\n", global_line);
 				ok_phase2 = 0;
@@ -502,6 +789,27 @@ int main(void)
 			printf("SKIP: Phase 2 processing skipped due to incomplete reception.\n");
 		}
 
+#elif defined(FLASH_ROWS_MODE)
+		// ===== MODO FLASH COMPACTO: Duas fases, linhas decodificadas da flash =====
+
+		// FASE 1: Decodifica linhas 0-45
+		for (int i = 0; i < BUFFER_SIZE; i++)
+			image_flash_row(i, image_buffer[i]);
+
+		// Envia cabeçalho PGM
+		printf("P2\n");
+		printf("%d %d\n", IMG_SIZE, IMG_SIZE);
+		printf("%d\n", MAX_PIXEL_VALUE);
+
+		kuwahara_filter_buffered(0, 44, 0);
+
+		// FASE 2: Decodifica linhas 44-89 (sobrescreve buffer)
+		for (int i = 0; i < BUFFER_SIZE; i++)
+			image_flash_row(44 + i, image_buffer[i]);
+
+		kuwahara_filter_buffered(45, 89, 1);
+
+		HAL_Delay(5000); // Mesmo intervalo do modo FLASH
 #else
 		// ===== MODO FLASH: Processamento tradicional =====
 		kuwahara_filter(IMAGE_DATA_FLASH, KUWAHARA_WINDOW);
@@ -2,35 +2,152 @@
 Script para comparar imagens PGM filtradas pixel a pixel.
 Gera heatmap mostrando as diferenças entre duas imagens.
 
+O heatmap padrão é o mapa de categorias gravado direto como PNG indexado
+(numpy + zlib), sem matplotlib. O layout anotado de 3 painéis
+(--heatmap-style annotated) importa o matplotlib só quando é pedido.
+
+Antes de ler os pixels, cada par é consultado no índice .pgm_index.json
+das pastas (pgm_index.py): hashes e dimensões iguais bastam para declarar
+as imagens idênticas; o parse e as métricas completas só rodam quando os
+hashes diferem (--no-index desliga a consulta).
+
+Modo matriz: N pastas de implementações (v1 em C, pykuwahara, capturas
+da placa) são casadas por imagem e cada arquivo é lido uma vez; para cada
+imagem saem as matrizes de métricas entre todos os arquivos e quem
+diverge da maioria.
+
+Todo resultado (um par, lote ou matriz) é gravado no histórico SQLite
+(run_history.py), com imagem, implementação, raio e horário da captura;
+--no-history desliga.
+
+Camada de discordância de quadrantes (--quadrants, modo de um par): com
+o mapa do quadrante escolhido de cada imagem (.qmap de kuwahara_ref.py
+ou do main.py da v1 com --maps) ou 'infer' (deduzido da imagem original,
+--original), cada pixel é classificado em mesma escolha, escolha
+diferente com o mesmo valor (empate), mesma escolha com valor diferente
+(aritmética), escolha diferente com valor diferente e quadrante
+desconhecido. A camada vai para heatmap_<img1>_vs_<img2>_quadrants.png.
+
+Além de MAE/RMSE/correlação, cada par recebe PSNR e SSIM (janela 7x7
+uniforme, estatísticas locais por imagens integrais).
+
+Pares grandes (mosaicos) podem ser comparados em blocos de linhas
+(--block-rows): os arquivos são mapeados em memória e as métricas saem
+de acumuladores mescláveis, idênticas às da comparação em memória.
+
+Todos os modos aceitam .pgm.gz/.pgm.zst/.pgm.xz/.pgm.bz2 e .npz além de
+.pgm (pgm_io.py); comprimidos são lidos em fluxo, também em blocos.
+
+Modo lote: compara vários pares (manifesto CSV ou glob de capturas contra
+uma ou mais referências) em um pool de processos e grava uma tabela
+resumo (CSV ou JSON) ordenada pelo pior MAE. Heatmaps só são gerados para
+pares com MAE acima de --heatmap-threshold.
+
 Uso:
     python compare_filtered.py <imagem1.pgm> <imagem2.pgm>
+                               [--heatmap-style fast|annotated]
+                               [--block-rows N]
+                               [--quadrants MAPA1|infer MAPA2|infer
+                                [--original ORIGINAL.pgm]]
+    python compare_filtered.py --candidates 'GLOB' --reference REF.pgm [...]
+                               [--summary resumo.csv|json] [--jobs N]
+                               [--heatmap-threshold MAE] [--heatmap-style ...]
+    python compare_filtered.py --manifest pares.csv [...]
+    python compare_filtered.py --matrix PASTA1 PASTA2 [...] [--tolerance N]
 
 Exemplo:
     python compare_filtered.py ../Core/pgms/filtered_20251108_120000.pgm \\
                                 ../../v1-kuwahara/imgs_filtered/mona_lisa.ascii.pgm
 
+    python compare_filtered.py --candidates '../Core/pgms/filtered_*.pgm' \\
+        --reference ../../v1-kuwahara/imgs_filtered/mona_lisa.ascii.pgm \\
+        --reference ../../v1-kuwahara/imgs_filtered/pepper.ascii.pgm
+
 Autor: Hiel Saraiva
 Data: 8 de novembro de 2025
 """
 
-from typing import Tuple, Dict
-from matplotlib.colors import ListedColormap, BoundaryNorm
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Tuple, Dict, List
+import argparse
+import csv
+import glob
+import json
+import math
+import mmap
 import os
+import sqlite3
+import struct
 import sys
+import time
+import zlib
 import numpy as np
-import matplotlib
-# Usar backend sem interface gráfica para evitar erro de Tkinter
-matplotlib.use('Agg')
+
+import run_history
+from kuwahara_ref import (KUWAHARA_WINDOW, NO_QUADRANT, infer_quadrants,
+                          load_quadrant_map)
+from pgm_index import PgmIndex, same_pixels
+from pgm_io import (is_pgm_path, iter_pixel_blocks, pgm_stem, read_pixels,
+                    storage_format)
+from pgm_io import pgm_shape as stored_pgm_shape
+
+
+# Categorias do heatmap por diferença absoluta (limite superior inclusivo)
+# 0: Idêntico | 1: 1 | 2: 2-3 | 3: 4-5 | 4: 6-10 | 5: > 10
+CATEGORY_UPPER = (0, 1, 3, 5, 10)
+CATEGORY_LABELS = ['0\n(Idêntico)', '1', '2-3', '4-5', '6-10', '>10']
+
+# Cores das categorias (paleta do PNG rápido e colormap do layout anotado)
+CATEGORY_COLORS = [
+    '#000000',  # 0: Preto (idêntico)
+    '#1f77b4',  # 1: Azul escuro (diff=1)
+    '#17becf',  # 2: Azul ciano (diff 2-3)
+    '#2ca02c',  # 3: Verde (diff 4-5)
+    '#ff7f0e',  # 4: Laranja (diff 6-10)
+    '#d62728'   # 5: Vermelho (diff >10)
+]
+
+# Camada de discordância de quadrantes
+# 0: mesma escolha | 1: escolha diferente, mesmo valor (empate)
+# 2: mesma escolha, valor diferente (aritmética) | 3: escolha e valor
+# diferentes | 4: quadrante desconhecido em alguma das imagens
+QUADRANT_LABELS = ['mesma escolha', 'empate (mesmo valor)',
+                   'aritmética (mesmo quadrante)', 'seleção divergente',
+                   'quadrante desconhecido']
+QUADRANT_COLORS = [
+    '#000000',  # 0: Preto (mesma escolha)
+    '#7f7f7f',  # 1: Cinza (empate)
+    '#1f77b4',  # 2: Azul (aritmética)
+    '#d62728',  # 3: Vermelho (seleção divergente)
+    '#9467bd'   # 4: Roxo (desconhecido)
+]
+QUADRANT_INFER = 'infer'
+
+# SSIM (Wang et al. 2004): janela uniforme, covariância amostral e as
+# constantes usuais; a média do mapa é somada em ponto fixo (2^-32) para
+# ser exata e independente da divisão em blocos
+SSIM_WINDOW = 7
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+SSIM_FIXED_BITS = 32
+SSIM_STRIP_ROWS = 256
+
+HEATMAP_STYLES = ('fast', 'annotated')
+# Lado mínimo (pixels) do PNG rápido; imagens pequenas são ampliadas
+FAST_HEATMAP_MIN_SIDE = 512
 
 
 def read_pgm_p2(filepath: str) -> Tuple[np.ndarray, int, int, int]:
     """
-    Lê arquivo PGM formato P2 (ASCII).
+    Lê arquivo PGM formato P2 (ASCII). Comprimidos e .npz vão pelo pgm_io.
 
     Returns:
         tuple: (imagem como array numpy, largura, altura, maxval)
     """
+    if storage_format(filepath) != 'pgm':
+        return read_pixels(filepath)
+
     with open(filepath, 'r') as f:
         # Ler magic number
         magic = f.readline().strip()
@@ -48,150 +165,577 @@ def read_pgm_p2(filepath: str) -> Tuple[np.ndarray, int, int, int]:
         # Ler maxval
         maxval = int(f.readline().strip())
 
-        # Ler pixels
-        pixels = []
-        for line in f:
-            pixels.extend(map(int, line.split()))
+        # Ler pixels (conversão em C, sem listas intermediárias)
+        pixels = np.fromstring(f.read(), dtype=np.int64, sep=' ')
 
-        # Converter para numpy array
-        image = np.array(pixels, dtype=np.uint8).reshape(height, width)
-        return image, width, height, maxval
+    if pixels.size != width * height:
+        raise ValueError(f"{filepath}: {pixels.size} pixels, "
+                         f"esperado {width * height}")
+    dtype = np.uint8 if maxval <= 255 else np.uint16
+    return pixels.astype(dtype).reshape(height, width), width, height, maxval
 
 
-def compare_images(img1_path: str, img2_path: str) -> Dict:
+def read_pgm_header(buf) -> Tuple[str, int, int, int, int]:
     """
-    Compara duas imagens PGM e retorna métricas de diferença.
-
-    Args:
-        img1_path: Caminho para primeira imagem
-        img2_path: Caminho para segunda imagem
+    Lê o cabeçalho de um PGM (P2 ou P5) em um buffer de bytes.
 
     Returns:
-        dict: Dicionário com métricas de comparação
+        tuple: (magic, largura, altura, maxval, offset dos pixels)
     """
-    # Ler as imagens
-    img1, w1, h1, maxval1 = read_pgm_p2(img1_path)
-    img2, w2, h2, maxval2 = read_pgm_p2(img2_path)
-
-    # Verificar se as dimensões são iguais
-    if (w1, h1) != (w2, h2):
-        return {
-            'identical': False,
-            'error': f'Dimensões diferentes: Imagem1({w1}x{h1}) vs Imagem2({w2}x{h2})'
-        }
-
-    # Verificar identidade
-    identical = np.array_equal(img1, img2)
+    pos = 0
+
+    def next_line():
+        nonlocal pos
+        end = buf.find(b'\n', pos)
+        if end < 0:
+            raise ValueError("Cabeçalho PGM incompleto")
+        line = bytes(buf[pos:end]).decode('ascii').strip()
+        pos = end + 1
+        return line
+
+    magic = next_line()
+    if magic not in ('P2', 'P5'):
+        raise ValueError(f"Formato esperado P2 ou P5, encontrado {magic}")
+    line = next_line()
+    while line.startswith('#'):
+        line = next_line()
+    width, height = map(int, line.split())
+    maxval = int(next_line())
+    return magic, width, height, maxval, pos
+
+
+def iter_pgm_blocks(filepath: str, block_rows: int):
+    """
+    Lê um PGM mapeado em memória em blocos de 'block_rows' linhas.
 
-    # Calcular diferenças COM SINAL (img1 - img2)
-    diff_signed = img1.astype(int) - img2.astype(int)
+    P5 é fatiado direto do mapa; em P2 o texto é convertido por trechos
+    cortados em espaço. As páginas já lidas são devolvidas ao sistema
+    (MADV_DONTNEED), então a memória depende do bloco e não do arquivo.
 
-    # Calcular diferenças ABSOLUTAS pixel a pixel
-    diff_abs = np.abs(diff_signed)
+    Comprimidos e .npz são descomprimidos em fluxo (pgm_io), sem mapa.
 
-    # ========== MÉTRICAS DE DIFERENÇA ABSOLUTA ==========
+    Yields:
+        tuple: (linha inicial, bloco altura x largura uint8/uint16)
+    """
+    if storage_format(filepath) != 'pgm':
+        yield from iter_pixel_blocks(filepath, block_rows)
+        return
 
-    # Diferença máxima entre pixels de mesma posição
-    max_diff_position = np.unravel_index(np.argmax(diff_abs), diff_abs.shape)
-    max_diff_value = int(diff_abs[max_diff_position])
-    max_diff_img1 = int(img1[max_diff_position])
-    max_diff_img2 = int(img2[max_diff_position])
+    with open(filepath, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        magic, width, height, maxval, offset = read_pgm_header(buf)
+        dtype = np.uint8 if maxval <= 255 else np.uint16
+        released = 0
+
+        def release(upto):
+            nonlocal released
+            end = upto - upto % mmap.PAGESIZE
+            if end > released and hasattr(mmap, 'MADV_DONTNEED'):
+                buf.madvise(mmap.MADV_DONTNEED, released, end - released)
+                released = end
+
+        if magic == 'P5':
+            row_bytes = width * (1 if maxval <= 255 else 2)
+            data = np.frombuffer(buf, dtype=np.uint8 if maxval <= 255 else '>u2',
+                                 count=width * height,
+                                 offset=offset).reshape(height, width)
+            try:
+                for row0 in range(0, height, block_rows):
+                    yield row0, data[row0:row0 + block_rows].astype(dtype)
+                    release(offset + (row0 + block_rows) * row_bytes)
+            finally:
+                del data  # Libera o mapa antes de fechá-lo
+            return
+
+        # Bytes por pixel no arquivo, para dimensionar os trechos de texto
+        per_pixel = (len(buf) - offset) / max(width * height, 1)
+        chunk = int(block_rows * width * per_pixel) + 64
+        pending = np.empty(0, dtype=np.int64)
+        pos = offset
+        for row0 in range(0, height, block_rows):
+            need = min(block_rows, height - row0) * width
+            while pending.size < need and pos < len(buf):
+                end = min(len(buf), pos + chunk)
+                if end < len(buf):
+                    cut = max(buf.rfind(b' ', pos, end), buf.rfind(b'\n', pos, end))
+                    end = cut + 1 if cut >= pos else len(buf)
+                values = np.fromstring(bytes(buf[pos:end]).decode('ascii'),
+                                       dtype=np.int64, sep=' ')
+                pending = np.concatenate((pending, values))
+                pos = end
+                release(pos)
+            if pending.size < need:
+                raise ValueError(f"{filepath}: pixels insuficientes "
+                                 f"(esperado {width * height})")
+            yield row0, pending[:need].astype(dtype).reshape(-1, width)
+            pending = pending[need:]
+
+        if pending.size or bytes(buf[pos:]).strip():
+            raise ValueError(f"{filepath}: mais pixels que o esperado "
+                             f"({width * height})")
+
+
+def pgm_shape(filepath: str) -> Tuple[int, int, int]:
+    """(largura, altura, maxval) de um PGM, lendo só o cabeçalho."""
+    if storage_format(filepath) != 'pgm':
+        return stored_pgm_shape(filepath)
+    with open(filepath, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        return read_pgm_header(buf)[1:4]
+
+
+def window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Soma de cada janela window x window inteira (imagem integral).
 
-    # Diferença média absoluta (MAE - Mean Absolute Error)
-    mae = np.mean(diff_abs)
+    Opera nos dois últimos eixos, então aceita pilhas de imagens.
+    """
+    height, width = values.shape[-2:]
+    integral = np.zeros(values.shape[:-2] + (height + 1, width + 1),
+                        dtype=np.int64)
+    np.cumsum(values, axis=-2, out=integral[..., 1:, 1:])
+    np.cumsum(integral[..., 1:, 1:], axis=-1, out=integral[..., 1:, 1:])
+    return (integral[..., window:, window:] - integral[..., :-window, window:]
+            - integral[..., window:, :-window]
+            + integral[..., :-window, :-window])
+
+
+def ssim_map(rows1: np.ndarray, rows2: np.ndarray, data_range: int,
+             window: int = SSIM_WINDOW) -> np.ndarray:
+    """
+    SSIM de cada janela inteira de dois blocos de linhas.
 
-    # Erro Quadrático Médio (RMSE - Root Mean Square Error)
-    rmse = np.sqrt(np.mean(diff_signed ** 2))
+    Médias, variâncias e covariância locais saem de imagens integrais de
+    a, b, a², b² e a*b; até a divisão final tudo é aritmética inteira.
+    Pilhas de blocos (eixos extras à esquerda) são aceitas com broadcast.
+    """
+    a = rows1.astype(np.int64)
+    b = rows2.astype(np.int64)
+    n = window * window
+    s1 = window_sums(a, window)
+    s2 = window_sums(b, window)
+    s11 = window_sums(a * a, window)
+    s22 = window_sums(b * b, window)
+    s12 = window_sums(a * b, window)
+
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+    norm = n * (n - 1)
+    mu1 = s1 / n
+    mu2 = s2 / n
+    var1 = (n * s11 - s1 * s1) / norm
+    var2 = (n * s22 - s2 * s2) / norm
+    cov = (n * s12 - s1 * s2) / norm
+    return (((2 * mu1 * mu2 + c1) * (2 * cov + c2)) /
+            ((mu1 * mu1 + mu2 * mu2 + c1) * (var1 + var2 + c2)))
+
+
+def ssim_fixed_sum(values: np.ndarray):
+    """Soma de um mapa SSIM em ponto fixo (2^-SSIM_FIXED_BITS), por imagem."""
+    return np.rint(np.ldexp(values, SSIM_FIXED_BITS)).sum(axis=(-2, -1),
+                                                          dtype=np.int64)
+
+
+def pixel_top(maxval: int) -> int:
+    """Maior pixel possível (faixa do histograma da diferença)."""
+    return 255 if maxval <= 255 else 65535
+
+
+class CompareAccumulator:
+    """
+    Acumuladores mescláveis da comparação de um par.
+
+    Guarda só contagens e somas: histograma da diferença com sinal
+    (np.bincount), somas e somas dos quadrados de cada imagem e o maior
+    |diferença| com sua posição. A soma dos produtos usada na correlação
+    sai de sum(a*b) = (sum(a²) + sum(b²) - sum((a-b)²)) / 2. Blocos de
+    linhas podem ser acumulados em qualquer ordem (ou em acumuladores
+    separados e depois mesclados com merge()); result() dá as mesmas
+    métricas de uma passada sobre a imagem inteira.
+    """
 
-    # ========== MÉTRICAS DE DIFERENÇA COM SINAL ==========
+    def __init__(self, shape: Tuple[int, int], top: int = 255):
+        self.shape = shape          # (altura, largura) da imagem inteira
+        self.top = top
+        self.n = 0
+        self.hist_diff = np.zeros(2 * top + 1, dtype=np.int64)
+        self.sum1 = self.sum_sq1 = self.sum2 = self.sum_sq2 = 0
+        self.max_diff = -1
+        self.max_flat = 0           # posição linear na imagem inteira
+        self.max_pixels = (0, 0)
+        self.ssim_fixed = 0         # soma do mapa SSIM em ponto fixo
+        self.ssim_windows = 0
+
+    def update(self, block1: np.ndarray, block2: np.ndarray,
+               row0: int = 0) -> np.ndarray:
+        """
+        Acumula um bloco de linhas (a partir da linha 'row0').
+
+        Returns:
+            np.ndarray: Diferença com sinal block1 - block2 do bloco
+        """
+        wide, square = ((np.int16, np.uint16) if self.top <= 255
+                        else (np.int32, np.uint32))
+        # Diferença com sinal deslocada para índices >= 0
+        diff = np.subtract(block1, block2, dtype=wide)
+        hist = np.bincount((diff + self.top).ravel(),
+                           minlength=2 * self.top + 1)
+        self.hist_diff += hist
+
+        def sums(block):
+            return (int(block.sum(dtype=np.int64)),
+                    int(np.square(block, dtype=square).sum(dtype=np.uint64)))
+
+        s, sq = sums(block1)
+        self.sum1 += s
+        self.sum_sq1 += sq
+        s, sq = sums(block2)
+        self.sum2 += s
+        self.sum_sq2 += sq
+
+        if diff.size:
+            nonzero = np.flatnonzero(hist)
+            block_max = int(max(self.top - nonzero[0], nonzero[-1] - self.top))
+            # Primeira ocorrência do máximo no bloco
+            flat = int(np.argmax((diff == block_max) | (diff == -block_max)))
+            self._offer_max(block_max, row0 * self.shape[1] + flat,
+                            (int(block1.flat[flat]), int(block2.flat[flat])))
+        self.n += diff.size
+        return diff
+
+    def add_ssim(self, rows1: np.ndarray, rows2: np.ndarray):
+        """
+        Acumula o SSIM de todas as janelas inteiras de rows1/rows2.
+
+        Blocos consecutivos devem repetir no início as últimas
+        SSIM_WINDOW - 1 linhas do bloco anterior, para que cada janela
+        seja contada uma única vez. Internamente o bloco é percorrido em
+        faixas de SSIM_STRIP_ROWS linhas, limitando as imagens integrais.
+        """
+        window = SSIM_WINDOW
+        last_top = rows1.shape[0] - window  # última linha de topo de janela
+        for top in range(0, last_top + 1, SSIM_STRIP_ROWS):
+            end = min(top + SSIM_STRIP_ROWS, last_top + 1) + window - 1
+            values = ssim_map(rows1[top:end], rows2[top:end], self.top)
+            self.ssim_fixed += int(ssim_fixed_sum(values))
+            self.ssim_windows += values.size
+
+    def _offer_max(self, value: int, flat: int, pixels: Tuple[int, int]):
+        # Empate: vale a primeira posição, como numa passada única
+        if value > self.max_diff or (value == self.max_diff
+                                     and flat < self.max_flat):
+            self.max_diff, self.max_flat, self.max_pixels = value, flat, pixels
+
+    def merge(self, other: 'CompareAccumulator'):
+        """Soma os acumuladores de outro conjunto de blocos do mesmo par."""
+        self.n += other.n
+        self.hist_diff += other.hist_diff
+        self.sum1 += other.sum1
+        self.sum_sq1 += other.sum_sq1
+        self.sum2 += other.sum2
+        self.sum_sq2 += other.sum_sq2
+        self.ssim_fixed += other.ssim_fixed
+        self.ssim_windows += other.ssim_windows
+        if other.n:
+            self._offer_max(other.max_diff, other.max_flat, other.max_pixels)
+
+    def result(self) -> Dict:
+        """Métricas do par a partir dos acumuladores."""
+        h1, w1 = self.shape
+        n = total_pixels = self.n
+        top = self.top
+        hist_diff = self.hist_diff
+
+        d = np.arange(-top, top + 1, dtype=np.int64)
+        hist_abs = np.bincount(np.abs(d), weights=hist_diff,
+                               minlength=top + 1).astype(np.int64)
+
+        sum_diff = int(d @ hist_diff)
+        sum_sq_diff = int((d * d) @ hist_diff)
+        sum1, sum_sq1 = self.sum1, self.sum_sq1
+        sum2, sum_sq2 = self.sum2, self.sum_sq2
+        sum12 = (sum_sq1 + sum_sq2 - sum_sq_diff) // 2
+
+        # ========== MÉTRICAS DE DIFERENÇA ABSOLUTA ==========
+
+        num_diff_pixels = n - int(hist_abs[0])
+        max_diff_value = self.max_diff
+        max_diff_position = np.unravel_index(self.max_flat, self.shape)
+        mae = float(np.abs(d) @ hist_diff) / n
+        rmse = np.sqrt(sum_sq_diff / n)
+        psnr = (10 * math.log10(top * top * n / sum_sq_diff)
+                if sum_sq_diff else math.inf)
+
+        # ========== MÉTRICAS DE DIFERENÇA COM SINAL ==========
+
+        mean_bias = sum_diff / n
+        std_diff = (np.sqrt(max(sum_sq_diff - sum_diff * sum_diff / n, 0) / (n - 1))
+                    if n > 1 else 0.0)
+
+        # ========== ESTATÍSTICAS DAS IMAGENS ORIGINAIS ==========
+
+        def sample_std(total, total_sq):
+            return np.sqrt(max(total_sq - total * total / n, 0) / (n - 1)) \
+                if n > 1 else 0.0
+
+        img1_mean, img1_std = sum1 / n, sample_std(sum1, sum_sq1)
+        img2_mean, img2_std = sum2 / n, sample_std(sum2, sum_sq2)
+
+        # ========== MÉTRICAS DE SIMILARIDADE ==========
+
+        # Correlação normalizada (mesma definição: média de z1 * z2)
+        covariance = sum12 / n - img1_mean * img2_mean
+        correlation = covariance / ((img1_std + 1e-10) * (img2_std + 1e-10))
+
+        # SSIM médio (NaN se a imagem é menor que a janela)
+        ssim = (math.ldexp(self.ssim_fixed / self.ssim_windows,
+                           -SSIM_FIXED_BITS)
+                if self.ssim_windows else math.nan)
+
+        cumulative = np.cumsum(hist_abs)
+        tolerance_1 = int(cumulative[1])
+        tolerance_5 = int(cumulative[5])
+
+        # Contagem por categoria do heatmap
+        upper = [int(cumulative[u]) for u in CATEGORY_UPPER]
+        category_counts = np.diff([0] + upper + [n]).tolist()
+
+        percent_diff = (num_diff_pixels / total_pixels) * 100
+        return {
+            'identical': num_diff_pixels == 0,
+            'dimensions': (w1, h1),
+            'total_pixels': total_pixels,
+            'different_pixels': num_diff_pixels,
+            'identical_pixels': total_pixels - num_diff_pixels,
+            'percent_different': percent_diff,
+            'percent_identical': 100 - percent_diff,
+            'max_diff_value': max_diff_value,
+            'max_diff_position': max_diff_position,
+            'max_diff_img1': self.max_pixels[0],
+            'max_diff_img2': self.max_pixels[1],
+            'mae': mae,
+            'rmse': rmse,
+            'mean_bias': mean_bias,
+            'std_diff': std_diff,
+            'img1_mean': img1_mean,
+            'img1_std': img1_std,
+            'img2_mean': img2_mean,
+            'img2_std': img2_std,
+            'diff_means': img1_mean - img2_mean,
+            'diff_stds': img1_std - img2_std,
+            'correlation': correlation,
+            'psnr': psnr,
+            'ssim': ssim,
+            'percent_similar_tol1': (tolerance_1 / total_pixels) * 100,
+            'percent_similar_tol5': (tolerance_5 / total_pixels) * 100,
+            'category_counts': category_counts,
+        }
 
-    # Diferença média com sinal (indica bias)
-    mean_bias = np.mean(diff_signed)
 
-    # Desvio padrão das diferenças
-    std_diff = np.std(diff_signed, ddof=1) if len(
-        diff_signed.flatten()) > 1 else 0.0
+def compare_arrays(img1: np.ndarray, img2: np.ndarray) -> Tuple[Dict, np.ndarray]:
+    """
+    Compara duas imagens já carregadas, com uma passada por array.
 
-    # ========== PIXELS DIFERENTES ==========
+    É o caso de um único bloco de CompareAccumulator: as métricas saem do
+    histograma da diferença e de somas inteiras, sem cópias float; o
+    SSIM é acumulado em faixas de linhas.
 
-    num_diff_pixels = np.count_nonzero(diff_abs)
-    total_pixels = w1 * h1
-    percent_diff = (num_diff_pixels / total_pixels) * 100
+    Args:
+        img1: Primeira imagem (inteiros sem sinal)
+        img2: Segunda imagem, mesmas dimensões
 
-    # ========== ESTATÍSTICAS DAS IMAGENS ORIGINAIS ==========
+    Returns:
+        tuple: (dicionário de métricas, diferença com sinal img1 - img2)
+    """
+    # Faixa dinâmica pelo tipo (uint8: 255), como o maxval no modo em blocos
+    top = 255 if img1.dtype == img2.dtype == np.uint8 else 65535
+    acc = CompareAccumulator(img1.shape, top)
+    diff = acc.update(img1, img2)
+    acc.add_ssim(img1, img2)
+    return acc.result(), diff
 
-    # Estatísticas da imagem 1
-    img1_mean = np.mean(img1)
-    img1_std = np.std(img1, ddof=1)
 
-    # Estatísticas da imagem 2
-    img2_mean = np.mean(img2)
-    img2_std = np.std(img2, ddof=1)
+def compare_tiled(img1_path: str, img2_path: str, block_rows: int = 256,
+                  heatmap_path: str = None) -> Dict:
+    """
+    Compara dois PGMs grandes em blocos de linhas, com memória limitada.
 
-    # Diferenças entre estatísticas
-    diff_means = img1_mean - img2_mean
-    diff_stds = img1_std - img2_std
+    Os arquivos são mapeados em memória e lidos em blocos paralelos; cada
+    bloco alimenta um CompareAccumulator, então as métricas são idênticas
+    às de compare_arrays() e a memória depende só de 'block_rows'. Com
+    'heatmap_path', o mapa de categorias é gravado como PNG indexado ao
+    longo da leitura.
 
-    # ========== MÉTRICAS DE SIMILARIDADE ==========
+    Args:
+        img1_path: Caminho para primeira imagem
+        img2_path: Caminho para segunda imagem
+        block_rows: Linhas por bloco
+        heatmap_path: PNG rápido do mapa de categorias (opcional)
 
-    # Correlação normalizada
-    img1_norm = (img1 - img1_mean) / (img1_std + 1e-10)
-    img2_norm = (img2 - img2_mean) / (img2_std + 1e-10)
-    correlation = np.mean(img1_norm * img2_norm)
+    Returns:
+        dict: Dicionário com métricas de comparação
+    """
+    w1, h1, maxval1 = pgm_shape(img1_path)
+    w2, h2, maxval2 = pgm_shape(img2_path)
+    if (w1, h1) != (w2, h2):
+        return dimension_error((h1, w1), (h2, w2))
+
+    acc = CompareAccumulator((h1, w1), pixel_top(max(maxval1, maxval2)))
+
+    def diff_blocks():
+        # Últimas linhas do bloco anterior, para as janelas do SSIM
+        tail1 = tail2 = None
+        for (row0, block1), (_, block2) in zip(
+                iter_pgm_blocks(img1_path, block_rows),
+                iter_pgm_blocks(img2_path, block_rows)):
+            diff = acc.update(block1, block2, row0)
+            if tail1 is not None:
+                block1 = np.vstack((tail1, block1))
+                block2 = np.vstack((tail2, block2))
+            acc.add_ssim(block1, block2)
+            tail1 = block1[-(SSIM_WINDOW - 1):]
+            tail2 = block2[-(SSIM_WINDOW - 1):]
+            yield diff
+
+    if heatmap_path:
+        scale = max(1, FAST_HEATMAP_MIN_SIDE // max(h1, w1))
+        write_palette_png_blocks(
+            heatmap_path, w1, h1,
+            (categorize_difference(diff) for diff in diff_blocks()),
+            CATEGORY_COLORS, scale)
+    else:
+        for _ in diff_blocks():
+            pass
+    return acc.result()
+
+
+def identical_result(entry: Dict) -> Dict:
+    """
+    Métricas de um par idêntico a partir da entrada do índice.
 
-    # Similaridade percentual (pixels com diferença <= 1)
-    tolerance_1 = np.count_nonzero(diff_abs <= 1)
-    percent_similar_tol1 = (tolerance_1 / total_pixels) * 100
+    Mesmo dicionário que compare_arrays() devolve para img1 == img2, sem
+    ler os pixels: as estatísticas da imagem saem das somas do índice.
+    """
+    width, height = entry['width'], entry['height']
+    n = width * height
+    mean = entry['sum'] / n
+    std = (np.sqrt(max(entry['sum_sq'] - entry['sum'] * entry['sum'] / n, 0)
+                   / (n - 1)) if n > 1 else 0.0)
+    covariance = entry['sum_sq'] / n - mean * mean
+    max_diff_position = np.unravel_index(0, (height, width))
+    return {
+        'identical': True,
+        'dimensions': (width, height),
+        'total_pixels': n,
+        'different_pixels': 0,
+        'identical_pixels': n,
+        'percent_different': 0.0,
+        'percent_identical': 100.0,
+        'max_diff_value': 0,
+        'max_diff_position': max_diff_position,
+        'max_diff_img1': entry['first'],
+        'max_diff_img2': entry['first'],
+        'mae': 0.0,
+        'rmse': np.sqrt(0 / n),
+        'mean_bias': 0.0,
+        'std_diff': np.sqrt(0 / (n - 1)) if n > 1 else 0.0,
+        'img1_mean': mean,
+        'img1_std': std,
+        'img2_mean': mean,
+        'img2_std': std,
+        'diff_means': 0.0,
+        'diff_stds': 0.0,
+        'correlation': covariance / ((std + 1e-10) * (std + 1e-10)),
+        'psnr': math.inf,
+        'ssim': (1.0 if min(width, height) >= SSIM_WINDOW else math.nan),
+        'percent_similar_tol1': 100.0,
+        'percent_similar_tol5': 100.0,
+        'category_counts': [n, 0, 0, 0, 0, 0],
+    }
 
-    # Similaridade percentual (pixels com diferença <= 5)
-    tolerance_5 = np.count_nonzero(diff_abs <= 5)
-    percent_similar_tol5 = (tolerance_5 / total_pixels) * 100
 
+def dimension_error(shape1: Tuple[int, int], shape2: Tuple[int, int]) -> Dict:
+    """Resultado de um par com dimensões diferentes (shapes altura x largura)."""
+    (h1, w1), (h2, w2) = shape1, shape2
     return {
-        'identical': identical,
-        'dimensions': (w1, h1),
-        'total_pixels': total_pixels,
-        'different_pixels': num_diff_pixels,
-        'identical_pixels': total_pixels - num_diff_pixels,
-        'percent_different': percent_diff,
-        'percent_identical': 100 - percent_diff,
-        'max_diff_value': max_diff_value,
-        'max_diff_position': max_diff_position,
-        'max_diff_img1': max_diff_img1,
-        'max_diff_img2': max_diff_img2,
-        'mae': mae,
-        'rmse': rmse,
-        'mean_bias': mean_bias,
-        'std_diff': std_diff,
-        'img1_mean': img1_mean,
-        'img1_std': img1_std,
-        'img2_mean': img2_mean,
-        'img2_std': img2_std,
-        'diff_means': diff_means,
-        'diff_stds': diff_stds,
-        'correlation': correlation,
-        'percent_similar_tol1': percent_similar_tol1,
-        'percent_similar_tol5': percent_similar_tol5
+        'identical': False,
+        'error': f'Dimensões diferentes: Imagem1({w1}x{h1}) vs Imagem2({w2}x{h2})'
     }
 
 
-def plot_difference_heatmap(img1_path: str, img2_path: str, output_path: str):
+def match_by_index(index: PgmIndex, img1_path: str, img2_path: str):
     """
-    Gera um heatmap mostrando as diferenças entre duas imagens.
-    Usa categorias de cores discretas para melhor visualização.
+    Consulta o par no índice.
+
+    Returns:
+        tuple: (resultado se o índice já decide o par, senão None;
+                pixels de cada imagem lidos ao atualizar o índice ou None)
+    """
+    entry1, pixels1 = index.lookup(img1_path)
+    entry2, pixels2 = index.lookup(img2_path)
+    if same_pixels(entry1, entry2):
+        return identical_result(entry1), pixels1, pixels2
+    shape1 = (entry1['height'], entry1['width'])
+    shape2 = (entry2['height'], entry2['width'])
+    if shape1 != shape2:
+        return dimension_error(shape1, shape2), pixels1, pixels2
+    return None, pixels1, pixels2
+
+
+def compare_images(img1_path: str, img2_path: str,
+                   index: PgmIndex = None, block_rows: int = None) -> Dict:
+    """
+    Compara duas imagens PGM e retorna métricas de diferença.
 
     Args:
         img1_path: Caminho para primeira imagem
         img2_path: Caminho para segunda imagem
-        output_path: Caminho para salvar o gráfico
-    """
-    # Ler as imagens
-    img1, _, _, _ = read_pgm_p2(img1_path)
-    img2, _, _, _ = read_pgm_p2(img2_path)
+        index: Índice de conteúdo; com hashes iguais o par é declarado
+               idêntico sem ler os pixels
+        block_rows: Se informado, compara em blocos (compare_tiled)
 
-    # Calcular diferenças absolutas
-    diff_abs = np.abs(img1.astype(int) - img2.astype(int))
+    Returns:
+        dict: Dicionário com métricas de comparação
+    """
+    pixels1 = pixels2 = None
+    if index is not None:
+        result, pixels1, pixels2 = match_by_index(index, img1_path, img2_path)
+        index.save()
+        if result is not None:
+            return result
+
+    if block_rows:
+        return compare_tiled(img1_path, img2_path, block_rows)
+
+    img1 = pixels1 if pixels1 is not None else read_pgm_p2(img1_path)[0]
+    img2 = pixels2 if pixels2 is not None else read_pgm_p2(img2_path)[0]
+    if img1.shape != img2.shape:
+        return dimension_error(img1.shape, img2.shape)
+    return compare_arrays(img1, img2)[0]
+
+
+def categorize_difference(diff: np.ndarray) -> np.ndarray:
+    """Categoria do heatmap (0-5) de cada pixel, via tabela de consulta."""
+    top = int(np.abs(diff).max()) if diff.size else 0
+    lut = np.searchsorted(CATEGORY_UPPER, np.arange(top + 1), side='left')
+    return lut.astype(np.uint8)[np.abs(diff)]
+
+
+def plot_difference_heatmap(img1: np.ndarray, img2: np.ndarray,
+                            diff: np.ndarray, result: Dict, output_path: str,
+                            img1_name: str = 'Imagem 1',
+                            img2_name: str = 'Imagem 2'):
+    """
+    Gera um heatmap mostrando as diferenças entre duas imagens.
+    Usa categorias de cores discretas para melhor visualização.
 
+    Args:
+        img1, img2: Imagens já carregadas
+        diff: Diferença com sinal retornada por compare_arrays()
+        result: Métricas retornadas por compare_arrays()
+        output_path: Caminho para salvar o gráfico
+        img1_name, img2_name: Nomes exibidos nos títulos
+    """
     # Definir categorias de diferença
     # 0: Idêntico (preto)
     # 1: Diff = 1 (azul escuro)
@@ -199,25 +743,16 @@ def plot_difference_heatmap(img1_path: str, img2_path: str, output_path: str):
     # 3: Diff = 4-5 (verde)
     # 4: Diff = 6-10 (amarelo)
     # 5: Diff > 10 (vermelho)
+    diff_categorized = categorize_difference(diff)
+
+    # Importado só aqui: o layout anotado é o único que usa matplotlib
+    import matplotlib
+    # Usar backend sem interface gráfica para evitar erro de Tkinter
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import ListedColormap, BoundaryNorm
 
-    diff_categorized = np.zeros_like(diff_abs, dtype=int)
-    diff_categorized[diff_abs == 0] = 0  # Idêntico
-    diff_categorized[diff_abs == 1] = 1  # Diff = 1
-    diff_categorized[(diff_abs >= 2) & (diff_abs <= 3)] = 2  # Diff 2-3
-    diff_categorized[(diff_abs >= 4) & (diff_abs <= 5)] = 3  # Diff 4-5
-    diff_categorized[(diff_abs >= 6) & (diff_abs <= 10)] = 4  # Diff 6-10
-    diff_categorized[diff_abs > 10] = 5  # Diff > 10
-
-    # Cores personalizadas
-    colors = [
-        '#000000',  # 0: Preto (idêntico)
-        '#1f77b4',  # 1: Azul escuro (diff=1)
-        '#17becf',  # 2: Azul ciano (diff 2-3)
-        '#2ca02c',  # 3: Verde (diff 4-5)
-        '#ff7f0e',  # 4: Laranja (diff 6-10)
-        '#d62728'   # 5: Vermelho (diff >10)
-    ]
-    cmap = ListedColormap(colors)
+    cmap = ListedColormap(CATEGORY_COLORS)
     bounds = [0, 1, 2, 3, 4, 5, 6]
     norm = BoundaryNorm(bounds, cmap.N)
 
@@ -226,13 +761,13 @@ def plot_difference_heatmap(img1_path: str, img2_path: str, output_path: str):
 
     # Subplot 1: Imagem 1
     axes[0].imshow(img1, cmap='gray', vmin=0, vmax=255)
-    axes[0].set_title(f'Imagem 1\n{os.path.basename(img1_path)}',
+    axes[0].set_title(f'Imagem 1\n{img1_name}',
                       fontsize=10, fontweight='bold')
     axes[0].axis('off')
 
     # Subplot 2: Imagem 2
     axes[1].imshow(img2, cmap='gray', vmin=0, vmax=255)
-    axes[1].set_title(f'Imagem 2\n{os.path.basename(img2_path)}',
+    axes[1].set_title(f'Imagem 2\n{img2_name}',
                       fontsize=10, fontweight='bold')
     axes[1].axis('off')
 
@@ -262,26 +797,19 @@ def plot_difference_heatmap(img1_path: str, img2_path: str, output_path: str):
     # Adicionar colorbar customizada
     cbar = plt.colorbar(im, ax=axes[2], fraction=0.046, pad=0.04,
                         ticks=[0.5, 1.5, 2.5, 3.5, 4.5, 5.5])
-    cbar.set_ticklabels(['0\n(Idêntico)', '1', '2-3', '4-5', '6-10', '>10'])
+    cbar.set_ticklabels(CATEGORY_LABELS)
     cbar.set_label('Diferença (pixels)', rotation=270,
                    labelpad=20, fontsize=10)
 
-    # Calcular estatísticas por categoria
-    num_identical = np.count_nonzero(diff_abs == 0)
-    num_diff_1 = np.count_nonzero(diff_abs == 1)
-    num_diff_2_3 = np.count_nonzero((diff_abs >= 2) & (diff_abs <= 3))
-    num_diff_4_5 = np.count_nonzero((diff_abs >= 4) & (diff_abs <= 5))
-    num_diff_6_10 = np.count_nonzero((diff_abs >= 6) & (diff_abs <= 10))
-    num_diff_10_plus = np.count_nonzero(diff_abs > 10)
-
-    total = diff_abs.size
-    max_diff = np.max(diff_abs)
-    mean_diff = np.mean(diff_abs)
+    # Estatísticas por categoria (já calculadas em compare_arrays)
+    (num_identical, num_diff_1, num_diff_2_3, num_diff_4_5, num_diff_6_10,
+     num_diff_10_plus) = result['category_counts']
 
     # Título com estatísticas
     fig.suptitle(
         f'Comparação de Imagens PGM Filtradas\n'
-        f'Total: {total} pixels | Média: {mean_diff:.4f} | Máximo: {max_diff}\n'
+        f'Total: {result["total_pixels"]} pixels | Média: {result["mae"]:.4f} | '
+        f'Máximo: {result["max_diff_value"]}\n'
         f'Idênticos: {num_identical} | Diff=1: {num_diff_1} | '
         f'Diff 2-3: {num_diff_2_3} | Diff 4-5: {num_diff_4_5} | '
         f'Diff 6-10: {num_diff_6_10} | Diff>10: {num_diff_10_plus}',
@@ -295,6 +823,147 @@ def plot_difference_heatmap(img1_path: str, img2_path: str, output_path: str):
     print(f"\n✓ Heatmap salvo em: {output_path}")
 
 
+def png_chunk(tag: bytes, data: bytes) -> bytes:
+    """Chunk PNG: tamanho, tipo, dados e CRC-32 de tipo + dados."""
+    return (struct.pack('>I', len(data)) + tag + data +
+            struct.pack('>I', zlib.crc32(tag + data)))
+
+
+def write_palette_png_blocks(output_path: str, width: int, height: int,
+                             blocks, colors: List[str], scale: int = 1):
+    """
+    Grava blocos de linhas de índices (uint8) como PNG com paleta (tipo 3).
+
+    Cada linha recebe o byte de filtro 0 e os blocos passam por um único
+    fluxo zlib, um chunk IDAT por trecho comprimido; a ampliação, se
+    houver, é vizinho mais próximo.
+
+    Args:
+        output_path: Caminho do PNG
+        width, height: Dimensões antes da ampliação
+        blocks: Iterável de blocos (linhas x largura), de cima para baixo
+        colors: Cores da paleta em '#rrggbb'
+        scale: Fator inteiro de ampliação
+    """
+    header = struct.pack('>IIBBBBB', width * scale, height * scale,
+                         8, 3, 0, 0, 0)
+    palette = bytes.fromhex(''.join(c.lstrip('#') for c in colors))
+    compressor = zlib.compressobj(6)
+    with open(output_path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(png_chunk(b'IHDR', header))
+        f.write(png_chunk(b'PLTE', palette))
+        for indices in blocks:
+            if scale > 1:
+                indices = np.repeat(np.repeat(indices, scale, axis=0),
+                                    scale, axis=1)
+            raw = np.zeros((indices.shape[0], indices.shape[1] + 1),
+                           dtype=np.uint8)
+            raw[:, 1:] = indices
+            data = compressor.compress(raw.tobytes())
+            if data:
+                f.write(png_chunk(b'IDAT', data))
+        f.write(png_chunk(b'IDAT', compressor.flush()))
+        f.write(png_chunk(b'IEND', b''))
+
+
+def write_palette_png(output_path: str, indices: np.ndarray,
+                      colors: List[str], scale: int = 1):
+    """Grava uma imagem de índices inteira como PNG com paleta."""
+    height, width = indices.shape
+    write_palette_png_blocks(output_path, width, height, [indices],
+                             colors, scale)
+
+
+def render_fast_heatmap(diff: np.ndarray, output_path: str):
+    """
+    Grava só o mapa de categorias como PNG indexado, sem matplotlib.
+
+    Um pixel da imagem vira um bloco de pixels do PNG, ampliado até
+    FAST_HEATMAP_MIN_SIDE no lado maior.
+    """
+    scale = max(1, FAST_HEATMAP_MIN_SIDE // max(diff.shape))
+    write_palette_png(output_path, categorize_difference(diff),
+                      CATEGORY_COLORS, scale)
+    print(f"\n✓ Heatmap salvo em: {output_path}")
+
+
+def render_heatmap(img1: np.ndarray, img2: np.ndarray, diff: np.ndarray,
+                   result: Dict, output_path: str, img1_name: str,
+                   img2_name: str, style: str = 'fast'):
+    """Gera o heatmap no estilo pedido ('fast' ou 'annotated')."""
+    if style == 'annotated':
+        plot_difference_heatmap(img1, img2, diff, result, output_path,
+                                img1_name, img2_name)
+    else:
+        render_fast_heatmap(diff, output_path)
+
+
+def quadrant_disagreement(quadrant1: np.ndarray, quadrant2: np.ndarray,
+                          diff: np.ndarray) -> np.ndarray:
+    """Categoria da camada de quadrantes (0-4) de cada pixel."""
+    same_value = diff == 0
+    same_quadrant = quadrant1 == quadrant2
+    categories = np.where(same_quadrant, np.where(same_value, 0, 2),
+                          np.where(same_value, 1, 3)).astype(np.uint8)
+    categories[(quadrant1 == NO_QUADRANT) | (quadrant2 == NO_QUADRANT)] = 4
+    return categories
+
+
+def load_quadrants(spec: str, image: np.ndarray, original: np.ndarray,
+                   window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mapa de quadrantes de uma imagem: lido do .qmap ou, com 'infer',
+    deduzido da imagem original.
+
+    Returns:
+        tuple: (quadrante uint8, desvio vencedor ou None)
+    """
+    if spec == QUADRANT_INFER:
+        if original is None:
+            raise ValueError("'infer' exige --original")
+        return infer_quadrants(original, image, window), None
+    quadrant, std = load_quadrant_map(spec)
+    if quadrant.shape != image.shape:
+        raise ValueError(f"Mapa {spec} {quadrant.shape[::-1]} não confere "
+                         f"com a imagem {image.shape[::-1]}")
+    return quadrant, std
+
+
+def run_quadrant_layer(img1: np.ndarray, img2: np.ndarray, diff: np.ndarray,
+                       specs: List[str], original_path: str, window: int,
+                       output_path: str) -> Dict:
+    """
+    Classifica os pixels pela escolha de quadrante das duas imagens, grava
+    a camada como PNG indexado e imprime a contagem por categoria.
+
+    Returns:
+        dict: counts (por categoria) e std_gap (|Δ desvio| médio onde a
+              seleção diverge, se os dois mapas trazem o desvio)
+    """
+    original = read_pgm_p2(original_path)[0] if original_path else None
+    quadrant1, std1 = load_quadrants(specs[0], img1, original, window)
+    quadrant2, std2 = load_quadrants(specs[1], img2, original, window)
+    categories = quadrant_disagreement(quadrant1, quadrant2, diff)
+    counts = np.bincount(categories.ravel(), minlength=len(QUADRANT_LABELS))
+
+    scale = max(1, FAST_HEATMAP_MIN_SIDE // max(categories.shape))
+    write_palette_png(output_path, categories, QUADRANT_COLORS, scale)
+
+    print(f"\nDiscordância de Quadrantes:")
+    total = categories.size
+    for label, count in zip(QUADRANT_LABELS, counts):
+        print(f"   {label}: {count} ({count / total * 100:.2f}%)")
+    std_gap = None
+    diverged = categories == 3
+    if std1 is not None and std2 is not None and diverged.any():
+        std_gap = float(np.abs(std1[diverged] - std2[diverged]).mean())
+        print(f"   |Δ desvio vencedor| médio na seleção divergente: "
+              f"{std_gap:.4f}")
+    print(f"\n✓ Camada de quadrantes salva em: {output_path}")
+    return {'counts': counts.tolist(), 'std_gap': std_gap}
+
+
 def print_comparison_result(img1_name: str, img2_name: str, result: Dict):
     """Imprime os resultados da comparação de forma formatada."""
     print(f"\n{'='*70}")
@@ -337,6 +1006,8 @@ def print_comparison_result(img1_name: str, img2_name: str, result: Dict):
 
     print(f"\nMétricas de Similaridade:")
     print(f"   Correlação normalizada: {result['correlation']:.4f}")
+    print(f"   PSNR: {result['psnr']:.2f} dB")
+    print(f"   SSIM (janela {SSIM_WINDOW}x{SSIM_WINDOW}): {result['ssim']:.4f}")
 
     # Calcular quantidade de pixels para tolerância
     tolerance_1_count = int(
@@ -364,20 +1035,42 @@ def print_comparison_result(img1_name: str, img2_name: str, result: Dict):
         f"   Diferença nos desvios padrão (Img1 - Img2): {result['diff_stds']:+.2f}")
 
 
-def main():
-    """Função principal."""
-    if len(sys.argv) != 3:
-        print("\n✗ Uso incorreto!")
-        print("\nUso:")
-        print("   python3 compare_filtered.py <imagem1.pgm> <imagem2.pgm>")
-        print("\nExemplo:")
-        print("   python3 compare_filtered.py ../Core/pgms/filtered_20251108_120000.pgm \\")
-        print("                               ../../v1-kuwahara/imgs_filtered/mona_lisa.ascii.pgm")
-        sys.exit(1)
+def history_entry(candidate: str, reference: str, result: Dict, mode: str,
+                  history: Dict, implementation: str = None,
+                  image: str = None) -> Dict:
+    """
+    Entrada do histórico para um resultado (dicionário de métricas ou
+    linha da tabela do lote). Sem rótulo explícito, a implementação é a
+    pasta da captura e a imagem vem do nome da referência.
+    """
+    implementation = (implementation or history.get('implementation') or
+                      os.path.basename(os.path.dirname(os.path.abspath(candidate))))
+    return {**result, 'candidate': candidate, 'reference': reference,
+            'image': image or image_key(reference),
+            'implementation': implementation,
+            'radius': history['radius'], 'mode': mode}
+
 
-    img1_path = sys.argv[1]
-    img2_path = sys.argv[2]
+def save_history(history: Dict, entries: List[Dict]):
+    """Grava as entradas no histórico (se ligado); falhas só geram aviso."""
+    if not history or not entries:
+        return
+    try:
+        count = run_history.record(history['db'], entries)
+        print(f"\n✓ {count} resultado(s) no histórico: {history['db']}")
+    except (sqlite3.Error, OSError) as e:
+        print(f"\n⚠ Histórico não gravado: {e}")
 
+
+def run_pair(img1_path: str, img2_path: str, heatmaps_dir: str,
+             style: str = 'fast', index: PgmIndex = None,
+             block_rows: int = None, history: Dict = None,
+             quadrants: List[str] = None, original_path: str = None,
+             window: int = KUWAHARA_WINDOW):
+    """
+    Compara um par, imprime o relatório completo e gera o heatmap (e a
+    camada de quadrantes, com 'quadrants').
+    """
     # Verificar se os arquivos existem
     if not os.path.exists(img1_path):
         print(f"\n✗ Arquivo não encontrado: {img1_path}")
@@ -387,28 +1080,76 @@ def main():
         print(f"\n✗ Arquivo não encontrado: {img2_path}")
         sys.exit(1)
 
-    # Criar diretório para heatmaps
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    heatmaps_dir = os.path.join(script_dir, 'heatmaps')
-    os.makedirs(heatmaps_dir, exist_ok=True)
-
     try:
-        # Comparar as imagens
-        result = compare_images(img1_path, img2_path)
+        heatmap_path = heatmap_path_for(heatmaps_dir, img1_path, img2_path)
+
+        if block_rows:
+            # Em blocos: métricas e PNG rápido na mesma leitura dos arquivos
+            result = compare_tiled(img1_path, img2_path, block_rows,
+                                   heatmap_path)
+            print_comparison_result(os.path.basename(img1_path),
+                                    os.path.basename(img2_path), result)
+            if 'error' in result:
+                sys.exit(1)
+            print(f"\n✓ Heatmap salvo em: {heatmap_path}")
+            if history:
+                save_history(history, [history_entry(
+                    img1_path, img2_path, result, 'tiled', history)])
+            print(f"\n{'='*70}")
+            print("✓ COMPARAÇÃO CONCLUÍDA COM SUCESSO!")
+            print(f"{'='*70}")
+            return
+
+        # Consultar o índice: hashes iguais dispensam o parse
+        result = pixels1 = pixels2 = None
+        if index is not None:
+            result, pixels1, pixels2 = match_by_index(index, img1_path,
+                                                      img2_path)
+            index.save()
+
+        if result is not None and 'error' in result:
+            print_comparison_result(os.path.basename(img1_path),
+                                    os.path.basename(img2_path), result)
+            sys.exit(1)
+
+        if result is not None and style == 'fast' and not quadrants:
+            # Idênticas pelo índice: o mapa é todo da categoria 0
+            width, height = result['dimensions']
+            img1 = img2 = None
+            diff = np.zeros((height, width), dtype=np.int16)
+        else:
+            # Carregar cada imagem uma única vez
+            img1 = pixels1 if pixels1 is not None else read_pgm_p2(img1_path)[0]
+            img2 = pixels2 if pixels2 is not None else read_pgm_p2(img2_path)[0]
+            if img1.shape != img2.shape:
+                print_comparison_result(
+                    os.path.basename(img1_path),
+                    os.path.basename(img2_path),
+                    dimension_error(img1.shape, img2.shape)
+                )
+                sys.exit(1)
+
+            # Comparar as imagens
+            result, diff = compare_arrays(img1, img2)
         print_comparison_result(
             os.path.basename(img1_path),
             os.path.basename(img2_path),
             result
         )
 
-        # Gerar nome do heatmap
-        img1_basename = os.path.splitext(os.path.basename(img1_path))[0]
-        img2_basename = os.path.splitext(os.path.basename(img2_path))[0]
-        heatmap_filename = f"heatmap_{img1_basename}_vs_{img2_basename}.png"
-        heatmap_path = os.path.join(heatmaps_dir, heatmap_filename)
-
         # Gerar heatmap
-        plot_difference_heatmap(img1_path, img2_path, heatmap_path)
+        render_heatmap(img1, img2, diff, result, heatmap_path,
+                       os.path.basename(img1_path),
+                       os.path.basename(img2_path), style)
+
+        if quadrants:
+            run_quadrant_layer(img1, img2, diff, quadrants, original_path,
+                               window, heatmap_path[:-len('.png')] +
+                               '_quadrants.png')
+
+        if history:
+            save_history(history, [history_entry(img1_path, img2_path,
+                                                 result, 'pair', history)])
 
         print(f"\n{'='*70}")
         print("✓ COMPARAÇÃO CONCLUÍDA COM SUCESSO!")
@@ -421,5 +1162,626 @@ def main():
         sys.exit(1)
 
 
+def heatmap_path_for(heatmaps_dir: str, img1_path: str, img2_path: str) -> str:
+    """Caminho do heatmap de um par: heatmap_<img1>_vs_<img2>.png."""
+    img1_basename = pgm_stem(img1_path)
+    img2_basename = pgm_stem(img2_path)
+    return os.path.join(heatmaps_dir,
+                        f"heatmap_{img1_basename}_vs_{img2_basename}.png")
+
+
+# ==================== MODO LOTE ====================
+
+# Contagem por categoria do heatmap (mesma ordem de category_counts)
+CATEGORY_FIELDS = ['cat_0', 'cat_1', 'cat_2_3', 'cat_4_5', 'cat_6_10',
+                   'cat_over_10']
+
+# Colunas da tabela resumo (na ordem do CSV)
+SUMMARY_FIELDS = [
+    'candidate', 'reference', 'width', 'height', 'identical',
+    'different_pixels', 'percent_different', 'max_diff_value',
+    'max_diff_row', 'max_diff_col', 'max_diff_img1', 'max_diff_img2',
+    'mae', 'rmse', 'mean_bias', 'std_diff', 'correlation', 'psnr', 'ssim',
+    'percent_similar_tol1', 'percent_similar_tol5',
+    'img1_mean', 'img1_std', 'img2_mean', 'img2_std',
+    'diff_means', 'diff_stds',
+    *CATEGORY_FIELDS,
+    'heatmap', 'error',
+]
+
+
+@lru_cache(maxsize=16)
+def load_cached(path: str) -> np.ndarray:
+    """Lê um PGM uma vez por processo (referências se repetem nos pares)."""
+    return read_pgm_p2(path)[0]
+
+
+@lru_cache(maxsize=1)
+def worker_index() -> PgmIndex:
+    """Índice do processo (lido do disco; run_batch já o atualizou)."""
+    return PgmIndex()
+
+
+def flatten_result(candidate: str, reference: str, result: Dict) -> Dict:
+    """Converte o resultado de compare_arrays() em uma linha da tabela."""
+    row = {field: '' for field in SUMMARY_FIELDS}
+    row.update(candidate=candidate, reference=reference)
+    if 'error' in result:
+        row['error'] = result['error']
+        return row
+    row['width'], row['height'] = result['dimensions']
+    row['max_diff_row'], row['max_diff_col'] = (
+        int(v) for v in result['max_diff_position'])
+    for key in SUMMARY_FIELDS:
+        if key in result and key not in ('dimensions', 'max_diff_position'):
+            value = result[key]
+            row[key] = value.item() if isinstance(value, np.generic) else value
+    for key, count in zip(CATEGORY_FIELDS, result['category_counts']):
+        row[key] = count
+    return row
+
+
+def compare_batch_item(item: Tuple[str, List[str], str, float, str, bool]) -> Dict:
+    """
+    Compara uma captura com suas referências (executado no pool).
+
+    Com várias referências, o par escolhido é o de menor MAE. Uma
+    referência com o mesmo hash no índice decide o par sem ler os pixels.
+    Se o MAE passa do limiar, o heatmap é gerado aqui mesmo, com os
+    arrays já carregados.
+
+    Args:
+        item: (captura, referências, pasta dos heatmaps, limiar ou None,
+               estilo do heatmap, usar o índice)
+
+    Returns:
+        dict: Linha da tabela resumo
+    """
+    candidate, references, heatmaps_dir, threshold, style, use_index = item
+    try:
+        if use_index:
+            index = worker_index()
+            entry = index.lookup(candidate)[0]
+            for reference in references:
+                if same_pixels(entry, index.lookup(reference)[0]):
+                    return flatten_result(candidate, reference,
+                                          identical_result(entry))
+
+        img1 = load_cached(candidate)
+        best = None
+        for reference in references:
+            img2 = load_cached(reference)
+            if img1.shape != img2.shape:
+                continue
+            result, diff = compare_arrays(img1, img2)
+            if best is None or result['mae'] < best[1]['mae']:
+                best = (reference, result, diff, img2)
+        if best is None:
+            h, w = img1.shape
+            return flatten_result(candidate, ';'.join(references), {
+                'error': f'Nenhuma referência com dimensões {w}x{h}'})
+
+        reference, result, diff, img2 = best
+        row = flatten_result(candidate, reference, result)
+        if threshold is not None and result['mae'] > threshold:
+            path = heatmap_path_for(heatmaps_dir, candidate, reference)
+            render_heatmap(img1, img2, diff, result, path,
+                           os.path.basename(candidate),
+                           os.path.basename(reference), style)
+            row['heatmap'] = path
+        return row
+    except (OSError, ValueError) as e:
+        return flatten_result(candidate, ';'.join(references), {'error': str(e)})
+
+
+def load_manifest(manifest_path: str) -> List[Tuple[str, List[str]]]:
+    """
+    Lê um manifesto CSV com linhas 'captura,referencia[,referencia...]'.
+
+    Caminhos relativos são resolvidos a partir da pasta do manifesto;
+    linhas vazias e iniciadas por '#' são ignoradas.
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    pairs = []
+    with open(manifest_path, newline='') as f:
+        for fields in csv.reader(f):
+            fields = [v.strip() for v in fields if v.strip()]
+            if not fields or fields[0].startswith('#'):
+                continue
+            if len(fields) < 2:
+                raise ValueError(f"Linha sem referência no manifesto: {fields}")
+            paths = [os.path.join(base, v) for v in fields]
+            pairs.append((paths[0], paths[1:]))
+    return pairs
+
+
+def write_summary(rows: List[Dict], output_path: str):
+    """Grava a tabela resumo em CSV ou JSON (pela extensão)."""
+    if output_path.endswith('.json'):
+        with open(output_path, 'w') as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+    else:
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def run_batch(pairs: List[Tuple[str, List[str]]], output_path: str,
+              heatmaps_dir: str, threshold=None, jobs=None,
+              style: str = 'fast', use_index: bool = True) -> List[Dict]:
+    """
+    Compara todos os pares em um pool de processos.
+
+    O índice de conteúdo é atualizado aqui antes do pool, para que os
+    processos só o leiam.
+
+    Returns:
+        list: Linhas da tabela, erros primeiro e depois pelo maior MAE
+    """
+    if use_index:
+        index = PgmIndex()
+        for path in {p for candidate, references in pairs
+                     for p in [candidate, *references]}:
+            try:
+                index.lookup(path)
+            except (OSError, ValueError):
+                pass  # O erro aparece na linha do par
+        index.save()
+
+    items = [(candidate, references, heatmaps_dir, threshold, style, use_index)
+             for candidate, references in pairs]
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(items) // (jobs * 4))
+
+    if jobs == 1 or len(items) == 1:
+        rows = [compare_batch_item(item) for item in items]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            rows = list(pool.map(compare_batch_item, items, chunksize=chunksize))
+
+    rows.sort(key=lambda r: (not r['error'],
+                             -r['mae'] if r['mae'] != '' else 0))
+    write_summary(rows, output_path)
+    return rows
+
+
+def print_batch_summary(rows: List[Dict], output_path: str, elapsed: float,
+                        top: int = 10):
+    """Imprime o resumo do lote e os piores pares."""
+    errors = [r for r in rows if r['error']]
+    valid = [r for r in rows if not r['error']]
+    identical = sum(1 for r in valid if r['identical'])
+    heatmaps = sum(1 for r in rows if r['heatmap'])
+
+    print(f"\n{'='*70}")
+    print("COMPARAÇÃO EM LOTE")
+    print(f"{'='*70}")
+    print(f"Pares: {len(rows)} | Idênticos: {identical} | "
+          f"Diferentes: {len(valid) - identical} | Erros: {len(errors)} | "
+          f"Heatmaps: {heatmaps}")
+    print(f"Tempo: {elapsed:.2f} s")
+
+    if valid:
+        print(f"\nPiores pares (MAE):")
+        for r in valid[:top]:
+            print(f"   {r['mae']:8.4f}  máx {r['max_diff_value']:3d}  "
+                  f"SSIM {r['ssim']:.4f}  "
+                  f"{os.path.basename(r['candidate'])} vs "
+                  f"{os.path.basename(r['reference'])}")
+    for r in errors:
+        print(f"   ✗ {os.path.basename(r['candidate'])}: {r['error']}")
+
+    print(f"\n✓ Resumo salvo em: {output_path}")
+
+
+# ==================== MATRIZ ENTRE IMPLEMENTAÇÕES ====================
+
+# Matrizes N x N calculadas para cada imagem (mesmas chaves na saída JSON)
+MATRIX_METRICS = ['mae', 'rmse', 'psnr', 'ssim', 'max_diff_value',
+                  'percent_different']
+
+
+def image_key(path: str) -> str:
+    """ID de uma imagem pelo nome: sem pasta, '.pgm[.gz]'/'.npz', '.ascii' e 'filtered_'."""
+    name = pgm_stem(path)
+    if name.endswith('.ascii'):
+        name = name[:-len('.ascii')]
+    return name[len('filtered_'):] if name.startswith('filtered_') else name
+
+
+def implementation_labels(dirs: List[str]) -> List[str]:
+    """
+    Rótulo de cada pasta: 'rotulo=PASTA' explícito ou o nome da pasta
+    (com a pasta-mãe quando dois nomes coincidem, ex.: imgs_filtered).
+    """
+    names = [entry.split('=', 1)[0] if '=' in entry
+             else os.path.basename(os.path.abspath(entry)) for entry in dirs]
+    labels = []
+    for entry, name in zip(dirs, names):
+        if '=' not in entry and names.count(name) > 1:
+            path = os.path.abspath(entry)
+            name = os.path.join(os.path.basename(os.path.dirname(path)), name)
+        labels.append(name)
+    return labels
+
+
+def group_by_image(dirs: List[str], labels: List[str]) -> Dict[str, List[Dict]]:
+    """
+    Agrupa os arquivos das pastas por imagem.
+
+    Um nome (image_key) presente em duas ou mais pastas vira um ID; os
+    demais arquivos (ex.: capturas filtered_<data>.pgm) entram no ID cuja
+    primeira imagem, de mesmas dimensões, dá o menor MAE. Cada arquivo é
+    lido uma única vez.
+
+    Returns:
+        dict: ID -> lista de membros {'label', 'path', 'name', 'pixels'}
+    """
+    members = []
+    for entry, label in zip(dirs, labels):
+        folder = entry.split('=', 1)[1] if '=' in entry else entry
+        for name in sorted(os.listdir(folder)):
+            if is_pgm_path(name):
+                path = os.path.join(folder, name)
+                members.append({'label': label, 'path': path,
+                                'name': image_key(path),
+                                'pixels': read_pgm_p2(path)[0]})
+
+    folders_per_key = {}
+    for m in members:
+        folders_per_key.setdefault(m['name'], set()).add(m['label'])
+    groups = {}
+    for m in members:
+        if len(folders_per_key[m['name']]) > 1:
+            groups.setdefault(m['name'], []).append(m)
+
+    for m in members:
+        if len(folders_per_key[m['name']]) > 1:
+            continue
+        best = None
+        for key, group in groups.items():
+            anchor = group[0]['pixels']
+            if anchor.shape != m['pixels'].shape:
+                continue
+            mae = np.abs(np.subtract(anchor, m['pixels'], dtype=np.int32)).mean()
+            if best is None or mae < best[0]:
+                best = (mae, key)
+        key = best[1] if best else m['name']
+        groups.setdefault(key, []).append(m)
+    return groups
+
+
+def pairwise_metrics(stack: np.ndarray, top: int) -> Dict[str, np.ndarray]:
+    """
+    Métricas de todos os pares de uma pilha N x altura x largura.
+
+    Cada linha i da matriz sai de uma operação com broadcast de stack[i]
+    contra a pilha inteira; o SSIM usa as somas de janela da pilha (a, a²)
+    calculadas uma vez e as de a*b por linha. Os valores batem com os de
+    compare_arrays() para o mesmo par.
+    """
+    n = stack.shape[0]
+    flat = stack.reshape(n, -1).astype(np.int32)
+    pixels = flat.shape[1]
+    sse = np.zeros((n, n), dtype=np.int64)
+    abs_sum = np.zeros((n, n), dtype=np.int64)
+    max_diff = np.zeros((n, n), dtype=np.int64)
+    different = np.zeros((n, n), dtype=np.int64)
+    for i in range(n):
+        diff = np.abs(flat[i] - flat)
+        abs_sum[i] = diff.sum(axis=1)
+        sse[i] = np.square(diff, dtype=np.int64).sum(axis=1)
+        max_diff[i] = diff.max(axis=1)
+        different[i] = np.count_nonzero(diff, axis=1)
+
+    with np.errstate(divide='ignore'):
+        psnr = np.where(sse > 0, 10 * np.log10(top * top * pixels / sse),
+                        np.inf)
+
+    ssim = np.full((n, n), np.nan)
+    height, width = stack.shape[1:]
+    if min(height, width) >= SSIM_WINDOW:
+        windows = (height - SSIM_WINDOW + 1) * (width - SSIM_WINDOW + 1)
+        for i in range(n):
+            values = ssim_map(stack[i], stack[i:], top)
+            ssim[i, i:] = np.ldexp(ssim_fixed_sum(values) / windows,
+                                   -SSIM_FIXED_BITS)
+            ssim[i:, i] = ssim[i, i:]
+
+    return {
+        'mae': abs_sum / pixels,
+        'rmse': np.sqrt(sse / pixels),
+        'psnr': psnr,
+        'ssim': ssim,
+        'max_diff_value': max_diff,
+        'percent_different': different / pixels * 100,
+    }
+
+
+def agreement_groups(max_diff: np.ndarray, tolerance: int) -> List[List[int]]:
+    """
+    Grupos de membros que concordam (diferença máxima <= tolerância),
+    fechados por transitividade, do maior para o menor.
+    """
+    n = max_diff.shape[0]
+    group = list(range(n))
+
+    def find(i):
+        while group[i] != i:
+            group[i] = group[group[i]]
+            i = group[i]
+        return i
+
+    for i, j in zip(*np.nonzero(max_diff <= tolerance)):
+        group[find(i)] = find(j)
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values(), key=lambda g: (-len(g), g[0]))
+
+
+def run_matrix(dirs: List[str], output_path: str, tolerance: int = 0) -> Dict:
+    """
+    Compara N pastas de implementações imagem a imagem.
+
+    Para cada imagem, calcula as matrizes de MATRIX_METRICS entre todos
+    os arquivos que a representam e aponta quem diverge da maioria (membros
+    fora do maior grupo de concordância; sem maioria estrita, ninguém é
+    apontado).
+
+    Returns:
+        dict: Relatório (também gravado em JSON ou CSV longo)
+    """
+    labels = implementation_labels(dirs)
+    groups = group_by_image(dirs, labels)
+
+    report = {'implementations': labels, 'tolerance': tolerance,
+              'images': []}
+    for key in sorted(groups):
+        members = groups[key]
+        shapes = {m['pixels'].shape for m in members}
+        if len(shapes) > 1:
+            report['images'].append({
+                'id': key, 'members': [f"{m['label']}/{m['name']}"
+                                       for m in members],
+                'error': 'Dimensões diferentes: ' + ', '.join(
+                    f"{w}x{h}" for h, w in sorted(shapes))})
+            continue
+
+        stack = np.stack([m['pixels'] for m in members])
+        top = 255 if stack.dtype == np.uint8 else 65535
+        matrices = pairwise_metrics(stack, top)
+        agree = agreement_groups(matrices['max_diff_value'], tolerance)
+        majority = (agree[0] if len(agree) == 1
+                    or len(agree[0]) > len(agree[1]) else [])
+        height, width = stack.shape[1:]
+        report['images'].append({
+            'id': key,
+            'dimensions': (width, height),
+            'members': [f"{m['label']}/{m['name']}" for m in members],
+            'labels': [m['label'] for m in members],
+            'paths': [m['path'] for m in members],
+            'groups': agree,
+            'majority': majority,
+            'dissenters': [i for i in range(len(members))
+                           if majority and i not in majority],
+            'matrices': {k: v.tolist() for k, v in matrices.items()},
+        })
+
+    if output_path.endswith('.csv'):
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['image', 'a', 'b', *MATRIX_METRICS])
+            for image in report['images']:
+                if 'error' in image:
+                    continue
+                n = len(image['members'])
+                for i in range(n):
+                    for j in range(i + 1, n):
+                        writer.writerow([image['id'], image['members'][i],
+                                         image['members'][j]] +
+                                        [image['matrices'][k][i][j]
+                                         for k in MATRIX_METRICS])
+    else:
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+    return report
+
+
+def matrix_history(report: Dict, history: Dict) -> List[Dict]:
+    """Entradas do histórico da matriz: cada arquivo contra o da 1ª pasta."""
+    entries = []
+    for image in report['images']:
+        if 'error' in image:
+            continue
+        matrices = image['matrices']
+        for i in range(1, len(image['members'])):
+            result = {k: matrices[k][0][i] for k in MATRIX_METRICS}
+            result['identical'] = result['max_diff_value'] == 0
+            entries.append(history_entry(
+                image['paths'][i], image['paths'][0], result, 'matrix',
+                history, image['labels'][i], image['id']))
+    return entries
+
+
+def print_matrix_report(report: Dict, output_path: str, elapsed: float,
+                        max_table: int = 8):
+    """Imprime grupos de concordância, divergentes e (se pequena) a matriz de MAE."""
+    print(f"\n{'='*70}")
+    print("MATRIZ ENTRE IMPLEMENTAÇÕES")
+    print(f"{'='*70}")
+    print(f"Implementações: {', '.join(report['implementations'])}")
+    files = sum(len(image['members']) for image in report['images'])
+    print(f"Imagens: {len(report['images'])} | Arquivos: {files} (cada um "
+          f"lido uma vez) | Tolerância: {report['tolerance']} | "
+          f"Tempo: {elapsed:.2f} s")
+
+    dissent = {label: 0 for label in report['implementations']}
+    for image in report['images']:
+        print(f"\n{image['id']} ({len(image['members'])} arquivos)")
+        if 'error' in image:
+            print(f"   ✗ {image['error']}")
+            continue
+        members = image['members']
+        mae = np.array(image['matrices']['mae'])
+        ssim = np.array(image['matrices']['ssim'])
+        for group in image['groups']:
+            if len(group) == 1 and group != image['majority']:
+                continue  # Aparece abaixo como divergente
+            tag = 'maioria' if group == image['majority'] else 'grupo'
+            names = ', '.join(members[i] for i in group[:6])
+            more = f" (+{len(group) - 6})" if len(group) > 6 else ''
+            print(f"   [{tag}] {len(group)} concordam: {names}{more}")
+        for i in image['dissenters']:
+            others = [j for j in range(len(members)) if j != i]
+            dissent[image['labels'][i]] += 1
+            print(f"   ✗ {members[i]} diverge: MAE médio {mae[i, others].mean():.4f}, "
+                  f"SSIM médio {np.nanmean(ssim[i, others]):.4f}")
+        if not image['majority']:
+            print("   ? Sem maioria: não dá para apontar quem diverge")
+
+        if len(members) <= max_table:
+            short = [m if len(m) <= 24 else '…' + m[-23:] for m in members]
+            print(f"\n   MAE {'':24}" + ''.join(f"{j:>9}" for j in range(len(members))))
+            for i, name in enumerate(short):
+                print(f"   {i} {name:<26}" +
+                      ''.join(f"{mae[i, j]:9.4f}" for j in range(len(members))))
+
+    print(f"\nArquivos divergentes por implementação:")
+    for label, count in dissent.items():
+        print(f"   {label}: {count}")
+    print(f"\n✓ Matrizes salvas em: {output_path}")
+
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(
+        description="Compara imagens PGM filtradas pixel a pixel",
+        epilog="Exemplo: python3 compare_filtered.py "
+               "../Core/pgms/filtered_20251108_120000.pgm "
+               "../../v1-kuwahara/imgs_filtered/mona_lisa.ascii.pgm")
+    parser.add_argument('images', nargs='*', metavar='imagem.pgm',
+                        help="Par de imagens (modo de um par)")
+    parser.add_argument('--manifest',
+                        help="CSV com 'captura,referencia[,referencia...]' por linha")
+    parser.add_argument('--candidates', metavar='GLOB',
+                        help="Glob das capturas (ex.: '../Core/pgms/filtered_*.pgm')")
+    parser.add_argument('--reference', action='append', default=[],
+                        help="Referência para --candidates; repita para usar a "
+                             "de menor MAE entre várias")
+    parser.add_argument('--summary', default=None,
+                        help="Tabela resumo (.csv ou .json; padrão: "
+                             "heatmaps/batch_summary.csv)")
+    parser.add_argument('--heatmap-threshold', type=float, default=None,
+                        metavar='MAE',
+                        help="Gera heatmap dos pares com MAE acima do limiar "
+                             "(padrão: nenhum)")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Processos do pool (padrão: núcleos da CPU)")
+    parser.add_argument('--heatmap-style', choices=HEATMAP_STYLES,
+                        default='fast',
+                        help="fast: mapa de categorias em PNG indexado (sem "
+                             "matplotlib); annotated: figura de 3 painéis "
+                             "com matplotlib (padrão: fast)")
+    parser.add_argument('--block-rows', type=int, default=None, metavar='N',
+                        help="Compara um par grande em blocos de N linhas "
+                             "(arquivos mapeados em memória, P2 ou P5); só "
+                             "com o heatmap rápido e sem o índice")
+    parser.add_argument('--matrix', nargs='+', metavar='PASTA',
+                        help="Matriz entre N pastas de implementações "
+                             "([rotulo=]PASTA), arquivos casados por nome ou "
+                             "pela imagem mais próxima")
+    parser.add_argument('--tolerance', type=int, default=0,
+                        help="Diferença máxima para dois arquivos da matriz "
+                             "concordarem (padrão: 0)")
+    parser.add_argument('--history', default=run_history.DEFAULT_DB,
+                        metavar='BANCO',
+                        help="Histórico SQLite dos resultados (padrão: "
+                             "run_history.sqlite)")
+    parser.add_argument('--no-history', action='store_true',
+                        help="Não grava os resultados no histórico")
+    parser.add_argument('--implementation', default=None,
+                        help="Rótulo da implementação das capturas no "
+                             "histórico (padrão: nome da pasta)")
+    parser.add_argument('--radius', type=int, default=KUWAHARA_WINDOW // 2,
+                        help="Raio do filtro registrado no histórico "
+                             f"(padrão: {KUWAHARA_WINDOW // 2})")
+    parser.add_argument('--no-index', action='store_true',
+                        help="Não consulta/atualiza o índice .pgm_index.json "
+                             "(sempre lê e compara os pixels)")
+    parser.add_argument('--quadrants', nargs=2, metavar=('MAPA1', 'MAPA2'),
+                        help="Mapas de quadrantes (.qmap) das duas imagens, ou "
+                             f"'{QUADRANT_INFER}' para deduzir da --original; "
+                             "gera a camada de discordância de quadrantes")
+    parser.add_argument('--original', metavar='ORIGINAL.pgm',
+                        help="Imagem de entrada do filtro (para "
+                             f"--quadrants {QUADRANT_INFER}, com a janela de "
+                             "--radius)")
+    args = parser.parse_args()
+
+    # Criar diretório para heatmaps
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    heatmaps_dir = os.path.join(script_dir, 'heatmaps')
+    os.makedirs(heatmaps_dir, exist_ok=True)
+    history = (None if args.no_history else
+               {'db': args.history, 'radius': args.radius,
+                'implementation': args.implementation})
+
+    if args.matrix:
+        if len(args.matrix) < 2:
+            parser.error("--matrix exige ao menos duas pastas")
+        output_path = args.summary or os.path.join(heatmaps_dir,
+                                                   'matrix_summary.json')
+        t0 = time.monotonic()
+        report = run_matrix(args.matrix, output_path, args.tolerance)
+        print_matrix_report(report, output_path, time.monotonic() - t0)
+        if history:
+            save_history(history, matrix_history(report, history))
+        return
+
+    if not args.manifest and not args.candidates:
+        if len(args.images) != 2:
+            parser.error("informe duas imagens, --manifest ou --candidates")
+        if args.block_rows and args.heatmap_style == 'annotated':
+            parser.error("--block-rows não gera o heatmap anotado")
+        if args.block_rows and args.quadrants:
+            parser.error("--block-rows não gera a camada de quadrantes")
+        if (args.quadrants and QUADRANT_INFER in args.quadrants
+                and not args.original):
+            parser.error(f"--quadrants {QUADRANT_INFER} exige --original")
+        # O índice lê a imagem inteira; no modo em blocos ele fica de fora
+        index = None if args.no_index or args.block_rows else PgmIndex()
+        run_pair(args.images[0], args.images[1], heatmaps_dir,
+                 args.heatmap_style, index, args.block_rows, history,
+                 args.quadrants, args.original, 2 * args.radius + 1)
+        return
+
+    pairs = []
+    if args.manifest:
+        pairs += load_manifest(args.manifest)
+    if args.candidates:
+        if not args.reference:
+            parser.error("--candidates exige ao menos uma --reference")
+        references = [os.path.abspath(r) for r in args.reference]
+        pairs += [(os.path.abspath(c), references)
+                  for c in sorted(glob.glob(args.candidates))
+                  if os.path.abspath(c) not in references]
+    if not pairs:
+        print("\n✗ Nenhum par para comparar")
+        sys.exit(1)
+
+    output_path = args.summary or os.path.join(heatmaps_dir, 'batch_summary.csv')
+    t0 = time.monotonic()
+    rows = run_batch(pairs, output_path, heatmaps_dir,
+                     args.heatmap_threshold, args.jobs, args.heatmap_style,
+                     not args.no_index)
+    print_batch_summary(rows, output_path, time.monotonic() - t0)
+    if history:
+        save_history(history, [history_entry(r['candidate'], r['reference'],
+                                             r, 'batch', history)
+                               for r in rows if not r['error']])
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,515 @@
+"""
+Emulador em software do STM32 (modo STREAMING) para testes sem a placa.
+
+Reproduz o protocolo do firmware em Core/Src/main.c:
+
+    1. Recebe 46 linhas (FASE 1)
+    2. Envia cabeçalho P2 + 45 linhas filtradas (0-44)
+    3. Envia #READY2# e aguarda #GO2#
+    4. Recebe 46 linhas (FASE 2) e envia 45 linhas filtradas (45-89)
+
+O emulador pode ser exposto como pseudo-terminal (pty) ou como servidor TCP,
+que o pyserial abre com uma URL socket://host:porta.
+
+Com --compress o emulador equivale ao firmware compilado com WIRE_CODEC
+(linhas em quadros RAW/DELTA/RLE, ver row_codec.py).
+
+Com --noise cada byte enviado pela placa é trocado por 0xFF (erro de
+enquadramento) com a probabilidade dada, para testar a retransmissão do
+writer_reader.py.
+
+Uso:
+    python3 device_emulator.py --pty
+    python3 device_emulator.py --tcp 7777 --baud 115200 --compute-delay 0.3
+
+Exemplo (em outro terminal):
+    python3 writer_reader.py ../../v1-kuwahara/imgs_original/pepper.ascii.pgm \\
+                             --port socket://localhost:7777
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import math
+import os
+import random
+import select
+import socket
+import sys
+import threading
+import time
+import tty
+
+from row_codec import TAG_NAMES, CodecError, crc8, decode_payload, encode_row
+
+# Constantes do firmware (Core/Src/main.c)
+IMG_SIZE = 90
+KUWAHARA_WINDOW = 3
+BUFFER_SIZE = 46
+MAX_PIXEL_VALUE = 255
+
+HANDSHAKE_READY = "#READY2#"
+HANDSHAKE_GO = "#GO2#"
+
+# Timeouts do firmware (em segundos)
+RX_TIMEOUT = 3600.0
+GO2_TIMEOUT = 30.0
+
+# HAL_Delay() do laço principal (em segundos)
+DELAY_BEFORE_HEADER = 0.750
+DELAY_BEFORE_PHASE1 = 0.150
+DELAY_BEFORE_PHASE2 = 0.100
+
+# 8N1: 1 start bit + 8 bits de dados + 1 stop bit
+BITS_PER_BYTE = 10
+
+
+class Throttle:
+    """Limita a taxa de bytes de um sentido do link ao baudrate configurado."""
+
+    def __init__(self, baudrate):
+        self.byte_time = BITS_PER_BYTE / baudrate if baudrate else 0.0
+        self.next_time = 0.0
+
+    def pace(self, nbytes):
+        """Bloqueia até que 'nbytes' bytes caibam no tempo do baudrate."""
+        if not self.byte_time:
+            return
+        now = time.monotonic()
+        self.next_time = max(self.next_time, now) + nbytes * self.byte_time
+        delay = self.next_time - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class PtyLink:
+    """Lado do dispositivo de um pseudo-terminal."""
+
+    def __init__(self):
+        self.master_fd, self.slave_fd = os.openpty()
+        # Modo raw: sem eco e sem tradução de \n (como uma UART)
+        tty.setraw(self.slave_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+
+    def read(self, timeout):
+        """Lê até 4096 bytes; retorna b'' em timeout."""
+        ready, _, _ = select.select([self.master_fd], [], [], timeout)
+        if not ready:
+            return b''
+        try:
+            return os.read(self.master_fd, 4096)
+        except OSError:
+            return b''
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master_fd, view)
+            view = view[written:]
+
+    def close(self):
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+
+class SocketLink:
+    """Lado do dispositivo de uma conexão TCP (socket:// no pyserial)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed = False
+
+    def read(self, timeout):
+        """Lê até 4096 bytes; retorna b'' em timeout."""
+        ready, _, _ = select.select([self.conn], [], [], timeout)
+        if not ready:
+            return b''
+        data = self.conn.recv(4096)
+        if not data:
+            self.closed = True
+            raise ConnectionError("Host desconectou")
+        return data
+
+    def write(self, data):
+        self.conn.sendall(data)
+
+    def close(self):
+        self.conn.close()
+
+
+def filter_buffered_rows(image_buffer, start_line, end_line, buffer_start_line,
+                         width=IMG_SIZE, height=IMG_SIZE, window=KUWAHARA_WINDOW):
+    """
+    Porta de kuwahara_filter_buffered() (Core/Src/main.c): filtra as linhas
+    start_line..end_line da imagem a partir do buffer parcial.
+
+    Gera cada linha filtrada assim que fica pronta (o emulador a envia
+    antes de calcular a próxima, como o firmware). Também é uma engine do
+    fuzz_filters.py, com a imagem inteira no buffer.
+
+    Yields:
+        list: Pixels filtrados de uma linha
+    """
+    buffer_size = len(image_buffer)
+    window_size = window
+    quadrant_size = (window_size + 1) // 2
+    quadrant_order = ((1, 1), (0, 1), (1, 0), (0, 0))
+
+    for pixel_y in range(start_line, end_line + 1):
+        buffer_y = pixel_y - start_line + buffer_start_line
+        row_out = []
+
+        for pixel_x in range(width):
+            window_top_y = pixel_y - (window_size // 2)
+            window_left_x = pixel_x - (window_size // 2)
+
+            best_std_dev = 1e300
+            best_mean = image_buffer[buffer_y][pixel_x]
+
+            for quadrant_y, quadrant_x in quadrant_order:
+                total = 0
+                total_sq = 0
+                pixel_count = 0
+                valid_quadrant = True
+
+                for offset_y in range(quadrant_size):
+                    for offset_x in range(quadrant_size):
+                        read_y = window_top_y + \
+                            (quadrant_size - 1 if quadrant_y else 0) + offset_y
+                        read_x = window_left_x + \
+                            (quadrant_size - 1 if quadrant_x else 0) + offset_x
+
+                        # BORDER_REFLECT_101
+                        if read_y < 0:
+                            read_y = -read_y
+                        if read_y >= height:
+                            read_y = 2 * height - read_y - 2
+                        if read_x < 0:
+                            read_x = -read_x
+                        if read_x >= width:
+                            read_x = 2 * width - read_x - 2
+
+                        # Clamping
+                        read_y = min(max(read_y, 0), height - 1)
+                        read_x = min(max(read_x, 0), width - 1)
+
+                        buf_y = read_y - start_line + buffer_start_line
+                        if 0 <= buf_y < buffer_size:
+                            value = image_buffer[buf_y][read_x]
+                            total += value
+                            total_sq += value * value
+                            pixel_count += 1
+                        else:
+                            valid_quadrant = False
+                            break
+                    if not valid_quadrant:
+                        break
+
+                if valid_quadrant and pixel_count > 1:
+                    mean = total / pixel_count
+                    variance = (total_sq - total * total /
+                                pixel_count) / pixel_count
+                    std_dev = math.sqrt(variance) if variance > 0 else 0.0
+                    if std_dev < best_std_dev:
+                        best_std_dev = std_dev
+                        best_mean = mean
+
+            row_out.append(int(best_mean))
+
+        yield row_out
+
+
+class DeviceEmulator:
+    """
+    Máquina de estados equivalente ao laço principal do firmware.
+
+    Args:
+        link: Objeto com read(timeout) e write(data) (PtyLink ou SocketLink)
+        baudrate: Baudrate simulado (0 desativa a limitação de taxa)
+        compute_delay: Tempo extra (s) por linha filtrada, simulando o Cortex-M0
+        firmware_delays: Reproduz os HAL_Delay() do firmware
+        compress: Linhas em quadros RAW/DELTA/RLE (firmware com WIRE_CODEC)
+        stop_event: threading.Event para encerrar o laço
+    """
+
+    def __init__(self, link, baudrate=115200, compute_delay=0.0,
+                 firmware_delays=True, compress=False, noise=0.0, seed=None,
+                 stop_event=None):
+        self.link = link
+        self.rx_throttle = Throttle(baudrate)
+        self.tx_throttle = Throttle(baudrate)
+        self.compute_delay = compute_delay
+        self.firmware_delays = firmware_delays
+        self.compress = compress
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.stop_event = stop_event or threading.Event()
+        self.rx_pending = bytearray()
+        self.image_buffer = [[0] * IMG_SIZE for _ in range(BUFFER_SIZE)]
+
+    # ---------- UART ----------
+
+    def _receive_byte(self, timeout):
+        """Equivalente a HAL_UART_Receive(&huart2, &b, 1, timeout)."""
+        deadline = time.monotonic() + timeout
+        while not self.rx_pending:
+            if self.stop_event.is_set():
+                raise ConnectionError("Emulador encerrado")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.rx_pending += self.link.read(min(remaining, 0.1))
+        byte = self.rx_pending[0]
+        del self.rx_pending[0]
+        self.rx_throttle.pace(1)
+        return byte
+
+    def _send(self, text):
+        self._send_bytes(text.encode('ascii'))
+
+    def _send_bytes(self, data):
+        if self.noise:
+            data = bytes(0xFF if self.rng.random() < self.noise else b
+                         for b in data)
+        self.tx_throttle.pace(len(data))
+        self.link.write(data)
+
+    def _delay(self, seconds):
+        if self.firmware_delays:
+            time.sleep(seconds)
+
+    # ---------- Protocolo ----------
+
+    def receive_line(self, line_buffer):
+        """Equivalente a receive_line(): texto ou quadro, conforme o modo."""
+        if self.compress:
+            return self.receive_line_codec(line_buffer)
+        return self.receive_line_uart(line_buffer)
+
+    def receive_line_codec(self, line_buffer):
+        """Equivalente a receive_line_codec(): lê e decodifica um quadro."""
+        tag = self._receive_byte(RX_TIMEOUT)
+        while tag in (0x0A, 0x0D):
+            tag = self._receive_byte(RX_TIMEOUT)
+        if tag is None or tag not in TAG_NAMES:
+            return False
+        size = self._receive_byte(RX_TIMEOUT)
+        if size is None:
+            return False
+        payload = bytearray()
+        for _ in range(size):
+            b = self._receive_byte(RX_TIMEOUT)
+            if b is None:
+                return False
+            payload.append(b)
+        crc = self._receive_byte(RX_TIMEOUT)
+        if crc is None or crc != crc8(bytes((tag, size)) + payload):
+            return False
+        try:
+            line_buffer[:] = decode_payload(tag, bytes(payload), IMG_SIZE)
+        except CodecError:
+            return False
+        return True
+
+    def receive_line_uart(self, line_buffer):
+        """Equivalente a receive_line_uart(): retorna True se 90 pixels."""
+        pixel_count = 0
+        current_value = 0
+        has_digit = False
+
+        while pixel_count < IMG_SIZE:
+            rx_byte = self._receive_byte(RX_TIMEOUT)
+            if rx_byte is None:
+                return False  # Timeout
+            if 0x30 <= rx_byte <= 0x39:
+                current_value = current_value * 10 + (rx_byte - 0x30)
+                has_digit = True
+            elif rx_byte in (0x20, 0x0A, 0x0D):
+                if has_digit:
+                    # pixel_t é uint8_t no firmware
+                    line_buffer[pixel_count] = current_value & 0xFF
+                    pixel_count += 1
+                    current_value = 0
+                    has_digit = False
+                if rx_byte == 0x0A:
+                    break
+        return pixel_count == IMG_SIZE
+
+    def wait_token(self, token, timeout):
+        """Equivalente a uart_wait_token(): procura 'token' no fluxo."""
+        matched = 0
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            b = self._receive_byte(0.1)
+            if b is None:
+                continue
+            if b == ord(token[matched]):
+                matched += 1
+                if matched == len(token):
+                    return True
+            else:
+                matched = 1 if b == ord(token[0]) else 0
+        return False
+
+    def filter_buffered(self, start_line, end_line, buffer_start_line):
+        """kuwahara_filter_buffered(): filtra e envia as linhas."""
+        for row_out in filter_buffered_rows(self.image_buffer, start_line,
+                                            end_line, buffer_start_line):
+            if self.compute_delay:
+                time.sleep(self.compute_delay)
+            if self.compress:
+                self._send_bytes(encode_row(row_out))
+            else:
+                self._send(' '.join(str(p) for p in row_out) + '\n')
+
+    def run_cycle(self):
+        """Executa uma iteração do while(1) do firmware (FASE 1 + FASE 2)."""
+        # FASE 1: Recebe linhas 0-45
+        for i in range(BUFFER_SIZE):
+            if not self.receive_line(self.image_buffer[i]):
+                self._send(f"ERROR: Failed to receive line {i}\n")
+                break
+
+        self._delay(DELAY_BEFORE_HEADER)
+        self._send(f"P2\n{IMG_SIZE} {IMG_SIZE}\n{MAX_PIXEL_VALUE}\n")
+
+        self._delay(DELAY_BEFORE_PHASE1)
+        self.filter_buffered(0, 44, 0)
+
+        self._send(HANDSHAKE_READY + "\n")
+
+        if not self.wait_token(HANDSHAKE_GO, GO2_TIMEOUT):
+            self._send("ERROR: GO2 timeout\n")
+            return
+
+        # FASE 2: Recebe linhas 44-89
+        ok_phase2 = True
+        for i in range(BUFFER_SIZE):
+            if not self.receive_line(self.image_buffer[i]):
+                self._send(f"ERROR: Failed to receive line {44 + i}\n")
+                ok_phase2 = False
+                break
+
+        self._delay(DELAY_BEFORE_PHASE2)
+
+        if ok_phase2:
+            self.filter_buffered(45, 89, 1)
+        else:
+            self._send(
+                "SKIP: Phase 2 processing skipped due to incomplete reception.\n")
+
+    def run(self):
+        """Laço principal; termina quando o link cai ou stop_event é setado."""
+        try:
+            while not self.stop_event.is_set():
+                self.run_cycle()
+        except (ConnectionError, OSError):
+            pass
+
+
+def serve_tcp(port, host='localhost', stop_event=None, ready_event=None,
+              bound_port=None, **emulator_kwargs):
+    """
+    Atende conexões TCP, uma por vez, cada uma como um "reset" da placa.
+
+    Args:
+        port: Porta TCP (0 escolhe uma porta livre)
+        bound_port: Lista onde a porta efetivamente usada é anotada
+    """
+    stop_event = stop_event or threading.Event()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(1)
+    if bound_port is not None:
+        bound_port.append(server.getsockname()[1])
+    if ready_event is not None:
+        ready_event.set()
+
+    try:
+        while not stop_event.is_set():
+            ready, _, _ = select.select([server], [], [], 0.2)
+            if not ready:
+                continue
+            conn, _ = server.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            link = SocketLink(conn)
+            try:
+                DeviceEmulator(link, stop_event=stop_event,
+                               **emulator_kwargs).run()
+            finally:
+                link.close()
+    finally:
+        server.close()
+
+
+def start_emulators(count, **emulator_kwargs):
+    """
+    Inicia 'count' emuladores TCP em threads (portas livres).
+
+    Returns:
+        tuple: (lista de URLs socket://, threading.Event para encerrá-los)
+    """
+    stop_event = threading.Event()
+    urls = []
+    for _ in range(count):
+        ready_event = threading.Event()
+        bound_port = []
+        thread = threading.Thread(
+            target=serve_tcp, args=(0,),
+            kwargs=dict(stop_event=stop_event, ready_event=ready_event,
+                        bound_port=bound_port, **emulator_kwargs),
+            daemon=True)
+        thread.start()
+        ready_event.wait()
+        urls.append(f"socket://localhost:{bound_port[0]}")
+    return urls, stop_event
+
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(
+        description="Emulador do STM32 (protocolo de writer_reader.py)")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--pty', action='store_true',
+                      help="Expõe o emulador como pseudo-terminal")
+    mode.add_argument('--tcp', type=int, metavar='PORTA',
+                      help="Expõe o emulador em socket://localhost:PORTA")
+    parser.add_argument('--baud', type=int, default=115200,
+                        help="Baudrate simulado (0 = sem limitação)")
+    parser.add_argument('--compute-delay', type=float, default=0.0,
+                        help="Atraso extra por linha filtrada (s)")
+    parser.add_argument('--no-firmware-delays', action='store_true',
+                        help="Ignora os HAL_Delay() do firmware")
+    parser.add_argument('--compress', action='store_true',
+                        help="Quadros RAW/DELTA/RLE (firmware com WIRE_CODEC)")
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help="Probabilidade de corromper cada byte enviado")
+    parser.add_argument('--seed', type=int,
+                        help="Semente do gerador de ruído")
+    args = parser.parse_args()
+
+    emulator_kwargs = dict(baudrate=args.baud,
+                           compute_delay=args.compute_delay,
+                           firmware_delays=not args.no_firmware_delays,
+                           compress=args.compress,
+                           noise=args.noise,
+                           seed=args.seed)
+
+    try:
+        if args.pty:
+            link = PtyLink()
+            print(f"Emulador STM32 em: {link.port_name}")
+            print("Ctrl+C para encerrar")
+            DeviceEmulator(link, **emulator_kwargs).run()
+        else:
+            print(f"Emulador STM32 em: socket://localhost:{args.tcp}")
+            print("Ctrl+C para encerrar")
+            serve_tcp(args.tcp, **emulator_kwargs)
+    except KeyboardInterrupt:
+        print("\nEmulador encerrado.")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,593 @@
+"""
+Planejador de configuração do firmware: SRAM, flash e tempo de link.
+
+Para um tamanho de imagem, janela, tipo de pixel, baudrate e codificação
+do link, calcula o que hoje é feito à mão em Core/Src/main.c (IMG_SIZE,
+BUFFER_SIZE, divisão em fases):
+
+    - SRAM de image_buffer (BUFFER_SIZE x largura x sizeof(pixel_t)), mais
+      row_out/tx_frame no modo WIRE_CODEC, somados ao resto do build;
+    - flash do programa (+ a imagem inteira no modo FLASH);
+    - número de fases e linhas reenviadas na sobreposição entre fases;
+    - bytes no fio (texto ou quadros RAW/DELTA/RLE);
+    - tempo total previsto (envio, atrasos do firmware, filtro e resposta).
+
+e lista as configurações viáveis, da mais rápida para a mais lenta.
+
+O uso de memória do build vem do map do linker (Debug/stm32.map). Os bytes
+no fio vêm de uma imagem de amostra (exatos se ela tiver o tamanho pedido).
+O tempo usa um modelo do Cortex-M0 que pode ser calibrado com a telemetria
+gravada pelo writer_reader.py (Core/pgms/*.json) ou com o emulador local.
+
+Uso:
+    python3 device_planner.py [--size 160x120] [--window 3] [--baud 115200 460800]
+                              [--encoding text|codec|both] [--devices N]
+                              [--calibrate telemetria.json ...] [--calibrate-emulator]
+                              [--image amostra.pgm] [--flash-mode] [--top 10]
+                              [--json plano.json]
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import statistics
+import time
+
+import numpy as np
+
+from device_emulator import (BITS_PER_BYTE, BUFFER_SIZE, DELAY_BEFORE_HEADER,
+                             DELAY_BEFORE_PHASE1, DELAY_BEFORE_PHASE2,
+                             HANDSHAKE_GO, HANDSHAKE_READY, IMG_SIZE)
+from kuwahara_ref import KUWAHARA_WINDOW, kuwahara_rows, reflect_indices
+from row_codec import ascii_size, encode_row
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MAP = os.path.join(SCRIPT_DIR, '..', 'Debug', 'stm32.map')
+DEFAULT_SAMPLE = os.path.join(SCRIPT_DIR, '..', '..', 'v1-kuwahara',
+                              'imgs_original', 'mona_lisa.ascii.pgm')
+
+# Build atual (Debug/stm32.map), usado se o map não for encontrado:
+# RAM/FLASH totais, .data + .bss sem image_buffer, heap + pilha reservados
+# (_Min_Heap_Size + _Min_Stack_Size) e flash ocupada
+MAP_DEFAULTS = {
+    'ram': 0x2000,
+    'flash': 0x10000,
+    'ram_fixed': 0x128c - 0x102c,
+    'ram_reserved': 0x604,
+    'flash_used': 0x5cb0,
+    'source': 'valores do build de referência',
+}
+
+PIXEL_BYTES = {'uint8': 1, 'uint16': 2}
+PIXEL_MAX = {'uint8': 255, 'uint16': 65535}
+CODEC_FRAME_OVERHEAD = 3     # tag + tamanho + CRC
+CODEC_MAX_PAYLOAD = 255      # tamanho do payload cabe em 1 byte
+CODEC_FLASH_ESTIMATE = 1024  # código do WIRE_CODEC (estimado; o map é sem ele)
+
+# Modelo do filtro no Cortex-M0 (HSI/2 x PLL 12 = 48 MHz, double emulado em
+# software): cada quadrante custa média, variância e sqrt, mais a leitura de
+# cada pixel. Estimativa; --calibrate ajusta a escala.
+CPU_HZ = 48_000_000
+CYCLES_PER_QUADRANT = 1500
+CYCLES_PER_READ = 12
+
+DEFAULT_PARAMS = {
+    'upload_efficiency': 1.0, # fração do baudrate na subida (recepção na placa)
+    'compute_scale': 1.0,     # tempo medido / tempo do modelo de ciclos
+    'handshake': 0.100,       # #READY2# -> início do envio (2 pausas de 50 ms
+                              # em start_phase2() do writer_reader.py), s
+    'source': 'modelo sem calibração',
+}
+
+# Firmware atual (Core/Src/main.c), marcado na tabela
+CURRENT = {'mode': 'streaming', 'buffer_rows': BUFFER_SIZE, 'pixel': 'uint8',
+           'encoding': 'text', 'baud': 115200}
+
+
+# ---------- Memória ----------
+
+def read_map(path=DEFAULT_MAP):
+    """
+    Uso de memória do build a partir do map do linker.
+
+    Returns:
+        dict: Mesmas chaves de MAP_DEFAULTS
+    """
+    try:
+        with open(path) as f:
+            text = f.read()
+    except OSError:
+        return dict(MAP_DEFAULTS)
+
+    def section(name):
+        match = re.search(rf'^{re.escape(name)}\s+0x([0-9a-f]+)\s+0x([0-9a-f]+)',
+                          text, re.MULTILINE)
+        return (int(match.group(1), 16), int(match.group(2), 16)) if match else None
+
+    def region(name):
+        match = re.search(rf'^{name}\s+0x([0-9a-f]+)\s+0x([0-9a-f]+)', text,
+                          re.MULTILINE)
+        return int(match.group(2), 16) if match else None
+
+    data, bss = section('.data'), section('.bss')
+    heap_stack = re.search(r'^\._user_heap_stack\s*\n\s+0x[0-9a-f]+\s+0x([0-9a-f]+)',
+                           text, re.MULTILINE)
+    buffer = re.search(r'^ \.bss\.image_buffer\s*\n\s+0x[0-9a-f]+\s+0x([0-9a-f]+)',
+                       text, re.MULTILINE)
+    load = re.search(r'^\.data\s+0x[0-9a-f]+\s+0x([0-9a-f]+) load address 0x([0-9a-f]+)',
+                     text, re.MULTILINE)
+    if not (data and bss and heap_stack and load):
+        return dict(MAP_DEFAULTS)
+
+    flash_origin = re.search(r'^FLASH\s+0x([0-9a-f]+)', text, re.MULTILINE)
+    return {
+        'ram': region('RAM') or MAP_DEFAULTS['ram'],
+        'flash': region('FLASH') or MAP_DEFAULTS['flash'],
+        'ram_fixed': data[1] + bss[1] - (int(buffer.group(1), 16) if buffer else 0),
+        'ram_reserved': int(heap_stack.group(1), 16),
+        'flash_used': (int(load.group(2), 16) + int(load.group(1), 16)
+                       - int(flash_origin.group(1), 16) if flash_origin
+                       else MAP_DEFAULTS['flash_used']),
+        'source': os.path.relpath(path),
+    }
+
+
+def memory_usage(config, width, height, memory):
+    """
+    SRAM e flash de uma configuração.
+
+    Returns:
+        tuple: (sram em bytes, flash em bytes)
+    """
+    pixel = PIXEL_BYTES[config['pixel']]
+    sram = memory['ram_fixed'] + memory['ram_reserved']
+    flash = memory['flash_used']
+    if config['mode'] == 'flash':
+        # Imagem inteira como const na flash; nada de buffer na SRAM
+        flash += width * height * pixel
+    else:
+        sram += config['buffer_rows'] * width * pixel
+    if config['encoding'] == 'codec':
+        # row_out + tx_frame + rx_crc
+        sram += width * pixel + width + CODEC_FRAME_OVERHEAD + 1
+        flash += CODEC_FLASH_ESTIMATE
+    return sram, flash
+
+
+# ---------- Fases ----------
+
+def phase_plan(height, buffer_rows, window):
+    """
+    Divide a imagem em fases de 'buffer_rows' linhas recebidas.
+
+    Como no firmware, a primeira fase filtra a partir da borda superior e
+    as demais descartam 'window // 2' linhas de contexto em cada lado; o
+    halo fora da imagem é refletido no host (ver plan_slot() do
+    writer_reader.py).
+
+    Returns:
+        list: (primeira linha filtrada, última, linhas de entrada enviadas)
+    """
+    half = window // 2
+    if height <= buffer_rows:
+        return [(0, height - 1, reflect_indices(np.arange(buffer_rows), height))]
+    if buffer_rows < 2 * half + 1:
+        raise ValueError("buffer menor que a janela")
+
+    phases = []
+    start, base = 0, 0
+    while start < height:
+        if base + buffer_rows >= height:
+            last = height - 1
+        else:
+            last = base + buffer_rows - 1 - half
+        rows = reflect_indices(np.arange(base, base + buffer_rows), height)
+        phases.append((start, last, rows))
+        start = last + 1
+        base = start - half
+    return phases
+
+
+# ---------- Bytes no fio ----------
+
+def wire_profile(sample, width, height, window, maxval):
+    """
+    Bytes por linha de entrada e de saída, por codificação.
+
+    Se a amostra tem o tamanho pedido os valores são exatos; senão cada
+    linha usa a média de bytes por pixel da amostra.
+
+    Returns:
+        dict: {codificação: (bytes das linhas de entrada, das de saída)}
+    """
+    filtered = kuwahara_rows(sample, range(sample.shape[0]), window)
+    profile = {}
+    for encoding, overhead, size in (
+            ('text', 0, ascii_size),
+            ('codec', CODEC_FRAME_OVERHEAD, lambda row: len(encode_row(row)))):
+        rows_in = np.array([size([int(v) for v in row]) for row in sample])
+        rows_out = np.array([size([int(v) for v in row]) for row in filtered])
+        if sample.shape != (height, width):
+            per_pixel_in = (rows_in.sum() - overhead * len(rows_in)) / sample.size
+            per_pixel_out = (rows_out.sum() - overhead * len(rows_out)) / sample.size
+            if encoding == 'codec':
+                # Payload nunca passa do RAW (1 byte por pixel)
+                per_pixel_in, per_pixel_out = min(per_pixel_in, 1), min(per_pixel_out, 1)
+            rows_in = np.full(height, overhead + per_pixel_in * width)
+            rows_out = np.full(height, overhead + per_pixel_out * width)
+        profile[encoding] = (rows_in, rows_out)
+    profile['header'] = len(f"P2\n{width} {height}\n{maxval}\n")
+    return profile
+
+
+# ---------- Tempo ----------
+
+def compute_row_time(width, window, params):
+    """Tempo (s) do filtro para uma linha de 'width' pixels."""
+    quadrant = (window + 1) // 2
+    cycles = 4 * (CYCLES_PER_QUADRANT + quadrant * quadrant * CYCLES_PER_READ)
+    return width * cycles / CPU_HZ * params['compute_scale']
+
+
+def predict(config, width, height, window, profile, params, devices=1):
+    """
+    Tempo e tráfego previstos de uma configuração.
+
+    Returns:
+        dict: phases, overlap_rows, bytes_up, bytes_down e tempos (s)
+    """
+    rate = config['baud'] / BITS_PER_BYTE
+    upload_rate = rate * params['upload_efficiency']
+    rows_in, rows_out = profile[config['encoding']]
+    compute_row = compute_row_time(width, window, params)
+    header = profile['header']
+
+    if config['mode'] == 'flash':
+        # Imagem gravada com o firmware: só filtro + resposta
+        bytes_down = header + rows_out.sum()
+        link = bytes_down / rate
+        compute = height * compute_row
+        return {'phases': 1, 'overlap_rows': 0, 'bytes_up': 0,
+                'bytes_down': int(bytes_down), 'link': link,
+                'compute': compute, 'fixed': 0.0, 'total': link + compute}
+
+    ready = len(HANDSHAKE_READY) + 1
+    go = len(HANDSHAKE_GO) + 1
+    phases = phase_plan(height, config['buffer_rows'], window)
+    loads = [0.0] * devices
+    first_phase = [True] * devices
+    totals = {'bytes_up': 0, 'bytes_down': 0, 'link': 0.0, 'compute': 0.0,
+              'fixed': 0.0}
+
+    for first, last, input_rows in phases:
+        device = loads.index(min(loads))
+        up = rows_in[input_rows].sum()
+        down = rows_out[first:last + 1].sum()
+        if first_phase[device]:
+            fixed = DELAY_BEFORE_HEADER + DELAY_BEFORE_PHASE1
+            down += header
+            first_phase[device] = False
+        else:
+            fixed = DELAY_BEFORE_PHASE2 + params['handshake']
+            up += go
+        down += ready
+        compute = (last - first + 1) * compute_row
+        link = up / upload_rate + down / rate
+        loads[device] += fixed + compute + link
+        totals['bytes_up'] += up
+        totals['bytes_down'] += down
+        totals['link'] += link
+        totals['compute'] += compute
+        totals['fixed'] += fixed
+
+    return {'phases': len(phases),
+            'overlap_rows': sum(len(p[2]) for p in phases) - height,
+            'bytes_up': int(totals['bytes_up']),
+            'bytes_down': int(totals['bytes_down']),
+            'link': totals['link'], 'compute': totals['compute'],
+            'fixed': totals['fixed'], 'total': max(loads)}
+
+
+def infeasible_reasons(config, width, height, window, maxval, sram, flash, memory):
+    """Motivos pelos quais a configuração não cabe/não funciona (vazio = viável)."""
+    reasons = []
+    if maxval > PIXEL_MAX[config['pixel']]:
+        reasons.append(f"maxval {maxval} não cabe em {config['pixel']}")
+    if config['encoding'] == 'codec':
+        if config['pixel'] != 'uint8':
+            reasons.append("WIRE_CODEC só transporta pixels de 8 bits")
+        if width > CODEC_MAX_PAYLOAD:
+            reasons.append(f"largura {width} > payload máximo do quadro ({CODEC_MAX_PAYLOAD})")
+    if (config['mode'] == 'streaming' and config['buffer_rows'] < height
+            and config['buffer_rows'] < 2 * (window // 2) + 1):
+        reasons.append("buffer menor que a janela")
+    if sram > memory['ram']:
+        reasons.append(f"SRAM {sram} > {memory['ram']}")
+    if flash > memory['flash']:
+        reasons.append(f"flash {flash} > {memory['flash']}")
+    return reasons
+
+
+def max_buffer_rows(width, pixel, encoding, memory):
+    """Maior BUFFER_SIZE que cabe na SRAM."""
+    config = {'mode': 'streaming', 'buffer_rows': 0, 'pixel': pixel,
+              'encoding': encoding}
+    base, _ = memory_usage(config, width, 0, memory)
+    return max((memory['ram'] - base) // (width * PIXEL_BYTES[pixel]), 0)
+
+
+def plan(width, height, window, maxval, bauds, encodings, pixels, profile,
+         params, memory, devices=1, flash_mode=False):
+    """
+    Todas as configurações candidatas com uso de memória e tempo previsto.
+
+    Com flash_mode, inclui o modo FLASH (imagem fixa gravada com o
+    firmware, resposta só em texto).
+
+    Returns:
+        list: Dicionários ordenados (viáveis primeiro, por tempo e SRAM)
+    """
+    half = window // 2
+    configs = []
+    for baud in bauds:
+        for encoding in encodings:
+            for pixel in pixels:
+                top = min(max_buffer_rows(width, pixel, encoding, memory), height)
+                for rows in range(2 * half + 1, top + 1):
+                    configs.append({'mode': 'streaming', 'buffer_rows': rows,
+                                    'pixel': pixel, 'encoding': encoding,
+                                    'baud': baud})
+                if flash_mode and encoding == 'text':
+                    configs.append({'mode': 'flash', 'buffer_rows': 0,
+                                    'pixel': pixel, 'encoding': encoding,
+                                    'baud': baud})
+
+    results = []
+    for config in configs:
+        sram, flash = memory_usage(config, width, height, memory)
+        reasons = infeasible_reasons(config, width, height, window, maxval,
+                                     sram, flash, memory)
+        prediction = (predict(config, width, height, window, profile, params,
+                              devices) if not reasons else None)
+        results.append(dict(config, sram=sram, flash=flash, reasons=reasons,
+                            prediction=prediction))
+
+    results.sort(key=lambda r: (bool(r['reasons']),
+                                r['prediction']['total'] if r['prediction'] else 0,
+                                r['sram']))
+    return results
+
+
+# ---------- Calibração ----------
+
+def calibrate_phases(phases, baud, width=IMG_SIZE, window=KUWAHARA_WINDOW):
+    """
+    Ajusta os parâmetros do modelo a fases medidas (summarize_phase()).
+
+    O write() do host volta antes de os bytes saírem (send_time mede só o
+    buffer do sistema), então a subida é medida até a primeira resposta da
+    placa (cabeçalho na FASE 1, primeira linha nas demais), descontado o
+    HAL_Delay() que o firmware faz antes dela. A descida é tomada na taxa
+    nominal; o tempo de filtro por linha é o intervalo entre linhas
+    recebidas menos a transmissão de cada uma.
+
+    Returns:
+        dict: Parâmetros (mesmas chaves de DEFAULT_PARAMS)
+    """
+    params = dict(DEFAULT_PARAMS)
+    rate = baud / BITS_PER_BYTE
+
+    usage = []
+    for p in phases:
+        wait, delay = ((p.get('header_wait'), DELAY_BEFORE_HEADER) if p['phase'] == 1
+                       else (p.get('first_byte_wait'), DELAY_BEFORE_PHASE2))
+        if wait is None or not p.get('bytes_sent'):
+            continue
+        upload = (p.get('send_time') or 0) + wait - delay
+        if upload > 0:
+            usage.append(p['bytes_sent'] / rate / upload)
+    if usage:
+        params['upload_efficiency'] = min(statistics.median(usage), 1.0)
+
+    compute_rows = []
+    for p in phases:
+        rows = p.get('rows_received') or 0
+        span = p.get('first_byte_to_last_row')
+        if rows < 2 or span is None:
+            continue
+        # Na FASE 1 o primeiro byte é o cabeçalho, antes do HAL_Delay(150)
+        if p['phase'] == 1:
+            span -= DELAY_BEFORE_PHASE1
+            intervals = rows
+        else:
+            intervals = rows - 1
+        per_row = span / intervals
+        compute_rows.append(per_row - p['bytes_received'] / rows / rate)
+    if compute_rows:
+        model = compute_row_time(width, window, DEFAULT_PARAMS)
+        params['compute_scale'] = max(statistics.median(compute_rows), 0.0) / model
+
+    handshakes = [p['handshake_latency'] for p in phases
+                  if p.get('phase', 1) > 1 and p.get('handshake_latency') is not None]
+    if handshakes:
+        params['handshake'] = statistics.median(handshakes)
+    return params
+
+
+def load_telemetry(paths):
+    """
+    Fases e baudrate de arquivos de telemetria (ou pastas com *.json).
+
+    Returns:
+        tuple: (fases, baudrate do primeiro arquivo)
+    """
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, '*.json'))) if os.path.isdir(path) else [path]
+    phases, baud = [], None
+    for path in files:
+        with open(path) as f:
+            telemetry = json.load(f)
+        if 'phases' not in telemetry:
+            continue
+        baud = baud or telemetry.get('baudrate')
+        phases += telemetry['phases']
+    return phases, baud, len(files)
+
+
+def emulator_phases(sample_path, baud, compress=False, compute_delay=0.0):
+    """
+    Roda uma transferência completa contra o emulador local e devolve as
+    fases medidas (mesmo formato da telemetria).
+    """
+    from writer_reader import (filter_on_devices, open_serial, read_pgm_file,
+                               summarize_phase)
+    from device_emulator import start_emulators
+
+    urls, stop_event = start_emulators(1, baudrate=baud, compress=compress,
+                                       compute_delay=compute_delay)
+    ser = open_serial(urls[0], baud)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, _, _, image_data = read_pgm_file(sample_path)
+            t0 = time.monotonic()
+            _, _, device_stats = filter_on_devices([(urls[0], ser)], image_data,
+                                                   compress=compress)
+    finally:
+        ser.close()
+        stop_event.set()
+    return [summarize_phase(p, t0, baud) for s in device_stats for p in s['phases']]
+
+
+# ---------- Relatório ----------
+
+def describe(config):
+    if config['mode'] == 'flash':
+        return f"FLASH fixa ({config['pixel']})"
+    return f"{config['buffer_rows']} linhas ({config['pixel']})"
+
+
+def is_current(config, width, height, window):
+    return ((width, height, window) == (IMG_SIZE, IMG_SIZE, KUWAHARA_WINDOW) and
+            all(config[k] == v for k, v in CURRENT.items()))
+
+
+def print_plan(results, width, height, window, memory, params, top):
+    """Tabela das configurações viáveis mais rápidas (e a atual)."""
+    feasible = [r for r in results if not r['reasons']]
+    print(f"Imagem {width}x{height}, janela {window} | SRAM {memory['ram']} B, "
+          f"flash {memory['flash']} B ({memory['source']})")
+    print(f"Modelo: {params['source']} | subida a {params['upload_efficiency']:.0%} do baud, "
+          f"filtro {compute_row_time(width, window, params) * 1000:.2f} ms/linha, "
+          f"handshake {params['handshake'] * 1000:.1f} ms")
+    print(f"Viáveis: {len(feasible)} de {len(results)}\n")
+
+    print(f"{'#':>3}  {'Buffer':<18}{'Codif.':<7}{'Baud':>8}{'Fases':>6}{'Reenv.':>7}"
+          f"{'SRAM':>7}{'Flash':>7}{'Subida':>9}{'Descida':>9}{'Link':>8}"
+          f"{'Filtro':>8}{'Fixo':>6}{'Total':>8}")
+    shown = feasible[:top] + [r for r in feasible[top:]
+                              if is_current(r, width, height, window)]
+    for r in shown:
+        p = r['prediction']
+        mark = '*' if is_current(r, width, height, window) else ' '
+        print(f"{feasible.index(r) + 1:>3}{mark} {describe(r):<18}{r['encoding']:<7}"
+              f"{r['baud']:>8}{p['phases']:>6}{p['overlap_rows']:>7}{r['sram']:>7}"
+              f"{r['flash']:>7}{p['bytes_up']:>9}{p['bytes_down']:>9}"
+              f"{p['link']:>7.2f}s{p['compute']:>7.2f}s{p['fixed']:>5.2f}s"
+              f"{p['total']:>7.2f}s")
+    if any(is_current(r, width, height, window) for r in shown):
+        print("\n* configuração atual do firmware")
+
+    rejected = {}
+    for r in results:
+        for reason in r['reasons']:
+            rejected[reason.split(' ')[0]] = rejected.get(reason.split(' ')[0], reason)
+    if rejected:
+        print("\nDescartadas por: " + '; '.join(rejected.values()))
+
+
+def parse_size(text):
+    width, height = (int(v) for v in text.lower().split('x'))
+    return width, height
+
+
+def main():
+    """Linha de comando do planejador."""
+    parser = argparse.ArgumentParser(
+        description="Planeja BUFFER_SIZE/fases/codificação para a placa")
+    parser.add_argument('--size', type=parse_size,
+                        help="Tamanho LxA (padrão: o da imagem de amostra)")
+    parser.add_argument('--image', default=DEFAULT_SAMPLE,
+                        help="Imagem de amostra para os bytes no fio")
+    parser.add_argument('--window', type=int, default=KUWAHARA_WINDOW)
+    parser.add_argument('--pixel', choices=['auto', *PIXEL_BYTES], default='auto',
+                        help="Tipo de pixel_t (auto: o menor que cabe o maxval)")
+    parser.add_argument('--maxval', type=int, help="Maior valor de pixel (padrão: da amostra)")
+    parser.add_argument('--baud', type=int, nargs='+', default=[115200])
+    parser.add_argument('--encoding', choices=['text', 'codec', 'both'], default='both')
+    parser.add_argument('--devices', type=int, default=1,
+                        help="Placas em paralelo (fases distribuídas)")
+    parser.add_argument('--map', default=DEFAULT_MAP, help="Map do linker do build")
+    parser.add_argument('--calibrate', nargs='+', metavar='JSON',
+                        help="Telemetria do writer_reader.py (arquivos ou pastas)")
+    parser.add_argument('--calibrate-emulator', action='store_true',
+                        help="Mede uma transferência contra o emulador local")
+    parser.add_argument('--emulator-compute-delay', type=float, default=0.0,
+                        help="Atraso por linha do emulador na calibração (s)")
+    parser.add_argument('--flash-mode', action='store_true',
+                        help="Inclui o modo FLASH (imagem gravada com o firmware)")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--json', help="Grava o plano completo em JSON")
+    args = parser.parse_args()
+
+    if args.window < 3 or args.window % 2 == 0:
+        parser.error("janela deve ser ímpar e >= 3")
+
+    from compare_filtered import read_pgm_p2
+    sample, sample_w, sample_h, sample_max = read_pgm_p2(args.image)
+    width, height = args.size or (sample_w, sample_h)
+    maxval = args.maxval or sample_max
+    pixels = ([args.pixel] if args.pixel != 'auto' else
+              [min(PIXEL_BYTES, key=lambda p: PIXEL_BYTES[p]
+                   if PIXEL_MAX[p] >= maxval else 99)])
+    encodings = ['text', 'codec'] if args.encoding == 'both' else [args.encoding]
+
+    memory = read_map(args.map)
+    params = dict(DEFAULT_PARAMS)
+    if args.calibrate:
+        phases, baud, count = load_telemetry(args.calibrate)
+        if phases:
+            params = calibrate_phases(phases, baud or args.baud[0])
+            params['source'] = f"calibrado com {count} telemetria(s), {len(phases)} fases"
+        else:
+            print("✗ Nenhuma fase encontrada na telemetria; usando o modelo sem calibração")
+    elif args.calibrate_emulator:
+        print(f"Calibrando com o emulador ({args.baud[0]} bps)...")
+        phases = emulator_phases(DEFAULT_SAMPLE, args.baud[0],
+                                 compress=args.encoding == 'codec',
+                                 compute_delay=args.emulator_compute_delay)
+        params = calibrate_phases(phases, args.baud[0])
+        params['source'] = f"calibrado com o emulador ({len(phases)} fases)"
+
+    profile = wire_profile(sample, width, height, args.window, maxval)
+    results = plan(width, height, args.window, maxval, args.baud, encodings,
+                   pixels, profile, params, memory, args.devices, args.flash_mode)
+    print_plan(results, width, height, args.window, memory, params, args.top)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'width': width, 'height': height, 'window': args.window,
+                       'maxval': maxval, 'devices': args.devices,
+                       'memory': memory, 'params': params,
+                       'configurations': results}, f, indent=2, ensure_ascii=False)
+        print(f"\nPlano salvo em: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
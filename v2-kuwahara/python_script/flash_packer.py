@@ -0,0 +1,553 @@
+"""
+Gera headers C com a imagem de teste do modo FLASH (IMAGE_DATA_FLASH).
+
+image_mona_lisa.h e image_pepper.h foram escritos à mão: a imagem
+inteira como const pixel_t, 1 byte por pixel. Este script converte
+qualquer PGM num header equivalente e oferece dois layouts compactos,
+cada um com um decodificador de linha (image_flash_row()) no próprio
+header:
+
+    raw     IMAGE_DATA_FLASH[altura][largura], igual aos headers atuais
+            (kuwahara_filter() lê direto da flash)
+    packed  paleta dos níveis presentes + índices de k bits por pixel;
+            só compensa com poucos níveis de cinza (padrões de teste)
+    rows    cada linha na menor entre RAW, RLE (pares repetições, valor)
+            e DELTA (diferenças em nibbles), os mesmos payloads do
+            WIRE_CODEC (row_codec.py), com uma tabela de deslocamentos
+            para acesso direto à linha; RLE sozinho expande fotos (1,7x
+            na mona_lisa) e por isso não é um layout à parte
+    auto    o menor dos três
+
+Nos layouts compactos o firmware (modo FLASH, Core/Src/main.c) decodifica
+as linhas para o mesmo buffer de BUFFER_SIZE linhas do modo streaming e
+filtra em duas fases, sem UART na entrada.
+
+Toda conversão confere o round-trip: as linhas decodificadas (em Python
+e, se houver compilador, pelo próprio decodificador C do header,
+compilado no host) têm de ser idênticas às da imagem de origem. O uso de
+flash é comparado com o orçamento do build (Debug/stm32.map, como no
+device_planner.py).
+
+Uso:
+    python3 flash_packer.py <imagem.pgm> [...] [--layout raw|packed|rows|auto]
+                            [--output-dir ../Core/Inc] [--map ../Debug/stm32.map]
+                            [--dry-run] [--no-compile-check]
+    python3 flash_packer.py --check      (round-trip em imagens de borda)
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from device_planner import DEFAULT_MAP, read_map
+from pgm_io import pgm_stem, read_pixels
+from row_codec import (DELTA_ESCAPE, TAG_DELTA, TAG_NAMES, TAG_RAW, TAG_RLE,
+                       decode_payload, encode_delta, encode_rle)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(SCRIPT_DIR, '..', 'Core', 'Inc')
+
+LAYOUTS = ('raw', 'packed', 'rows')
+# Código do decodificador no Cortex-M0 (estimado: laço de bits do
+# packed, switch RAW/RLE/DELTA do rows; o raw não decodifica)
+DECODER_FLASH_ESTIMATE = {'raw': 0, 'packed': 96, 'rows': 256}
+VALUES_PER_LINE = 16  # bytes por linha nos arrays compactos
+
+
+class PackError(ValueError):
+    """Imagem que não cabe no formato pedido."""
+
+
+# ---------- Layouts ----------
+
+def pack_indices(indices, bits):
+    """Índices de 'bits' bits em fluxo contínuo, bit mais significativo primeiro."""
+    bitplanes = (indices.ravel()[:, None] >> np.arange(bits - 1, -1, -1)) & 1
+    return np.packbits(bitplanes.astype(np.uint8).ravel()).tobytes()
+
+
+def unpack_indices(data, bits, count):
+    """Inverso de pack_indices()."""
+    bitstream = np.unpackbits(np.frombuffer(data, dtype=np.uint8))[:count * bits]
+    weights = 1 << np.arange(bits - 1, -1, -1)
+    return bitstream.reshape(count, bits) @ weights
+
+
+def encode_packed(image):
+    """
+    Layout 'packed': paleta ordenada + índices de k bits.
+
+    Returns:
+        dict: palette (bytes), bits, data (bytes)
+    """
+    palette, indices = np.unique(image, return_inverse=True)
+    bits = max(1, math.ceil(math.log2(len(palette))))
+    return {'palette': bytes(palette.astype(np.uint8)), 'bits': bits,
+            'data': pack_indices(indices.reshape(image.shape), bits)}
+
+
+def encode_rows(image):
+    """
+    Layout 'rows': tag + payload da menor codificação de cada linha.
+
+    Returns:
+        dict: data (bytes), offsets (height + 1 posições em data), tags
+    """
+    data = bytearray()
+    offsets, tags = [0], []
+    for row in image.tolist():
+        tag, payload = min(((TAG_RAW, bytes(row)), (TAG_RLE, encode_rle(row)),
+                            (TAG_DELTA, encode_delta(row))),
+                           key=lambda c: len(c[1]))
+        data += bytes((tag,)) + payload
+        offsets.append(len(data))
+        tags.append(tag)
+    if offsets[-1] > 0xFFFF:
+        raise PackError(f"{offsets[-1]} bytes não cabem nos deslocamentos uint16")
+    return {'data': bytes(data), 'offsets': offsets, 'tags': tags}
+
+
+def encode(image, layout):
+    """Codifica a imagem no layout pedido ('raw', 'packed' ou 'rows')."""
+    if layout == 'raw':
+        return {'data': image.astype(np.uint8).tobytes()}
+    if layout == 'packed':
+        return encode_packed(image)
+    return encode_rows(image)
+
+
+def decode_rows(packed, layout, width, height):
+    """Decodifica linha a linha, como image_flash_row() (referência em Python)."""
+    if layout == 'raw':
+        return np.frombuffer(packed['data'], dtype=np.uint8).reshape(height, width)
+    if layout == 'packed':
+        palette = np.frombuffer(packed['palette'], dtype=np.uint8)
+        return palette[unpack_indices(packed['data'], packed['bits'],
+                                      width * height)].reshape(height, width)
+    data, offsets = packed['data'], packed['offsets']
+    return np.array([decode_payload(data[start], data[start + 1:end], width)
+                     for start, end in zip(offsets, offsets[1:])], dtype=np.uint8)
+
+
+def flash_bytes(packed, layout):
+    """Bytes de dados na flash (arrays), sem o código do decodificador."""
+    size = len(packed['data'])
+    if layout == 'packed':
+        size += len(packed['palette'])
+    elif layout == 'rows':
+        size += 2 * len(packed['offsets'])
+    return size
+
+
+# ---------- Header ----------
+
+def c_array(values, indent='    '):
+    """Valores em linhas de VALUES_PER_LINE, separados por vírgula."""
+    values = [str(v) for v in values]
+    lines = [', '.join(values[i:i + VALUES_PER_LINE])
+             for i in range(0, len(values), VALUES_PER_LINE)]
+    return ',\n'.join(indent + line for line in lines)
+
+
+def guard_name(name):
+    """Nome do include guard: IMAGE_<NOME>_H."""
+    return 'IMAGE_' + re.sub(r'\W', '_', name).upper() + '_H'
+
+
+# Ramos do decodificador do layout 'rows', na ordem do if/else if
+DECODER_ORDER = [TAG_RAW, TAG_RLE, TAG_DELTA]
+DECODER_BRANCHES = {
+    TAG_RAW: [
+        "memcpy(row, p, IMAGE_FLASH_WIDTH);",
+    ],
+    TAG_RLE: [
+        "const uint8_t *end = &IMAGE_FLASH_ROWS[IMAGE_FLASH_ROW_OFFSETS[y + 1]];",
+        "int x = 0;",
+        "for (; p < end; p += 2)",
+        "\tfor (uint8_t count = p[0]; count > 0; count--)",
+        "\t\trow[x++] = p[1];",
+    ],
+    TAG_DELTA: [
+        "int x = 0, i = 0;",
+        "row[x++] = *p++;",
+        "while (x < IMAGE_FLASH_WIDTH)",
+        "{",
+        "\tuint8_t nib = image_flash_nibble(p, i++);",
+        "\tif (nib == IMAGE_FLASH_DELTA_ESCAPE)",
+        "\t{",
+        "\t\tuint8_t hi = image_flash_nibble(p, i++);",
+        "\t\trow[x] = (pixel_t)((hi << 4) | image_flash_nibble(p, i++));",
+        "\t}",
+        "\telse",
+        "\t{",
+        "\t\tint delta = (nib > 7) ? (int)nib - 16 : (int)nib;",
+        "\t\trow[x] = (pixel_t)(row[x - 1] + delta);",
+        "\t}",
+        "\tx++;",
+        "}",
+    ],
+}
+
+
+def row_decoder_branches(tags):
+    """
+    Corpo do image_flash_row() do layout 'rows' só com os ramos das tags
+    presentes na imagem: um memcpy de largura cheia num ramo RAW que
+    nenhuma linha usa é acesso fora do array para o compilador
+    (-Warray-bounds) quando a imagem inteira é menor que uma linha crua.
+    """
+    if len(tags) == 1:
+        (tag,) = tags
+        return [f"\tp++; // tag (só linhas {TAG_NAMES[tag]})", ""] + \
+            ["\t" + line for line in DECODER_BRANCHES[tag]]
+    lines = ["\tuint8_t tag = *p++;", ""]
+    for n, tag in enumerate(tags):
+        if n == 0:
+            lines.append(f"\tif (tag == IMAGE_FLASH_TAG_{TAG_NAMES[tag]})")
+        elif n < len(tags) - 1:
+            lines.append(f"\telse if (tag == IMAGE_FLASH_TAG_{TAG_NAMES[tag]})")
+        else:
+            lines.append("\telse")
+        lines += ["\t{"] + ["\t\t" + line for line in DECODER_BRANCHES[tag]] + ["\t}"]
+    return lines
+
+
+def header_text(name, source, image, layout, packed):
+    """
+    Texto do header para o firmware.
+
+    Todo layout define IMAGE_FLASH_WIDTH/HEIGHT/LAYOUT e
+    image_flash_row(y, row); o raw também IMAGE_DATA_FLASH[altura][largura].
+    """
+    height, width = image.shape
+    guard = guard_name(name)
+    size = flash_bytes(packed, layout)
+    lines = [
+        f"#ifndef {guard}",
+        f"#define {guard}",
+        "",
+        f"// Gerado por python_script/flash_packer.py a partir de {os.path.basename(source)}",
+        f"// Layout {layout}: {size} bytes na flash ({width}x{height} pixels)",
+        "",
+        "#include <stdint.h>",
+        "#include <string.h>",
+        '#include "main.h"',
+        "",
+        f"#define IMAGE_FLASH_WIDTH {width}",
+        f"#define IMAGE_FLASH_HEIGHT {height}",
+        "#define IMAGE_FLASH_LAYOUT_RAW 0",
+        "#define IMAGE_FLASH_LAYOUT_PACKED 1",
+        "#define IMAGE_FLASH_LAYOUT_ROWS 2",
+        f"#define IMAGE_FLASH_LAYOUT IMAGE_FLASH_LAYOUT_{layout.upper()}",
+        "",
+        "#if defined(IMG_SIZE) && (IMAGE_FLASH_WIDTH != IMG_SIZE || IMAGE_FLASH_HEIGHT != IMG_SIZE)",
+        '#error "Imagem do header com tamanho diferente de IMG_SIZE"',
+        "#endif",
+        "",
+    ]
+    if layout == 'raw':
+        rows = ',\n'.join('    {' + ', '.join(str(int(p)) for p in row) + '}'
+                          for row in image)
+        lines += [
+            "const pixel_t IMAGE_DATA_FLASH[IMAGE_FLASH_HEIGHT][IMAGE_FLASH_WIDTH] = {",
+            rows,
+            "};",
+            "",
+            "// Copia a linha y da imagem para 'row'",
+            "static inline void image_flash_row(int y, pixel_t *row)",
+            "{",
+            "\tmemcpy(row, IMAGE_DATA_FLASH[y], IMAGE_FLASH_WIDTH);",
+            "}",
+        ]
+    elif layout == 'packed':
+        lines += [
+            f"#define IMAGE_FLASH_BITS {packed['bits']} // bits por índice da paleta",
+            "",
+            f"static const pixel_t IMAGE_FLASH_PALETTE[{len(packed['palette'])}] = {{",
+            c_array(packed['palette']),
+            "};",
+            "",
+            "// Índices em fluxo contínuo, bit mais significativo primeiro",
+            f"static const uint8_t IMAGE_FLASH_PACKED[{len(packed['data'])}] = {{",
+            c_array(packed['data']),
+            "};",
+            "",
+            "// Decodifica a linha y da imagem em 'row'",
+            "static inline void image_flash_row(int y, pixel_t *row)",
+            "{",
+            "\tuint32_t bit = (uint32_t)y * IMAGE_FLASH_WIDTH * IMAGE_FLASH_BITS;",
+            "\tfor (int x = 0; x < IMAGE_FLASH_WIDTH; x++)",
+            "\t{",
+            "\t\tuint8_t index = 0;",
+            "\t\tfor (int b = 0; b < IMAGE_FLASH_BITS; b++, bit++)",
+            "\t\t\tindex = (uint8_t)((index << 1) | ((IMAGE_FLASH_PACKED[bit >> 3] >> (7 - (bit & 7))) & 1));",
+            "\t\trow[x] = IMAGE_FLASH_PALETTE[index];",
+            "\t}",
+            "}",
+        ]
+    else:
+        lines += [
+            f"#define IMAGE_FLASH_TAG_RAW 0x{TAG_RAW:02x}   // payload = pixels",
+            f"#define IMAGE_FLASH_TAG_DELTA 0x{TAG_DELTA:02x} // payload = 1o pixel + diferenças em nibbles",
+            f"#define IMAGE_FLASH_TAG_RLE 0x{TAG_RLE:02x}   // payload = pares (repetições, valor)",
+            f"#define IMAGE_FLASH_DELTA_ESCAPE 0x{DELTA_ESCAPE:x} // nibble de escape: valor absoluto a seguir",
+            "",
+            "// Início de cada linha em IMAGE_FLASH_ROWS (mais o fim da última)",
+            f"static const uint16_t IMAGE_FLASH_ROW_OFFSETS[IMAGE_FLASH_HEIGHT + 1] = {{",
+            c_array(packed['offsets']),
+            "};",
+            "",
+            "// Cada linha: tag + payload (mesmos formatos do WIRE_CODEC)",
+            f"static const uint8_t IMAGE_FLASH_ROWS[{len(packed['data'])}] = {{",
+            c_array(packed['data']),
+            "};",
+            "",
+            "// Nibble i do payload DELTA (alto, depois baixo)",
+            "static inline uint8_t image_flash_nibble(const uint8_t *p, int i)",
+            "{",
+            "\treturn (i & 1) ? (p[i >> 1] & 0x0F) : (p[i >> 1] >> 4);",
+            "}",
+            "",
+            "// Decodifica a linha y da imagem em 'row'",
+            "static inline void image_flash_row(int y, pixel_t *row)",
+            "{",
+            "\tconst uint8_t *p = &IMAGE_FLASH_ROWS[IMAGE_FLASH_ROW_OFFSETS[y]];",
+        ]
+        lines += row_decoder_branches(sorted(set(packed['tags']), key=DECODER_ORDER.index))
+        lines += ["}"]
+    lines += ["", "#endif", ""]
+    return '\n'.join(lines)
+
+
+# ---------- Conferência ----------
+
+HARNESS = """\
+#include <stdio.h>
+#include "{header}"
+
+int main(void)
+{{
+\tpixel_t row[IMAGE_FLASH_WIDTH];
+\tfor (int y = 0; y < IMAGE_FLASH_HEIGHT; y++)
+\t{{
+\t\timage_flash_row(y, row);
+\t\tfwrite(row, 1, IMAGE_FLASH_WIDTH, stdout);
+\t}}
+\treturn 0;
+}}
+"""
+
+
+def compile_check(header, image):
+    """
+    Compila o decodificador do header no host e confere as linhas.
+
+    O main.h do firmware puxa a HAL; aqui ele é trocado por um que só
+    define pixel_t e IMG_SIZE.
+
+    Returns:
+        bool ou None: True se idênticas, None sem compilador
+    """
+    compiler = os.environ.get('CC', 'gcc')
+    if shutil.which(compiler) is None:
+        return None
+    height, width = image.shape
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'main.h'), 'w') as f:
+            f.write("#include <stdint.h>\ntypedef uint8_t pixel_t;\n")
+            if width == height:
+                f.write(f"#define IMG_SIZE {width}\n")
+        with open(os.path.join(tmp, 'image.h'), 'w') as f:
+            f.write(header)
+        source = os.path.join(tmp, 'check.c')
+        with open(source, 'w') as f:
+            f.write(HARNESS.format(header='image.h'))
+        binary = os.path.join(tmp, 'check')
+        try:
+            subprocess.run([compiler, '-std=c99', '-Wall', '-Werror', '-O1',
+                            source, '-o', binary],
+                           check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            raise PackError(f"Header não compila:\n{e.stderr}") from None
+        output = subprocess.run([binary], check=True, capture_output=True).stdout
+    return output == image.astype(np.uint8).tobytes()
+
+
+# ---------- Relatório ----------
+
+def pack_image(path, layout, memory, compile=True):
+    """Lê um PGM e converte com pack_pixels()."""
+    image, width, height, maxval = read_pixels(path)
+    if maxval > 255:
+        raise PackError(f"maxval {maxval} não cabe em pixel_t (uint8)")
+    return pack_pixels(image.astype(np.uint8), pgm_stem(path).split('.')[0],
+                       path, layout, memory, compile)
+
+
+def pack_pixels(image, name, source, layout, memory, compile=True):
+    """
+    Converte uma imagem (uint8) e confere o round-trip.
+
+    Returns:
+        dict: name, layout, header, bytes, sizes (bytes de cada layout),
+              flash (total do firmware + imagem), compiled (True/None)
+    """
+    height, width = image.shape
+    encoded = {name: encode(image, name) for name in LAYOUTS}
+    sizes = {name: flash_bytes(encoded[name], name) + DECODER_FLASH_ESTIMATE[name]
+             for name in LAYOUTS}
+    if layout == 'auto':
+        layout = min(LAYOUTS, key=sizes.get)
+    packed = encoded[layout]
+    if not np.array_equal(decode_rows(packed, layout, width, height), image):
+        raise PackError(f"Round-trip do layout {layout} falhou (decodificação em Python)")
+
+    header = header_text(name, source, image, layout, packed)
+    compiled = compile_check(header, image) if compile else None
+    if compiled is False:
+        raise PackError(f"Round-trip do layout {layout} falhou (decodificador C)")
+
+    result = {'name': name, 'layout': layout, 'header': header,
+              'width': width, 'height': height, 'sizes': sizes,
+              'bytes': sizes[layout], 'flash': memory['flash_used'] + sizes[layout],
+              'compiled': compiled}
+    if layout == 'rows':
+        result['tags'] = {TAG_NAMES[t]: packed['tags'].count(t) for t in TAG_NAMES}
+    elif layout == 'packed':
+        result['bits'] = packed['bits']
+        result['levels'] = len(packed['palette'])
+    return result
+
+
+def check_cases():
+    """Imagens de borda dos layouts: (nome, pixels uint8)."""
+    rng = np.random.default_rng(0)
+    ramp = np.arange(300, dtype=np.uint8)[None, :]
+    return [
+        ('1x1', np.full((1, 1), 200, np.uint8)),
+        ('plana', np.full((90, 90), 7, np.uint8)),
+        ('corridas_600x3', np.repeat(np.array([[0, 255, 0], [9, 9, 9], [3, 200, 3]],
+                                              np.uint8), 200, axis=1)),
+        ('linha_1x300', ramp),
+        ('coluna_300x1', ramp.T.copy()),
+        ('faixas', np.tile((np.arange(90) // 12 * 36 % 256).astype(np.uint8), (90, 1))),
+        ('rampa_saltos', np.tile((np.arange(90) % 30 * 3).astype(np.uint8), (5, 1))),
+        ('ruido', rng.integers(0, 256, (13, 17)).astype(np.uint8)),
+        ('4_niveis', (rng.integers(0, 4, (31, 29)) * 85).astype(np.uint8)),
+    ]
+
+
+def check(memory, compile=True):
+    """
+    Round-trip de todos os layouts nas imagens de check_cases(), com o
+    decodificador C compilado quando houver compilador.
+
+    Returns:
+        int: Número de falhas
+    """
+    failures = 0
+    for name, image in check_cases():
+        for layout in LAYOUTS:
+            try:
+                result = pack_pixels(image, name, name + '.pgm', layout, memory, compile)
+            except (ValueError, RuntimeError) as e:
+                failures += 1
+                print(f"  ✗ {name} ({layout}): {e}")
+                continue
+            verified = "Python e C" if result['compiled'] else "Python"
+            size = f"{image.shape[1]}x{image.shape[0]}"
+            print(f"  ✓ {name:<15} {size:<7} {layout:<7} {result['bytes']:>6} "
+                  f"bytes ({verified})")
+    return failures
+
+
+def print_result(result, memory, output_path):
+    """Linha de resultado de uma imagem, com o uso de flash."""
+    sizes = '  '.join(f"{name} {size}" for name, size in result['sizes'].items())
+    free = memory['flash'] - memory['flash_used']
+    print(f"{result['name']} ({result['width']}x{result['height']}): "
+          f"layout {result['layout']}, {result['bytes']} bytes com o decodificador "
+          f"({result['bytes'] / (result['width'] * result['height']):.2f} B/pixel)")
+    print(f"  Layouts: {sizes}")
+    if 'tags' in result:
+        print("  Linhas: " + ' | '.join(f"{tag} {count}"
+                                       for tag, count in result['tags'].items()))
+    if 'bits' in result:
+        print(f"  Paleta: {result['levels']} níveis, {result['bits']} bits por pixel")
+    status = "✓" if result['flash'] <= memory['flash'] else "✗ excede"
+    print(f"  Flash: {result['flash']} / {memory['flash']} bytes "
+          f"({result['flash'] / memory['flash'] * 100:.1f}%) {status}; "
+          f"imagem usa {result['bytes'] / free * 100:.1f}% da flash livre "
+          f"({free} bytes, cabem {free // result['bytes']} iguais)")
+    check = {True: "em Python e no decodificador C", None: "só em Python"}
+    print(f"  ✓ Round-trip idêntico {check[result['compiled']]}")
+    if output_path:
+        print(f"  ✓ Salvo: {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converte PGMs em headers IMAGE_DATA_FLASH para o modo FLASH")
+    parser.add_argument('images', nargs='*', help="Imagens PGM (qualquer formato do pgm_io)")
+    parser.add_argument('--layout', choices=LAYOUTS + ('auto',), default='raw',
+                        help="raw (compatível com os headers atuais), packed, rows "
+                             "ou auto = o menor (padrão: raw)")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help="Pasta dos headers image_<nome>.h (padrão: Core/Inc)")
+    parser.add_argument('--map', default=DEFAULT_MAP,
+                        help="Map do linker, para o orçamento de flash")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Só mostra tamanhos e confere, sem gravar")
+    parser.add_argument('--no-compile-check', action='store_true',
+                        help="Não compila o decodificador no host")
+    parser.add_argument('--check', action='store_true',
+                        help="Round-trip de todos os layouts em imagens de borda "
+                             "(plana, corridas longas, 1x1...)")
+    args = parser.parse_args()
+    if not (args.images or args.check):
+        parser.print_help()
+        return
+
+    memory = read_map(args.map)
+    if args.check:
+        failures = check(memory, not args.no_compile_check)
+        if failures:
+            print(f"✗ {failures} falhas")
+            sys.exit(1)
+        print("✓ Todos os layouts decodificam idênticos à origem")
+        if not args.images:
+            return
+        print()
+    print(f"Orçamento: {memory['flash']} bytes de flash, programa "
+          f"{memory['flash_used']} ({memory['source']}; decodificador estimado)\n")
+    failures = 0
+    for path in args.images:
+        try:
+            result = pack_image(path, args.layout, memory, not args.no_compile_check)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"✗ {path}: {e}\n")
+            failures += 1
+            continue
+        output_path = None
+        if not args.dry_run:
+            os.makedirs(args.output_dir, exist_ok=True)
+            output_path = os.path.join(args.output_dir, f"image_{result['name']}.h")
+            with open(output_path, 'w') as f:
+                f.write(result['header'])
+        print_result(result, memory, output_path)
+        print()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
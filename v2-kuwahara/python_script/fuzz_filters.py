@@ -0,0 +1,484 @@
+"""
+Fuzzing diferencial dos caminhos do filtro Kuwahara.
+
+Gera imagens aleatórias e adversariais (1xN, Nx1, 1x1, planas, xadrez,
+listras, poucos níveis de cinza, extremos 0/255, rampas, impulsos), roda
+todas as engines disponíveis em cada uma e compara com a referência
+kuwahara_ref.kuwahara_rows() (semântica do firmware). É nas bordas
+(REFLECT_101 + clamp), nos empates de desvio padrão entre quadrantes e no
+truncamento da média que as implementações divergem.
+
+Engines:
+    ref-rows          kuwahara_rows() em faixas de linhas (caminho do
+                      verificador do writer_reader.py)
+    emulator          porta do firmware no device_emulator.py
+                      (filter_buffered_rows, a imagem inteira no buffer);
+                      laços em Python, ~2,5 ms por caso: só roda se nomeada
+                      em --engines
+    c                 kernel em C da v1 via ctypes (v1-kuwahara/python_implementation/kuwahara_c.py)
+    pykuwahara        biblioteca pykuwahara (só janela 3 por padrão: nas
+                      maiores a divergência é conhecida; nomeie a engine em
+                      --engines para testá-la em todas as janelas)
+    pykuwahara-tiles  pykuwahara em faixas num pool de processos (main.py
+                      da v1; só janela 3 por padrão, como a pykuwahara)
+
+Além da igualdade com a referência, toda saída precisa ter a forma da
+entrada e ficar entre o mínimo e o máximo da entrada (imagem plana não
+muda). Cada falha é reduzida (linhas/colunas removidas, valores
+simplificados) até um caso mínimo, que é impresso.
+
+Uso:
+    python3 fuzz_filters.py [--cases N | --seconds S] [--seed S]
+                            [--windows 3 5 7] [--max-side N]
+                            [--engines c pykuwahara ...]
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from kuwahara_ref import kuwahara_rows
+
+V1_PYTHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', 'v1-kuwahara', 'python_implementation')
+
+DEFAULT_WINDOWS = (3, 5, 7)
+BAND_ROWS = 5
+# Casos de um lote têm a mesma forma e janela: a referência (e as engines
+# em numpy) filtram o lote inteiro numa chamada
+BATCH_SIZE = 64
+SHRINK_BUDGET = 5000
+
+
+# ---------- Engines ----------
+
+def reference(image, window):
+    """Oráculo: kuwahara_rows() sobre a imagem (ou pilha) inteira."""
+    return kuwahara_rows(image, range(image.shape[-2]), window)
+
+
+def ref_rows(image, window):
+    """kuwahara_rows() em faixas de BAND_ROWS linhas, da última para a primeira."""
+    height = image.shape[-2]
+    bands = [range(y, min(y + BAND_ROWS, height))
+             for y in range(0, height, BAND_ROWS)]
+    return np.concatenate([kuwahara_rows(image, band, window)
+                           for band in reversed(bands)][::-1], axis=-2)
+
+
+def load_emulator():
+    """Engine da porta do firmware no emulador (laços em Python, lenta)."""
+    from device_emulator import filter_buffered_rows
+
+    def run(image, window):
+        height, width = image.shape
+        buffer = image.astype(np.int64).tolist()
+        return np.array(list(filter_buffered_rows(buffer, 0, height - 1, 0, width,
+                                                  height, window)),
+                        dtype=np.int64).reshape(height, width)
+    return run
+
+
+def load_v1(name):
+    """Função 'name' do main.py da v1."""
+    if V1_PYTHON_DIR not in sys.path:
+        sys.path.insert(0, V1_PYTHON_DIR)
+    import main
+    return getattr(main, name)
+
+
+def load_pykuwahara_tiles():
+    """Engine pykuwahara-tiles do main.py da v1 (aquece o pool de processos)."""
+    run = load_v1('filter_pykuwahara_tiles')
+    run(np.zeros((4, 4), dtype=np.uint8), 3)
+    return run
+
+
+def load_c():
+    """Engine do kernel em C da v1 (compila a biblioteca se preciso)."""
+    if V1_PYTHON_DIR not in sys.path:
+        sys.path.insert(0, V1_PYTHON_DIR)
+    from kuwahara_c import kuwahara_c, load_library
+    load_library()
+    return kuwahara_c
+
+
+def load_pykuwahara():
+    """Engine da biblioteca pykuwahara (radius = window // 2, como no main.py da v1)."""
+    from pykuwahara import kuwahara
+
+    def run(image, window):
+        filtered = kuwahara(image, method='mean', radius=window // 2)
+        return np.clip(filtered, 0, 255).astype(np.uint8)
+    return run
+
+
+# nome -> (carregador, janelas com paridade esperada (None = todas),
+#          aceita pilha de imagens)
+ENGINES = {
+    'ref-rows': (lambda: ref_rows, None, True),
+    'emulator': (load_emulator, None, False),
+    'c': (load_c, None, False),
+    'pykuwahara': (load_pykuwahara, (3,), False),
+    'pykuwahara-tiles': (load_pykuwahara_tiles, (3,), False),
+}
+
+# Fora do conjunto padrão (lentas demais para milhares de casos/s)
+OPT_IN_ENGINES = ('emulator',)
+
+
+def load_engines(names):
+    """
+    Carrega as engines pedidas.
+
+    Returns:
+        tuple: ({nome: função}, {nome: motivo da indisponibilidade})
+    """
+    loaded, unavailable = {}, {}
+    for name in names:
+        try:
+            loaded[name] = ENGINES[name][0]()
+        except Exception as e:
+            unavailable[name] = str(e).splitlines()[0] if str(e) else type(e).__name__
+    return loaded, unavailable
+
+
+# ---------- Geradores ----------
+
+def gen_uniform(rng, h, w):
+    return rng.integers(0, 256, (h, w))
+
+
+def gen_few_levels(rng, h, w):
+    # Poucos níveis -> quadrantes com desvio padrão empatado
+    levels = rng.choice(256, size=int(rng.integers(2, 4)), replace=False)
+    return levels[rng.integers(0, len(levels), (h, w))]
+
+
+def gen_flat(rng, h, w):
+    return np.full((h, w), rng.integers(0, 256))
+
+
+def gen_checker(rng, h, w):
+    period = int(rng.integers(1, 3))
+    a, b = rng.integers(0, 256, 2)
+    yy, xx = np.indices((h, w))
+    return np.where(((yy // period) + (xx // period)) % 2, a, b)
+
+
+def gen_stripes(rng, h, w):
+    a, b = rng.integers(0, 256, 2)
+    yy, xx = np.indices((h, w))
+    return np.where((yy if rng.random() < 0.5 else xx) % 2, a, b)
+
+
+def gen_extremes(rng, h, w):
+    return rng.integers(0, 2, (h, w)) * 255
+
+
+def gen_ramp(rng, h, w):
+    # Médias fracionárias em sequência -> exercita o truncamento
+    yy, xx = np.indices((h, w))
+    dy, dx = rng.integers(-3, 4, 2)
+    return np.clip(rng.integers(0, 256) + dy * yy + dx * xx, 0, 255)
+
+
+def gen_impulse(rng, h, w):
+    image = np.full((h, w), rng.integers(0, 256))
+    image[rng.integers(0, h), rng.integers(0, w)] = rng.integers(0, 256)
+    return image
+
+
+GENERATORS = {
+    'uniform': gen_uniform,
+    'few_levels': gen_few_levels,
+    'flat': gen_flat,
+    'checker': gen_checker,
+    'stripes': gen_stripes,
+    'extremes': gen_extremes,
+    'ramp': gen_ramp,
+    'impulse': gen_impulse,
+}
+
+
+def random_shape(rng, max_side):
+    """Tamanhos de borda (1xN, Nx1, minúsculos) com peso maior que os grandes."""
+    kind = rng.random()
+    if kind < 0.2:
+        n = int(rng.integers(1, max_side + 1))
+        return (1, n) if rng.random() < 0.5 else (n, 1)
+    if kind < 0.5:
+        return tuple(int(v) for v in rng.integers(1, 5, 2))
+    return tuple(int(v) for v in rng.integers(1, max_side + 1, 2))
+
+
+def make_batch(seed, batch, max_side, windows, size=BATCH_SIZE):
+    """
+    Lote 'batch' da semente 'seed' (reproduzível isoladamente): imagens da
+    mesma forma e janela, cada uma de um gerador sorteado.
+
+    Returns:
+        tuple: (nomes dos geradores, pilha uint8 (size, h, w), janela)
+    """
+    rng = np.random.default_rng([seed, batch])
+    h, w = random_shape(rng, max_side)
+    window = int(windows[int(rng.integers(0, len(windows)))])
+    names = [list(GENERATORS)[int(i)]
+             for i in rng.integers(0, len(GENERATORS), size)]
+    stack = np.stack([GENERATORS[name](rng, h, w) for name in names])
+    return names, stack.astype(np.uint8), window
+
+
+# ---------- Verificação ----------
+
+def check(engine, image, window, expected=None):
+    """
+    Roda uma engine e confere as propriedades.
+
+    'expected' é a saída da referência, se já calculada.
+
+    Returns:
+        str | None: Tipo da falha ('exceção', 'forma', 'faixa', 'diferente')
+    """
+    try:
+        output = np.asarray(engine(image, window))
+    except Exception:
+        return 'exceção'
+    if output.shape != image.shape:
+        return 'forma'
+    if output.min() < image.min() or output.max() > image.max():
+        return 'faixa'
+    if expected is None:
+        expected = reference(image, window)
+    if not np.array_equal(output, expected):
+        return 'diferente'
+    return None
+
+
+def check_batch(engine, batched, stack, window, expected):
+    """
+    check() para um lote. Engines que aceitam pilha rodam numa chamada só;
+    se essa chamada falhar, cada imagem é refeita sozinha para achar a culpada.
+
+    Returns:
+        list: Tipo da falha (ou None) de cada imagem
+    """
+    if batched:
+        try:
+            output = np.asarray(engine(stack, window))
+        except Exception:
+            output = None
+        if output is not None and output.shape == stack.shape:
+            out_of_range = ((output.min(axis=(1, 2)) < stack.min(axis=(1, 2))) |
+                            (output.max(axis=(1, 2)) > stack.max(axis=(1, 2))))
+            different = (output != expected).any(axis=(1, 2))
+            return ['faixa' if r else ('diferente' if d else None)
+                    for r, d in zip(out_of_range, different)]
+    return [check(engine, image, window, exp)
+            for image, exp in zip(stack, expected)]
+
+
+def shrink_candidates(image):
+    """Imagens menores/mais simples que 'image', das reduções maiores às menores."""
+    h, w = image.shape
+    # Valores trocados pelo posto (0, 1, 2, ...), mantendo a ordem
+    ranks = np.unique(image, return_inverse=True)[1].reshape(h, w).astype(np.uint8)
+    if not np.array_equal(ranks, image):
+        yield ranks
+    if h > 1:
+        yield image[:h // 2]
+        yield image[h // 2:]
+    if w > 1:
+        yield image[:, :w // 2]
+        yield image[:, w // 2:]
+    for y in range(h if h > 1 else 0):
+        yield np.delete(image, y, axis=0)
+    for x in range(w if w > 1 else 0):
+        yield np.delete(image, x, axis=1)
+    for y, x in zip(*np.nonzero(image)):
+        for value in (0, image[y, x] // 2):
+            candidate = image.copy()
+            candidate[y, x] = value
+            if not np.array_equal(candidate, image):
+                yield candidate
+
+
+def shrink(image, still_fails, budget=SHRINK_BUDGET):
+    """
+    Redução gulosa: aceita o primeiro candidato que ainda falha e recomeça.
+
+    Returns:
+        tuple: (imagem mínima, tentativas)
+    """
+    attempts = 0
+    improved = True
+    while improved and attempts < budget:
+        improved = False
+        for candidate in shrink_candidates(image):
+            attempts += 1
+            if still_fails(candidate):
+                image = candidate
+                improved = True
+                break
+            if attempts >= budget:
+                break
+    return image, attempts
+
+
+def print_failure(failure):
+    """Caso mínimo, saída da engine e referência."""
+    name, kind, window = failure['engine'], failure['kind'], failure['window']
+    image = failure['minimal']
+    print(f"\n✗ {name} [{kind}] janela {window} - caso {failure['case']} "
+          f"({failure['generator']}, {failure['shape'][0]}x{failure['shape'][1]}) "
+          f"reduzido para {image.shape[0]}x{image.shape[1]} "
+          f"em {failure['attempts']} tentativas")
+    print("   entrada:")
+    for row in image:
+        print("     " + ' '.join(f"{v:3d}" for v in row))
+    expected = reference(image, window)
+    try:
+        output = np.asarray(failure['run'](image, window))
+    except Exception as e:
+        print(f"   exceção: {type(e).__name__}: {e}")
+        return
+    for label, rows in ((name, output), ('referência', expected)):
+        print(f"   {label}:")
+        for row in rows.reshape(-1, rows.shape[-1]) if rows.ndim else [[rows]]:
+            print("     " + ' '.join(f"{int(v):3d}" for v in row))
+
+
+def fuzz(engines, windows, seed, cases=None, seconds=None, max_side=16,
+         explicit=()):
+    """
+    Laço principal.
+
+    Args:
+        engines: {nome: função}
+        windows: Janelas sorteadas
+        seed: Semente
+        cases / seconds: Critério de parada (número de casos ou tempo)
+        max_side: Maior lado das imagens geradas
+        explicit: Engines pedidas pelo nome (ignoram as janelas de paridade)
+
+    Returns:
+        dict: Contagens, tempos e falhas (uma reduzida por engine/tipo)
+    """
+    stats = {name: {'cases': 0, 'time': 0.0, 'failures': 0} for name in engines}
+    stats['ref'] = {'cases': 0, 'time': 0.0, 'failures': 0}
+    failures = {}
+    generated = 0
+    pixels = 0
+    batch = 0
+    start = time.perf_counter()
+
+    while True:
+        if cases is not None and generated >= cases:
+            break
+        if seconds is not None and time.perf_counter() - start >= seconds:
+            break
+        size = BATCH_SIZE if cases is None else min(BATCH_SIZE, cases - generated)
+        generators, stack, window = make_batch(seed, batch, max_side, windows, size)
+        first_case = batch * BATCH_SIZE
+        batch += 1
+        generated += size
+        pixels += stack.size
+
+        t0 = time.perf_counter()
+        expected = reference(stack, window)
+        stats['ref']['time'] += time.perf_counter() - t0
+        stats['ref']['cases'] += size
+
+        for name, run in engines.items():
+            _, parity, batched = ENGINES[name]
+            if parity is not None and window not in parity and name not in explicit:
+                continue
+            t0 = time.perf_counter()
+            kinds = check_batch(run, batched, stack, window, expected)
+            stats[name]['time'] += time.perf_counter() - t0
+            stats[name]['cases'] += size
+
+            for i, kind in enumerate(kinds):
+                if kind is None:
+                    continue
+                stats[name]['failures'] += 1
+                if (name, kind) in failures:
+                    continue
+                minimal, attempts = shrink(
+                    stack[i], lambda c, run=run, kind=kind: check(run, c, window) == kind)
+                failures[(name, kind)] = {
+                    'engine': name, 'kind': kind, 'window': window,
+                    'case': first_case + i, 'generator': generators[i],
+                    'shape': stack[i].shape, 'minimal': minimal,
+                    'attempts': attempts, 'run': run,
+                }
+
+    return {'cases': generated, 'pixels': pixels,
+            'elapsed': time.perf_counter() - start,
+            'stats': stats, 'failures': list(failures.values())}
+
+
+def print_report(report, seed, unavailable):
+    """Vazão, tempo por engine e falhas reduzidas."""
+    elapsed = report['elapsed']
+    print(f"Casos: {report['cases']} | Semente: {seed} | {elapsed:.2f} s | "
+          f"{report['cases'] / elapsed:,.0f} casos/s | "
+          f"{report['pixels'] / elapsed:,.0f} pixels/s")
+    for name, reason in unavailable.items():
+        print(f"   (engine {name} indisponível: {reason})")
+
+    print(f"\n{'Engine':<18}{'Casos':>10}{'µs/caso':>10}{'casos/s':>10}"
+          f"{'Falhas':>8}")
+    for name, s in report['stats'].items():
+        per_case = s['time'] / s['cases'] * 1e6 if s['cases'] else 0.0
+        rate = f"{s['cases'] / s['time']:,.0f}" if s['time'] else '-'
+        print(f"{name:<18}{s['cases']:>10}{per_case:>10.1f}{rate:>10}"
+              f"{s['failures']:>8}")
+
+    if not report['failures']:
+        print("\n✓ Nenhuma divergência")
+        return
+    for failure in report['failures']:
+        print_failure(failure)
+    print(f"\nReproduzir: --seed {seed} (o caso N sai do lote N // {BATCH_SIZE}, "
+          "gerado só da semente e do número do lote)")
+
+
+def main():
+    """Linha de comando do fuzzer."""
+    parser = argparse.ArgumentParser(
+        description="Fuzzing diferencial das engines do filtro Kuwahara")
+    stop = parser.add_mutually_exclusive_group()
+    stop.add_argument('--cases', type=int, help="Número de casos (padrão: 2000)")
+    stop.add_argument('--seconds', type=float, help="Roda por S segundos")
+    parser.add_argument('--seed', type=int, default=0, help="Semente (padrão: 0)")
+    parser.add_argument('--windows', type=int, nargs='+',
+                        default=list(DEFAULT_WINDOWS),
+                        help="Janelas sorteadas (padrão: 3 5 7)")
+    parser.add_argument('--max-side', type=int, default=16,
+                        help="Maior lado das imagens (padrão: 16)")
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES),
+                        help="Engines testadas (padrão: todas as disponíveis, "
+                             f"menos {', '.join(OPT_IN_ENGINES)})")
+    args = parser.parse_args()
+
+    if any(w < 3 or w % 2 == 0 for w in args.windows):
+        parser.error("janelas devem ser ímpares e >= 3")
+    if args.cases is None and args.seconds is None:
+        args.cases = 2000
+
+    engines, unavailable = load_engines(
+        args.engines or [n for n in ENGINES if n not in OPT_IN_ENGINES])
+    report = fuzz(engines, args.windows, args.seed, args.cases, args.seconds,
+                  args.max_side, explicit=args.engines or ())
+    print_report(report, args.seed, unavailable)
+    sys.exit(1 if report['failures'] else 0)
+
+
+if __name__ == "__main__":
+    main()
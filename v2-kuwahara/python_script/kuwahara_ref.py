@@ -0,0 +1,175 @@
+"""
+Referência do filtro Kuwahara no host (numpy).
+
+Reproduz kuwahara_filter_buffered() de Core/Src/main.c aplicada à imagem
+inteira: quadrantes na ordem {1,1},{0,1},{1,0},{0,0}, variância
+populacional em double, primeiro quadrante de menor desvio padrão vence,
+média truncada com (int) e bordas BORDER_REFLECT_101 (com clamp).
+
+Calcula só as linhas pedidas, então o writer_reader.py pode gerar a
+referência de cada faixa durante a transferência.
+
+Mapa de quadrantes: com return_maps=True saem também o índice (0-3, na
+posição de QUADRANT_ORDER) do quadrante escolhido em cada pixel e o
+desvio padrão vencedor, subprodutos do próprio laço de seleção. O mapa é
+gravado como .qmap (conteúdo .npz com arrays 'quadrant' uint8 e 'std'
+float32; o sufixo próprio evita que seja tomado por imagem .npz) e o
+compare_filtered.py o usa na camada de discordância de quadrantes. Para
+saídas sem mapa (pykuwahara, capturas da placa), infer_quadrants() deduz
+o quadrante a partir da imagem original: entre os quadrantes cuja média
+truncada é o valor de saída, o que a seleção escolheria (menor desvio,
+primeiro na ordem), então uma saída correta reproduz o mapa exato.
+
+Uso (filtra um arquivo PGM inteiro; com o 3º argumento grava o mapa):
+    python3 kuwahara_ref.py <entrada.pgm> <saida.pgm> [mapa.qmap]
+
+Autor: Roberta Alanis
+"""
+
+import sys
+
+import numpy as np
+
+KUWAHARA_WINDOW = 3
+QUADRANT_ORDER = ((1, 1), (0, 1), (1, 0), (0, 0))
+# Valor do mapa inferido quando nenhum quadrante explica a saída
+NO_QUADRANT = 255
+
+
+def reflect_indices(indices, size):
+    """BORDER_REFLECT_101 seguido de clamp, como no firmware."""
+    indices = np.where(indices < 0, -indices, indices)
+    indices = np.where(indices >= size, 2 * size - indices - 2, indices)
+    return np.clip(indices, 0, size - 1)
+
+
+def quadrant_stats(image, rows, window=KUWAHARA_WINDOW):
+    """
+    Média e desvio padrão de cada quadrante, na ordem de QUADRANT_ORDER.
+
+    Returns:
+        tuple: (médias, desvios), cada um (4, ..., len(rows), largura), float64
+    """
+    image = np.asarray(image, dtype=np.int64)
+    height, width = image.shape[-2:]
+    half = window // 2
+    quadrant_size = (window + 1) // 2
+    rows = np.asarray(rows, dtype=np.int64)
+
+    offsets = np.arange(-half, half + 1)
+    ys = reflect_indices(rows[:, None] + offsets, height)
+    xs = reflect_indices(np.arange(width)[:, None] + offsets, width)
+    # Janela de cada pixel: (..., linha, dy, coluna, dx)
+    win = image[..., ys[:, :, None, None], xs[None, None, :, :]]
+
+    n = quadrant_size * quadrant_size
+    means, stds = [], []
+    for quadrant_y, quadrant_x in QUADRANT_ORDER:
+        y0 = quadrant_size - 1 if quadrant_y else 0
+        x0 = quadrant_size - 1 if quadrant_x else 0
+        quad = win[..., y0:y0 + quadrant_size, :, x0:x0 + quadrant_size]
+        total = quad.sum(axis=(-3, -1)).astype(np.float64)
+        total_sq = (quad * quad).sum(axis=(-3, -1)).astype(np.float64)
+        variance = (total_sq - total * total / n) / n
+        means.append(total / n)
+        stds.append(np.sqrt(np.maximum(variance, 0.0)))
+    return np.array(means), np.array(stds)
+
+
+def kuwahara_rows(image, rows, window=KUWAHARA_WINDOW, return_maps=False):
+    """
+    Filtra as linhas 'rows' de 'image'.
+
+    Args:
+        image: Imagem completa (array 2D ou lista de linhas), ou uma pilha
+               de imagens do mesmo tamanho (..., altura, largura)
+        rows: Índices das linhas de saída
+        window: Tamanho da janela (ímpar)
+        return_maps: Devolve também o mapa de quadrantes e o desvio vencedor
+
+    Returns:
+        np.ndarray: Linhas filtradas (..., len(rows), largura), int64; com
+        return_maps, tupla (linhas, quadrante uint8, desvio float32)
+    """
+    means, stds = quadrant_stats(image, rows, window)
+    # argmin devolve o primeiro mínimo: mesma prioridade do laço do firmware
+    best = np.argmin(stds, axis=0)
+    filtered = np.take_along_axis(means, best[None], axis=0)[0].astype(np.int64)
+    if not return_maps:
+        return filtered
+    best_std = np.take_along_axis(stds, best[None], axis=0)[0]
+    return filtered, best.astype(np.uint8), best_std.astype(np.float32)
+
+
+def infer_quadrants(original, filtered, window=KUWAHARA_WINDOW):
+    """
+    Quadrante que explica cada pixel de uma saída sem mapa próprio.
+
+    Args:
+        original: Imagem de entrada do filtro
+        filtered: Saída a explicar (mesma forma)
+        window: Janela usada no filtro
+
+    Returns:
+        np.ndarray: Índice em QUADRANT_ORDER do quadrante de menor desvio
+        (primeiro na ordem) entre os de média truncada igual ao valor de
+        saída (uint8; NO_QUADRANT se nenhum)
+    """
+    original = np.asarray(original)
+    filtered = np.asarray(filtered, dtype=np.int64)
+    if original.shape != filtered.shape:
+        raise ValueError(f"Original {original.shape} e filtrada "
+                         f"{filtered.shape} com formas diferentes")
+    means, stds = quadrant_stats(original, range(original.shape[-2]), window)
+    matches = means.astype(np.int64) == filtered[None]
+    candidates = np.where(matches, stds, np.inf)
+    return np.where(matches.any(axis=0), np.argmin(candidates, axis=0),
+                    NO_QUADRANT).astype(np.uint8)
+
+
+def save_quadrant_map(path, quadrant, std=None):
+    """
+    Grava o mapa de quadrantes (e o desvio vencedor, se houver) no formato
+    .npz, com o nome dado (sem acrescentar .npz).
+    """
+    arrays = {'quadrant': np.asarray(quadrant, dtype=np.uint8)}
+    if std is not None:
+        arrays['std'] = np.asarray(std, dtype=np.float32)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+
+def load_quadrant_map(path):
+    """
+    Lê um mapa gravado por save_quadrant_map().
+
+    Returns:
+        tuple: (quadrante uint8, desvio float32 ou None)
+    """
+    with np.load(path) as data:
+        if 'quadrant' not in data:
+            raise ValueError(f"{path}: sem o array 'quadrant'")
+        return data['quadrant'], (data['std'] if 'std' in data else None)
+
+
+def main():
+    """Filtra um arquivo PGM inteiro com a referência."""
+    if len(sys.argv) not in (3, 4):
+        print("Uso: python3 kuwahara_ref.py <entrada.pgm> <saida.pgm> [mapa.qmap]")
+        sys.exit(1)
+
+    from writer_reader import read_pgm_file, save_pgm_file
+    width, height, max_val, image_data = read_pgm_file(sys.argv[1])
+    if len(sys.argv) == 4:
+        filtered, quadrant, std = kuwahara_rows(image_data, range(height),
+                                                return_maps=True)
+        save_quadrant_map(sys.argv[3], quadrant, std)
+    else:
+        filtered = kuwahara_rows(image_data, range(height))
+    save_pgm_file({'width': width, 'height': height, 'max_val': max_val,
+                   'data': [' '.join(str(p) for p in row) for row in filtered]},
+                  sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
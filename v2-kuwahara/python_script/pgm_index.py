@@ -0,0 +1,170 @@
+"""
+Índice de conteúdo das imagens PGM (manifesto por pasta).
+
+Cada pasta indexada (v1-kuwahara/imgs_filtered, Core/pgms, ...) ganha um
+arquivo .pgm_index.json com, para cada PGM: dimensões, maxval, hash dos
+pixels decodificados e as somas usadas nas métricas. A entrada só é
+recalculada quando o mtime (ou o tamanho) do arquivo muda.
+
+Com o índice, o compare_filtered.py declara duas imagens idênticas só
+pelos hashes, sem ler os arquivos ASCII nem calcular as métricas. O hash
+é dos pixels, então um .pgm e a sua versão .pgm.gz/.npz (pgm_io.py) caem
+no mesmo grupo.
+
+Uso (cria/atualiza o índice e lista os grupos de imagens idênticas):
+    python3 pgm_index.py <pasta|arquivo.pgm> [...]
+
+Autor: Roberta Alanis
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from pgm_io import is_pgm_path, read_pixels
+
+INDEX_NAME = '.pgm_index.json'
+INDEX_VERSION = 1
+
+
+def pixel_digest(pixels):
+    """Hash dos pixels decodificados (independe de espaços e comentários)."""
+    data = np.ascontiguousarray(pixels, dtype='<u2')
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.array(data.shape, dtype='<u4').tobytes())
+    h.update(data.tobytes())
+    return h.hexdigest()
+
+
+def describe_pixels(pixels, maxval):
+    """Entrada do índice (sem os campos de mtime/tamanho do arquivo)."""
+    height, width = pixels.shape
+    return {
+        'width': width,
+        'height': height,
+        'maxval': maxval,
+        'digest': pixel_digest(pixels),
+        'sum': int(pixels.sum(dtype=np.int64)),
+        'sum_sq': int(np.square(pixels, dtype=np.uint64).sum(dtype=np.uint64)),
+        'first': int(pixels.flat[0]),
+    }
+
+
+class PgmIndex:
+    """
+    Índices .pgm_index.json das pastas consultadas, carregados sob demanda.
+
+    lookup() devolve a entrada de um arquivo, recalculando-a se o arquivo
+    mudou; save() grava só as pastas alteradas. O índice é um cache: se a
+    pasta não aceita escrita, ele continua valendo só em memória.
+    """
+
+    def __init__(self):
+        self.folders = {}
+        self.dirty = set()
+
+    def _folder(self, folder):
+        if folder not in self.folders:
+            entries = {}
+            try:
+                with open(os.path.join(folder, INDEX_NAME)) as f:
+                    data = json.load(f)
+                if data.get('version') == INDEX_VERSION:
+                    entries = data.get('files', {})
+            except (OSError, ValueError):
+                pass
+            self.folders[folder] = entries
+        return self.folders[folder]
+
+    def lookup(self, path):
+        """
+        Entrada do índice de 'path'.
+
+        Returns:
+            tuple: (entrada, pixels) - pixels é o array lido quando a
+                   entrada precisou ser recalculada, senão None
+        """
+        path = os.path.abspath(path)
+        folder, name = os.path.split(path)
+        entries = self._folder(folder)
+        st = os.stat(path)
+
+        entry = entries.get(name)
+        if (entry and entry['mtime_ns'] == st.st_mtime_ns
+                and entry['size'] == st.st_size):
+            return entry, None
+
+        pixels, _, _, maxval = read_pixels(path)
+        entry = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size,
+                 **describe_pixels(pixels, maxval)}
+        entries[name] = entry
+        self.dirty.add(folder)
+        return entry, pixels
+
+    def save(self):
+        """Grava os índices das pastas alteradas (troca atômica do arquivo)."""
+        for folder in sorted(self.dirty):
+            path = os.path.join(folder, INDEX_NAME)
+            entries = self.folders[folder]
+            # Remove arquivos que não existem mais
+            for name in [n for n in entries
+                         if not os.path.exists(os.path.join(folder, n))]:
+                del entries[name]
+            try:
+                with open(path + '.tmp', 'w') as f:
+                    json.dump({'version': INDEX_VERSION, 'files': entries},
+                              f, indent=1, sort_keys=True)
+                os.replace(path + '.tmp', path)
+            except OSError:
+                pass
+        self.dirty.clear()
+
+
+def same_pixels(entry1, entry2):
+    """True se as duas entradas descrevem os mesmos pixels."""
+    return ((entry1['width'], entry1['height'], entry1['digest']) ==
+            (entry2['width'], entry2['height'], entry2['digest']))
+
+
+def main():
+    """Cria/atualiza os índices e lista as imagens idênticas."""
+    if len(sys.argv) < 2:
+        print("Uso: python3 pgm_index.py <pasta|arquivo.pgm> [...]")
+        sys.exit(1)
+
+    paths = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            paths += sorted(os.path.join(arg, n) for n in os.listdir(arg)
+                            if is_pgm_path(n))
+        else:
+            paths.append(arg)
+
+    index = PgmIndex()
+    groups = {}
+    updated = 0
+    for path in paths:
+        try:
+            entry, pixels = index.lookup(path)
+        except (OSError, ValueError) as e:
+            print(f"✗ {path}: {e}")
+            continue
+        updated += pixels is not None
+        key = (entry['width'], entry['height'], entry['digest'])
+        groups.setdefault(key, []).append(path)
+    index.save()
+
+    print(f"Arquivos: {len(paths)} | Atualizados: {updated} | "
+          f"Conteúdos distintos: {len(groups)}")
+    for (width, height, digest), members in groups.items():
+        if len(members) > 1:
+            print(f"\n{width}x{height} {digest[:12]} ({len(members)} idênticos):")
+            for path in members:
+                print(f"   {os.path.basename(path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+E/S transparente de PGM comprimido e .npz.
+
+Os corpora ASCII (imgs_original, imgs_filtered, Core/pgms) ocupam cerca
+de 4x os pixels crus. Os leitores e gravadores do projeto passam por
+aqui, e o sufixo do arquivo escolhe o formato:
+
+    .pgm                       P2 (ou P5) sem compressão
+    .pgm.gz  .pgm.xz  .pgm.bz2 P2 comprimido (biblioteca padrão)
+    .pgm.zst                   P2 comprimido com zstd (compression.zstd do
+                               Python 3.14+ ou o pacote 'zstandard')
+    .npz                       numpy comprimido: arrays 'image' e 'maxval'
+
+A descompressão é em fluxo: open_pgm() devolve um arquivo, e
+iter_pixel_blocks() lê bloco a bloco de linhas, então o leitor em blocos
+do compare_filtered.py continua com memória limitada pelo bloco.
+
+Uso (recompressão em lote, conferindo os pixels antes de apagar o original):
+    python3 pgm_io.py <pasta|arquivo> [...] --to gz|zst|xz|bz2|npz|pgm
+                      [--level N] [--keep] [--dry-run] [--measure]
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import time
+import zipfile
+
+import numpy as np
+
+STREAM_SUFFIXES = ('.gz', '.zst', '.xz', '.bz2')
+FORMATS = ('pgm', 'gz', 'zst', 'xz', 'bz2', 'npz')
+READ_CHUNK = 1 << 20  # bytes de texto descomprimido por leitura em blocos
+
+
+def storage_format(path):
+    """'pgm', 'gz', 'zst', 'xz', 'bz2' ou 'npz', pelo sufixo."""
+    name = path.lower()
+    if name.endswith('.npz'):
+        return 'npz'
+    for suffix in STREAM_SUFFIXES:
+        if name.endswith('.pgm' + suffix):
+            return suffix[1:]
+    return 'pgm'
+
+
+def is_pgm_path(path):
+    """True para .pgm, .pgm.<compressão> e .npz."""
+    name = path.lower()
+    return (name.endswith(('.pgm', '.npz'))
+            or any(name.endswith('.pgm' + s) for s in STREAM_SUFFIXES))
+
+
+def pgm_stem(path):
+    """Nome sem pasta e sem o sufixo de armazenamento (.pgm[.gz], .npz)."""
+    name = os.path.basename(path)
+    fmt = storage_format(name)
+    if fmt == 'npz':
+        return name[:-len('.npz')]
+    if fmt != 'pgm':
+        name = name[:-len(fmt) - 1]
+    return name[:-len('.pgm')] if name.lower().endswith('.pgm') else name
+
+
+def with_format(path, fmt):
+    """Mesmo arquivo com o sufixo do formato 'fmt'."""
+    suffix = {'pgm': '.pgm', 'npz': '.npz'}.get(fmt, f'.pgm.{fmt}')
+    return os.path.join(os.path.dirname(path), pgm_stem(path) + suffix)
+
+
+def _open_zstd(path, mode, level):
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.open(path, mode, level=level if 'w' in mode else None)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f"{path}: .zst requer Python 3.14+ ou o pacote "
+                           "'zstandard' (pip install zstandard)") from None
+    cctx = zstandard.ZstdCompressor(level=level or 3) if 'w' in mode else None
+    return zstandard.open(path, mode, cctx=cctx)
+
+
+def open_pgm(path, mode='rb', level=None):
+    """
+    Abre um PGM (comprimido ou não) como arquivo, com descompressão em fluxo.
+
+    Args:
+        mode: 'rb', 'rt', 'wb' ou 'wt'
+        level: Nível de compressão na escrita (padrão de cada formato)
+    """
+    fmt = storage_format(path)
+    if fmt == 'npz':
+        raise ValueError(f"{path}: .npz não é um fluxo de texto "
+                         "(use read_pixels/write_pixels)")
+    writing = 'w' in mode
+    if fmt == 'gz':
+        return gzip.open(path, mode, compresslevel=level if level is not None else 6)
+    if fmt == 'xz':
+        return lzma.open(path, mode, preset=level if writing else None)
+    if fmt == 'bz2':
+        return bz2.open(path, mode, compresslevel=level or 9)
+    if fmt == 'zst':
+        return _open_zstd(path, mode, level)
+    return open(path, mode)
+
+
+def read_header(f):
+    """
+    Lê o cabeçalho de um PGM (P2 ou P5) de um fluxo binário, deixando-o
+    posicionado no início dos pixels.
+
+    Returns:
+        tuple: (magic, largura, altura, maxval)
+    """
+    def next_line():
+        line = f.readline()
+        if not line:
+            raise ValueError("Cabeçalho PGM incompleto")
+        return line.decode('ascii').strip()
+
+    magic = next_line()
+    if magic not in ('P2', 'P5'):
+        raise ValueError(f"Formato esperado P2 ou P5, encontrado {magic}")
+    line = next_line()
+    while line.startswith('#'):
+        line = next_line()
+    width, height = map(int, line.split())
+    return magic, width, height, int(next_line())
+
+
+def pixel_dtype(maxval):
+    return np.uint8 if maxval <= 255 else np.uint16
+
+
+def read_npz(path):
+    """(pixels, maxval) de um .npz gravado por write_npz()."""
+    with np.load(path) as data:
+        return data['image'], int(data['maxval'])
+
+
+def write_npz(path, pixels, maxval):
+    """Grava pixels e maxval num .npz comprimido."""
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, image=np.asarray(pixels), maxval=np.array(maxval))
+
+
+def npz_shape(path):
+    """(largura, altura, maxval) de um .npz sem descomprimir os pixels."""
+    with zipfile.ZipFile(path) as archive:
+        with archive.open('image.npy') as f:
+            version = np.lib.format.read_magic(f)
+            read_array_header = (np.lib.format.read_array_header_1_0
+                                 if version == (1, 0)
+                                 else np.lib.format.read_array_header_2_0)
+            shape = read_array_header(f)[0]
+        with archive.open('maxval.npy') as f:
+            maxval = int(np.lib.format.read_array(f))
+    return shape[1], shape[0], maxval
+
+
+def read_pixels(path):
+    """
+    Lê qualquer formato suportado.
+
+    Returns:
+        tuple: (pixels uint8/uint16 altura x largura, largura, altura, maxval)
+    """
+    if storage_format(path) == 'npz':
+        pixels, maxval = read_npz(path)
+        return pixels, pixels.shape[1], pixels.shape[0], maxval
+    with open_pgm(path, 'rb') as f:
+        magic, width, height, maxval = read_header(f)
+        data = f.read()
+    if magic == 'P5':
+        pixels = np.frombuffer(data, dtype=np.uint8 if maxval <= 255 else '>u2',
+                               count=width * height)
+    else:
+        pixels = np.fromstring(data.decode('ascii'), dtype=np.int64, sep=' ')
+    if pixels.size != width * height:
+        raise ValueError(f"{path}: {pixels.size} pixels, esperado {width * height}")
+    return pixels.astype(pixel_dtype(maxval)).reshape(height, width), width, height, maxval
+
+
+def pgm_shape(path):
+    """(largura, altura, maxval), lendo/descomprimindo só o cabeçalho."""
+    if storage_format(path) == 'npz':
+        return npz_shape(path)
+    with open_pgm(path, 'rb') as f:
+        return read_header(f)[1:]
+
+
+def iter_pixel_blocks(path, block_rows):
+    """
+    Lê um PGM em blocos de 'block_rows' linhas, descomprimindo em fluxo.
+
+    Yields:
+        tuple: (linha inicial, bloco altura x largura uint8/uint16)
+    """
+    if storage_format(path) == 'npz':
+        pixels = read_npz(path)[0]
+        for row0 in range(0, pixels.shape[0], block_rows):
+            yield row0, pixels[row0:row0 + block_rows]
+        return
+
+    with open_pgm(path, 'rb') as f:
+        magic, width, height, maxval = read_header(f)
+        dtype = pixel_dtype(maxval)
+        if magic == 'P5':
+            row_bytes = width * (1 if maxval <= 255 else 2)
+            for row0 in range(0, height, block_rows):
+                rows = min(block_rows, height - row0)
+                data = f.read(rows * row_bytes)
+                if len(data) < rows * row_bytes:
+                    raise ValueError(f"{path}: pixels insuficientes "
+                                     f"(esperado {width * height})")
+                block = np.frombuffer(data, dtype=np.uint8 if maxval <= 255 else '>u2')
+                yield row0, block.astype(dtype).reshape(rows, width)
+            return
+
+        pending = np.empty(0, dtype=np.int64)
+        carry = b''  # número cortado no fim do trecho anterior
+        eof = False
+        for row0 in range(0, height, block_rows):
+            need = min(block_rows, height - row0) * width
+            while pending.size < need and not eof:
+                chunk = f.read(READ_CHUNK)
+                eof = not chunk
+                text = carry + chunk
+                cut = len(text) if eof else max(text.rfind(b' '), text.rfind(b'\n')) + 1
+                carry = text[cut:]
+                values = np.fromstring(text[:cut].decode('ascii'), dtype=np.int64, sep=' ')
+                pending = np.concatenate((pending, values))
+            if pending.size < need:
+                raise ValueError(f"{path}: pixels insuficientes "
+                                 f"(esperado {width * height})")
+            yield row0, pending[:need].astype(dtype).reshape(-1, width)
+            pending = pending[need:]
+        if pending.size or carry.strip() or f.read().strip():
+            raise ValueError(f"{path}: mais pixels que o esperado ({width * height})")
+
+
+def write_pixels(path, pixels, maxval=255, comment=None, level=None):
+    """
+    Grava pixels no formato indicado pelo sufixo (P2 com uma linha da
+    imagem por linha de texto, ou .npz).
+    """
+    if storage_format(path) == 'npz':
+        write_npz(path, pixels, maxval)
+        return
+    height, width = pixels.shape
+    with open_pgm(path, 'wt', level) as f:
+        f.write('P2\n')
+        if comment:
+            f.write(f"# {comment}\n")
+        f.write(f"{width} {height}\n{maxval}\n")
+        for row in pixels:
+            f.write(' '.join(map(str, row.tolist())) + '\n')
+
+
+def drop_cache(path):
+    """Tira o arquivo do cache de páginas, quando o sistema permite."""
+    if hasattr(os, 'posix_fadvise'):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def cold_read_seconds(path):
+    """Tempo de read_pixels() com o arquivo fora do cache de páginas."""
+    drop_cache(path)
+    start = time.perf_counter()
+    read_pixels(path)
+    return time.perf_counter() - start
+
+
+def recompress(path, fmt, level=None, keep=False):
+    """
+    Regrava 'path' no formato 'fmt' e confere os pixels.
+
+    Entre formatos de texto o conteúdo é copiado em fluxo, byte a byte
+    (comentários preservados); de/para .npz passa pelos pixels.
+
+    Returns:
+        str: Caminho do novo arquivo
+    """
+    target = with_format(path, fmt)
+    if os.path.abspath(target) == os.path.abspath(path):
+        return path
+    # O temporário mantém o sufixo do destino, que decide o formato
+    tmp = os.path.join(os.path.dirname(target), '.tmp-' + os.path.basename(target))
+    try:
+        if 'npz' in (fmt, storage_format(path)):
+            pixels, _, _, maxval = read_pixels(path)
+            write_pixels(tmp, pixels, maxval, level=level)
+        else:
+            with open_pgm(path, 'rb') as src, open_pgm(tmp, 'wb', level) as dst:
+                shutil.copyfileobj(src, dst, READ_CHUNK)
+        if not np.array_equal(read_pixels(path)[0], read_pixels(tmp)[0]):
+            raise ValueError(f"{path}: pixels diferentes após recompressão")
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, target)
+    if not keep:
+        os.remove(path)
+    return target
+
+
+def collect(paths):
+    """Arquivos PGM das pastas (recursivo) e arquivos dados."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += sorted(os.path.join(root, n) for n in names if is_pgm_path(n))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recompressão em lote de PGMs (.pgm, .pgm.gz/.zst/.xz/.bz2, .npz)")
+    parser.add_argument('paths', nargs='+', help="Pastas (recursivo) ou arquivos")
+    parser.add_argument('--to', choices=FORMATS, required=True, help="Formato de destino")
+    parser.add_argument('--level', type=int, help="Nível de compressão")
+    parser.add_argument('--keep', action='store_true', help="Mantém os originais")
+    parser.add_argument('--dry-run', action='store_true', help="Só lista o que faria")
+    parser.add_argument('--measure', action='store_true',
+                        help="Mede a leitura com cache frio antes e depois")
+    args = parser.parse_args()
+
+    files = [f for f in collect(args.paths) if storage_format(f) != args.to]
+    if not files:
+        print("Nada a recompactar.")
+        return
+    before = after = 0
+    read_before = read_after = 0.0
+    failures = 0
+    for path in files:
+        target = with_format(path, args.to)
+        if args.dry_run:
+            print(f"  {path} -> {os.path.basename(target)}")
+            continue
+        size = os.path.getsize(path)
+        if args.measure:
+            read_before += cold_read_seconds(path)
+        try:
+            target = recompress(path, args.to, args.level, args.keep)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"  ✗ {path}: {e}")
+            failures += 1
+            continue
+        new_size = os.path.getsize(target)
+        if args.measure:
+            read_after += cold_read_seconds(target)
+        before += size
+        after += new_size
+        print(f"  {path}: {size / 1024:.1f} KiB -> {new_size / 1024:.1f} KiB "
+              f"({os.path.basename(target)})")
+    if args.dry_run:
+        return
+    print(f"\n{len(files) - failures} arquivo(s): {before / 1024:.1f} KiB -> "
+          f"{after / 1024:.1f} KiB ({after / max(before, 1):.1%})")
+    if args.measure:
+        print(f"Leitura com cache frio: {read_before * 1000:.1f} ms -> "
+              f"{read_after * 1000:.1f} ms")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
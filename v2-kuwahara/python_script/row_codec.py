@@ -0,0 +1,179 @@
+"""
+Codificação compacta de linhas para o link UART (modo WIRE_CODEC).
+
+Cada linha vira um quadro binário:
+
+    tag (1 byte) | tamanho do payload (1 byte) | payload | CRC-8 (1 byte)
+
+Tags:
+    0x00 RAW   - payload = pixels (1 byte cada)
+    0x01 DELTA - payload = primeiro pixel + diferenças em nibbles (4 bits,
+                 complemento de 2, -7..7); o nibble 0x8 é um escape seguido
+                 do valor absoluto em dois nibbles
+    0x02 RLE   - payload = pares (repetições 1-255, valor)
+
+O CRC-8 (polinômio 0x07) cobre tag, tamanho e payload; um quadro com CRC
+errado é descartado e a linha é pedida de novo.
+
+Para cada linha é escolhida a menor codificação (empate: RAW, RLE, DELTA),
+mesma regra usada pelo firmware (send_row_codec em Core/Src/main.c).
+
+Uso (relatório de compressão de um arquivo PGM):
+    python3 row_codec.py <imagem.pgm>
+
+Autor: Roberta Alanis
+"""
+
+import sys
+
+TAG_RAW = 0x00
+TAG_DELTA = 0x01
+TAG_RLE = 0x02
+TAG_NAMES = {TAG_RAW: 'RAW', TAG_DELTA: 'DELTA', TAG_RLE: 'RLE'}
+
+DELTA_ESCAPE = 0x8
+CRC_POLY = 0x07
+
+
+class CodecError(ValueError):
+    """Quadro inválido (tag desconhecida ou payload inconsistente)."""
+
+
+def crc8(data, crc=0):
+    """CRC-8 (polinômio 0x07, sem reflexão), igual a crc8_update() do firmware."""
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = ((crc << 1) ^ CRC_POLY) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def encode_rle(pixels):
+    """Codifica a linha como pares (repetições, valor)."""
+    payload = bytearray()
+    i = 0
+    while i < len(pixels):
+        value = pixels[i]
+        count = 1
+        while (i + count < len(pixels) and pixels[i + count] == value
+               and count < 255):
+            count += 1
+        payload += bytes((count, value))
+        i += count
+    return bytes(payload)
+
+
+def encode_delta(pixels):
+    """Codifica a linha como primeiro pixel + diferenças em nibbles."""
+    nibbles = []
+    for prev, value in zip(pixels, pixels[1:]):
+        delta = value - prev
+        if -7 <= delta <= 7:
+            nibbles.append(delta & 0x0F)
+        else:
+            nibbles += (DELTA_ESCAPE, value >> 4, value & 0x0F)
+    if len(nibbles) % 2:
+        nibbles.append(0)
+    packed = bytes((hi << 4) | lo for hi, lo in zip(nibbles[::2], nibbles[1::2]))
+    return bytes((pixels[0],)) + packed
+
+
+def encode_row(pixels):
+    """
+    Codifica uma linha como quadro (tag + tamanho + payload + CRC).
+
+    Returns:
+        bytes: Quadro com a menor das três codificações
+    """
+    candidates = (
+        (TAG_RAW, bytes(pixels)),
+        (TAG_RLE, encode_rle(pixels)),
+        (TAG_DELTA, encode_delta(pixels)),
+    )
+    tag, payload = min(candidates, key=lambda c: len(c[1]))
+    if len(payload) > 255:
+        raise CodecError(f"Linha longa demais para um quadro: {len(payload)}")
+    frame = bytes((tag, len(payload))) + payload
+    return frame + bytes((crc8(frame),))
+
+
+def decode_payload(tag, payload, width):
+    """
+    Decodifica o payload de um quadro.
+
+    Returns:
+        list: 'width' pixels
+    """
+    if tag == TAG_RAW:
+        pixels = list(payload)
+
+    elif tag == TAG_RLE:
+        if len(payload) % 2:
+            raise CodecError("Payload RLE com tamanho ímpar")
+        pixels = []
+        for count, value in zip(payload[::2], payload[1::2]):
+            pixels += [value] * count
+
+    elif tag == TAG_DELTA:
+        if not payload:
+            raise CodecError("Payload DELTA vazio")
+        pixels = [payload[0]]
+        nibbles = []
+        for b in payload[1:]:
+            nibbles += (b >> 4, b & 0x0F)
+        i = 0
+        try:
+            while len(pixels) < width:
+                nib = nibbles[i]
+                i += 1
+                if nib == DELTA_ESCAPE:
+                    value = (nibbles[i] << 4) | nibbles[i + 1]
+                    i += 2
+                else:
+                    value = (pixels[-1] + (nib - 16 if nib > 7 else nib)) & 0xFF
+                pixels.append(value)
+        except IndexError:
+            raise CodecError("Payload DELTA truncado") from None
+
+    else:
+        raise CodecError(f"Tag desconhecida: 0x{tag:02x}")
+
+    if len(pixels) != width:
+        raise CodecError(f"Linha com {len(pixels)} pixels (esperado {width})")
+    return pixels
+
+
+def ascii_size(pixels):
+    """Bytes da mesma linha no protocolo texto (pixels separados por espaço)."""
+    return len(' '.join(str(p) for p in pixels)) + 1
+
+
+def main():
+    """Relatório de compressão das linhas de um arquivo PGM."""
+    if len(sys.argv) != 2:
+        print("Uso: python3 row_codec.py <imagem.pgm>")
+        sys.exit(1)
+
+    from writer_reader import read_pgm_file
+    width, height, _, image_data = read_pgm_file(sys.argv[1])
+
+    ascii_bytes = 0
+    wire_bytes = 0
+    tag_counts = {name: 0 for name in TAG_NAMES.values()}
+    for row in image_data:
+        frame = encode_row(row)
+        if decode_payload(frame[0], frame[2:-1], width) != row:
+            print("x Falha no round-trip da codificação!")
+            sys.exit(1)
+        tag_counts[TAG_NAMES[frame[0]]] += 1
+        ascii_bytes += ascii_size(row)
+        wire_bytes += len(frame)
+
+    print(f"Linhas: {height} | " +
+          ' | '.join(f"{name}: {n}" for name, n in tag_counts.items()))
+    print(f"Texto: {ascii_bytes} bytes | Codificado: {wire_bytes} bytes | "
+          f"Razão: {ascii_bytes / wire_bytes:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Histórico das comparações em SQLite (run_history.sqlite).
+
+O compare_filtered.py grava aqui cada resultado (um par, lote ou matriz):
+imagem, implementação, raio do filtro, horário da captura e as métricas.
+A tabela é indexada por imagem, implementação, horário e raio, então as
+perguntas sobre o histórico ("quando o pepper parou de bater?") saem de
+uma consulta, sem recomparar nada.
+
+Um mesmo arquivo comparado de novo com a mesma referência substitui a
+linha anterior; uma captura alterada (outro mtime) vira uma linha nova.
+
+Uso:
+    python3 run_history.py summary
+    python3 run_history.py trend <imagem> [--implementation X] [--radius R]
+    python3 run_history.py regressions [--image X] [--implementation X]
+
+Autor: Roberta Alanis
+"""
+
+import argparse
+import datetime
+import math
+import os
+import re
+import sqlite3
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'run_history.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    image TEXT NOT NULL,
+    implementation TEXT NOT NULL,
+    radius INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    candidate TEXT NOT NULL,
+    candidate_mtime_ns INTEGER NOT NULL,
+    reference TEXT NOT NULL,
+    identical INTEGER NOT NULL,
+    mae REAL,
+    rmse REAL,
+    psnr REAL,
+    ssim REAL,
+    correlation REAL,
+    max_diff INTEGER,
+    percent_different REAL,
+    UNIQUE (candidate, candidate_mtime_ns, reference, radius)
+);
+CREATE INDEX IF NOT EXISTS results_image
+    ON results (image, radius, captured_at);
+CREATE INDEX IF NOT EXISTS results_implementation
+    ON results (implementation, radius, captured_at);
+CREATE INDEX IF NOT EXISTS results_captured ON results (captured_at);
+"""
+
+# filtered_YYYYMMDD_HHMMSS.pgm (nome dado pelo writer_reader.py)
+CAPTURE_NAME = re.compile(r'(\d{8})_(\d{6})')
+
+METRIC_COLUMNS = ['mae', 'rmse', 'psnr', 'ssim', 'correlation']
+
+
+def connect(db_path=DEFAULT_DB):
+    """Abre (e cria, se preciso) o banco do histórico."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def capture_time(path):
+    """Horário da captura: do nome filtered_<data>_<hora> ou do mtime."""
+    match = CAPTURE_NAME.search(os.path.basename(path))
+    if match:
+        try:
+            return datetime.datetime.strptime(
+                ''.join(match.groups()), '%Y%m%d%H%M%S').isoformat()
+        except ValueError:
+            pass
+    return datetime.datetime.fromtimestamp(
+        os.path.getmtime(path)).isoformat(timespec='seconds')
+
+
+def record(db_path, entries):
+    """
+    Grava resultados de comparação.
+
+    Args:
+        db_path: Caminho do banco
+        entries: Dicionários com candidate, reference, image,
+                 implementation, radius, mode e as métricas do resultado
+                 (mesmas chaves de compare_arrays(); faltantes viram NULL)
+
+    Returns:
+        int: Linhas gravadas
+    """
+    now = datetime.datetime.now().isoformat(timespec='seconds')
+    rows = []
+    for e in entries:
+        candidate = os.path.abspath(e['candidate'])
+        metrics = [e.get(k) for k in METRIC_COLUMNS]
+        # NaN (SSIM de imagem menor que a janela) fica NULL
+        metrics = [None if isinstance(v, float) and math.isnan(v)
+                   else (float(v) if v not in (None, '') else None)
+                   for v in metrics]
+        rows.append((
+            now, capture_time(candidate), e['image'], e['implementation'],
+            int(e['radius']), e['mode'], candidate,
+            os.stat(candidate).st_mtime_ns, os.path.abspath(e['reference']),
+            int(bool(e['identical'])), *metrics,
+            int(e['max_diff_value']), float(e['percent_different']),
+        ))
+
+    with connect(db_path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO results (recorded_at, captured_at, image,"
+            " implementation, radius, mode, candidate, candidate_mtime_ns,"
+            " reference, identical, mae, rmse, psnr, ssim, correlation,"
+            " max_diff, percent_different)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.close()
+    return len(rows)
+
+
+def select(conn, image=None, implementation=None, radius=None):
+    """Resultados filtrados, em ordem de captura."""
+    where, params = [], []
+    for column, value in (('image', image), ('implementation', implementation),
+                          ('radius', radius)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    sql = "SELECT * FROM results"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY image, implementation, radius, captured_at, candidate"
+    return conn.execute(sql, params).fetchall()
+
+
+def find_transitions(rows):
+    """
+    Mudanças de estado (bate / não bate) por imagem, implementação e raio.
+
+    Returns:
+        list: (chave, linha anterior, linha que mudou)
+    """
+    transitions = []
+    previous = {}
+    for row in rows:
+        key = (row['image'], row['implementation'], row['radius'])
+        last = previous.get(key)
+        if last is not None and last['identical'] != row['identical']:
+            transitions.append((key, last, row))
+        previous[key] = row
+    return transitions
+
+
+def print_summary(conn):
+    """Uma linha por imagem/implementação/raio com o estado mais recente."""
+    rows = conn.execute(
+        "SELECT image, implementation, radius, COUNT(*) AS runs,"
+        " SUM(identical) AS matches, MIN(captured_at) AS first,"
+        " MAX(captured_at) AS last FROM results"
+        " GROUP BY image, implementation, radius"
+        " ORDER BY image, implementation, radius").fetchall()
+    if not rows:
+        print("Histórico vazio")
+        return
+    print(f"{'Imagem':<14}{'Implementação':<24}{'Raio':>5}{'Capturas':>10}"
+          f"{'Batem':>7}  {'Primeira':<20}{'Última':<20}Estado")
+    for r in rows:
+        latest = conn.execute(
+            "SELECT identical, mae FROM results WHERE image = ? AND"
+            " implementation = ? AND radius = ? ORDER BY captured_at DESC,"
+            " candidate DESC LIMIT 1",
+            (r['image'], r['implementation'], r['radius'])).fetchone()
+        state = ('✓ idêntica' if latest['identical']
+                 else f"✗ MAE {latest['mae']:.4f}")
+        print(f"{r['image']:<14}{r['implementation']:<24}{r['radius']:>5}"
+              f"{r['runs']:>10}{r['matches']:>7}  {r['first']:<20}"
+              f"{r['last']:<20}{state}")
+
+
+def print_trend(rows):
+    """Série temporal das métricas."""
+    if not rows:
+        print("Nenhum resultado para o filtro")
+        return
+    print(f"{'Captura':<20}{'Implementação':<24}{'Raio':>5}  {'':2}"
+          f"{'MAE':>9}{'SSIM':>8}{'PSNR':>8}{'Máx':>5}  Arquivo")
+    for r in rows:
+        ssim = f"{r['ssim']:.4f}" if r['ssim'] is not None else '-'
+        psnr = f"{r['psnr']:.2f}" if not math.isinf(r['psnr']) else 'inf'
+        print(f"{r['captured_at']:<20}{r['implementation']:<24}{r['radius']:>5}  "
+              f"{'✓' if r['identical'] else '✗':2}{r['mae']:9.4f}{ssim:>8}"
+              f"{psnr:>8}{r['max_diff']:>5}  {os.path.basename(r['candidate'])}")
+
+
+def print_regressions(rows):
+    """Quando cada imagem parou (ou voltou) de bater com a referência."""
+    transitions = find_transitions(rows)
+    if not transitions:
+        print("Nenhuma mudança de estado no histórico")
+        return
+    for (image, implementation, radius), before, after in transitions:
+        if after['identical']:
+            print(f"✓ {image} [{implementation}, raio {radius}] voltou a bater "
+                  f"em {after['captured_at']} ({os.path.basename(after['candidate'])})")
+        else:
+            print(f"✗ {image} [{implementation}, raio {radius}] parou de bater "
+                  f"em {after['captured_at']} ({os.path.basename(after['candidate'])}, "
+                  f"MAE {after['mae']:.4f}); última idêntica: "
+                  f"{before['captured_at']} ({os.path.basename(before['candidate'])})")
+
+
+def main():
+    """Consultas ao histórico."""
+    parser = argparse.ArgumentParser(
+        description="Consulta o histórico de comparações (SQLite)")
+    parser.add_argument('--db', default=DEFAULT_DB,
+                        help="Banco do histórico (padrão: run_history.sqlite)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('summary', help="Estado mais recente por imagem/implementação")
+
+    trend = sub.add_parser('trend', help="Métricas de uma imagem ao longo do tempo")
+    trend.add_argument('image')
+    trend.add_argument('--implementation')
+    trend.add_argument('--radius', type=int)
+
+    regressions = sub.add_parser('regressions',
+                                 help="Quando cada imagem parou/voltou a bater")
+    regressions.add_argument('--image')
+    regressions.add_argument('--implementation')
+    regressions.add_argument('--radius', type=int)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"✗ Banco não encontrado: {args.db}")
+        return
+    conn = connect(args.db)
+    if args.command == 'summary':
+        print_summary(conn)
+    elif args.command == 'trend':
+        print_trend(select(conn, args.image, args.implementation, args.radius))
+    else:
+        print_regressions(select(conn, args.image, args.implementation,
+                                 args.radius))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,17 +7,87 @@ Fase 2: Envia linhas 44-89 (últimas 46 linhas) → STM32 processa 45-89
 Overlap: Linha 44 é reenviada na FASE 2 para permitir que o filtro
          processe a linha 45 (que precisa ler linha 44 e 46)
 
+Com várias placas (--port repetido), a imagem é dividida em faixas de até
+44/45 linhas com halo de 1 linha; cada placa pega a próxima faixa pendente
+em cada fase, então placas mais lentas recebem menos faixas.
+
+Com --compress as linhas trafegam como quadros binários RAW/DELTA/RLE
+(row_codec.py); exige o firmware compilado com WIRE_CODEC.
+
+Cada linha recebida é validada (largura e faixa de valores; no modo
+--compress também o CRC-8 do quadro). Linhas com erro voltam para a fila e
+são pedidas de novo em uma nova faixa; se a placa sair de sincronia, ela é
+levada de volta ao início da FASE 1 (resync) em vez de abortar a execução.
+
+Com --verify a referência de cada faixa é calculada no host
+(kuwahara_ref.py) durante a transferência e cada linha recebida é
+comparada ao chegar; --stop-on-mismatch interrompe na primeira divergência.
+A divergência informa o quadrante (0-3) e o desvio que a referência
+escolheu no pixel.
+
+Cada execução grava a telemetria do link (bytes, linhas, taxas, esperas e
+pausas por fase) em filtered_<timestamp>.json, ao lado do .pgm salvo.
+
+A entrada pode ser .pgm, .pgm.gz/.zst/.xz/.bz2 ou .npz (pgm_io.py), e
+--store escolhe o formato da captura gravada (padrão: .pgm).
+
+Uso:
+    python3 writer_reader.py <imagem.pgm> [--port PORTA ...] [--baud BAUD]
+                             [--compress] [--verify] [--stop-on-mismatch]
+                             [--store gz|zst|xz|bz2|npz]
+
+PORTA pode ser um dispositivo (/dev/ttyACM0, COM3) ou uma URL do pyserial,
+por exemplo socket://localhost:7777 para o emulador (device_emulator.py).
+
 Autor: Roberta Alanis
 """
 
+import argparse
+import json
+import numpy as np
 import serial
 import serial.tools.list_ports
+import statistics
+import threading
 import time
 import sys
 import os
 
+from kuwahara_ref import kuwahara_rows
+from pgm_io import (FORMATS, open_pgm, pgm_stem, read_pixels, storage_format,
+                    with_format, write_npz)
+from row_codec import (TAG_NAMES, CodecError, ascii_size, crc8, decode_payload,
+                       encode_row)
+
 HANDSHAKE_READY = "#READY2#"
 HANDSHAKE_GO = "#GO2#"
+BAUD_RATE = 115200
+
+# Parâmetros do firmware (Core/Src/main.c)
+BUFFER_SIZE = 46       # Linhas recebidas por fase
+LINES_PER_PHASE = 45   # Linhas filtradas devolvidas por fase
+BITS_PER_BYTE = 10     # 8N1: start + 8 dados + stop
+DELAY_BEFORE_HEADER = 0.750  # HAL_Delay() entre a recepção e o cabeçalho
+DELAY_BEFORE_PHASE2 = 0.100  # HAL_Delay() entre a recepção e a FASE 2
+
+# Intervalo entre linhas considerado pausa: STALL_FACTOR x mediana
+# (e pelo menos STALL_MIN_GAP segundos)
+STALL_FACTOR = 3.0
+STALL_MIN_GAP = 0.01
+
+# Recuperação de erros
+MAX_ROW_RETRIES = 5    # Tentativas por linha antes de abortar
+RESYNC_ATTEMPTS = 4    # Envios do marcador de resync antes de desistir
+RESYNC_QUIET = 2.0     # Silêncio (s) que encerra cada tentativa de resync
+ROW_IDLE_TIMEOUT = 3.0 # Silêncio (s) que encerra a captura de uma fase
+
+
+class TransferError(Exception):
+    """Falha de comunicação com a placa durante uma fase."""
+
+
+class VerificationError(TransferError):
+    """Linha recebida difere da referência (--stop-on-mismatch)."""
 
 
 def list_serial_ports():
@@ -51,16 +121,40 @@ def select_port(ports):
             print("Digite um número válido!")
 
 
+def open_serial(port, baudrate=BAUD_RATE):
+    """
+    Abre a porta serial (dispositivo ou URL do pyserial, ex.: socket://).
+
+    Returns:
+        serial.Serial: Porta aberta com timeout de 1 s
+    """
+    return serial.serial_for_url(
+        port,
+        baudrate=baudrate,
+        bytesize=serial.EIGHTBITS,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        timeout=1
+    )
+
+
 def read_pgm_file(filepath):
     """
     Lê um arquivo PGM P2 (ASCII) e retorna os dados da imagem.
+    Comprimidos são lidos em fluxo; .npz vai pelo pgm_io.
 
     Returns:
         tuple: (width, height, max_value, image_data)
         image_data é uma lista de listas [linha][coluna]
     """
     try:
-        with open(filepath, 'r') as f:
+        if storage_format(filepath) == 'npz':
+            pixels, width, height, max_value = read_pixels(filepath)
+            print(
+                f"\n✓ Arquivo PGM carregado: {width}x{height}, max_value={max_value}")
+            return width, height, max_value, pixels.tolist()
+
+        with open_pgm(filepath, 'rt') as f:
             # Pula comentários e lê o cabeçalho
             lines = []
             for line in f:
@@ -111,50 +205,442 @@ def read_pgm_file(filepath):
         sys.exit(1)
 
 
-def send_lines(ser, image_data, start_line, end_line):
-    """Envia bloco de linhas sequencialmente."""
-    num_lines = end_line - start_line + 1
-    print(f"\nEnviando linhas {start_line}-{end_line} ({num_lines} linhas)...")
-    buf = []
-    for i in range(start_line, end_line + 1):
-        line = image_data[i]
-        buf.append(' '.join(str(p) for p in line) + '\n')
-        if (i - start_line + 1) % 10 == 0 or i == end_line:
-            print(
-                f"  Enviadas {i - start_line + 1}/{num_lines} linhas", end='\r')
-    ser.write(''.join(buf).encode('ascii'))
-    ser.flush()
-    print()  # Nova linha
-    print("OK Envio concluído")
+def reflect_101(index, size):
+    """Reflete 'index' para dentro de [0, size) com BORDER_REFLECT_101."""
+    if size == 1:
+        return 0
+    period = 2 * (size - 1)
+    index %= period
+    return period - index if index >= size else index
 
 
-def capture_filtered_lines(ser, expected_lines, phase_name):
-    """Captura linhas filtradas enviadas pelo STM32."""
+def plan_slot(phase, start, height):
+    """
+    Monta as 46 linhas de entrada de uma fase cuja faixa começa em 'start'.
+
+    O firmware filtra as posições 0-44 do buffer na FASE 1 (refletindo a
+    borda superior na posição 0) e 1-45 na FASE 2 (refletindo a borda
+    inferior na posição 45). O halo fora da imagem é refletido no host, então
+    qualquer faixa pode ser enviada em qualquer fase; só as linhas cujo
+    contexto no buffer é o contexto real da imagem são aproveitadas.
+
+    Returns:
+        tuple: (input_rows, line_rows)
+            input_rows: 46 índices de linha da imagem a enviar
+            line_rows: 45 índices (linha da imagem de cada linha devolvida
+                       pela placa, ou None se deve ser descartada)
+    """
+    base = max(start - 1, 0) if phase == 1 else start - 1
+    input_rows = [reflect_101(base + j, height) for j in range(BUFFER_SIZE)]
+
+    first_j = 0 if phase == 1 else 1
+    line_rows = []
+    for j in range(first_j, first_j + LINES_PER_PHASE):
+        row = base + j
+        if phase == 1:
+            valid = j >= 1 or base == 0
+        else:
+            valid = j <= BUFFER_SIZE - 2 or row == height - 1
+        line_rows.append(row if valid and row < height else None)
+    return input_rows, line_rows
+
+
+class BandQueue:
+    """
+    Fila de linhas pendentes compartilhada entre as placas.
+
+    Cada placa pede uma faixa por fase; a fila escolhe o início que cobre
+    mais linhas pendentes, então uma placa mais rápida simplesmente pede
+    faixas mais vezes (rebalanceamento dinâmico).
+    """
+
+    def __init__(self, height):
+        self.height = height
+        self.pending = set(range(height))
+        self.in_flight = set()
+        self.attempts = {}
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def _candidate_starts(self):
+        """Inícios candidatos: começo e fim de cada segmento pendente."""
+        rows = sorted(self.pending)
+        seg_start = rows[0]
+        for prev, row in zip(rows, rows[1:] + [None]):
+            if row is not None and row == prev + 1:
+                continue
+            seg_end = prev + 1
+            yield seg_start
+            yield max(seg_end - LINES_PER_PHASE, 0)
+            yield max(seg_end - (LINES_PER_PHASE - 1), 0)
+            seg_start = row
+
+    def take(self, phase):
+        """
+        Reserva a melhor faixa para a próxima fase de uma placa.
+
+        Returns:
+            tuple: (input_rows, line_rows) ou None se não há linhas pendentes
+        """
+        with self.lock:
+            if not self.pending:
+                return None
+            best = None
+            for start in self._candidate_starts():
+                input_rows, line_rows = plan_slot(phase, start, self.height)
+                covered = sum(1 for r in line_rows if r in self.pending)
+                if best is None or covered > best[0]:
+                    best = (covered, input_rows, line_rows)
+            _, input_rows, line_rows = best
+            line_rows = [r if r in self.pending else None for r in line_rows]
+            taken = {r for r in line_rows if r is not None}
+            self.pending -= taken
+            self.in_flight |= taken
+            return input_rows, line_rows
+
+    def done(self, rows):
+        """Marca linhas como recebidas."""
+        with self.lock:
+            self.in_flight -= set(rows)
+
+    def close(self):
+        """Esvazia a fila para as demais placas pararem (execução abortada)."""
+        with self.lock:
+            self.pending.clear()
+            self.closed = True
+
+    def retry(self, rows):
+        """
+        Devolve linhas com erro para a fila.
+
+        Raises:
+            TransferError: Se alguma linha excedeu MAX_ROW_RETRIES
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.in_flight -= set(rows)
+            self.pending |= set(rows)
+            for row in rows:
+                self.attempts[row] = self.attempts.get(row, 0) + 1
+                if self.attempts[row] > MAX_ROW_RETRIES:
+                    raise TransferError(
+                        f"Linha {row} falhou {self.attempts[row]} vezes")
+
+
+class StreamVerifier:
+    """
+    Confere as linhas recebidas com a referência calculada no host.
+
+    A referência de cada faixa é calculada quando a faixa é enviada
+    (prepare) e cada linha é comparada ao chegar (check). Uma linha pedida
+    de novo substitui o resultado anterior nas estatísticas.
+    """
+
+    def __init__(self, image_data, stop_on_mismatch=False):
+        self.image = np.array(image_data, dtype=np.int64)
+        self.stop_on_mismatch = stop_on_mismatch
+        self.expected = {}
+        self.quadrants = {}  # linha: (quadrante escolhido, desvio vencedor)
+        self.row_stats = {}  # linha: (pixels diferentes, máx, soma |dif|)
+        self.mismatches = {}  # linha: primeira coluna divergente (detalhes)
+        self.lock = threading.Lock()
+
+    def prepare(self, rows):
+        """Calcula a referência das linhas de uma faixa."""
+        if not rows:
+            return
+        reference, quadrant, std = kuwahara_rows(self.image, rows,
+                                                 return_maps=True)
+        with self.lock:
+            self.expected.update(zip(rows, reference))
+            self.quadrants.update(zip(rows, zip(quadrant, std)))
+
+    def check(self, row, line):
+        """
+        Compara uma linha recebida (já validada) com a referência.
+
+        Raises:
+            VerificationError: Na primeira divergência, com stop_on_mismatch
+        """
+        got = np.array(line.split(), dtype=np.int64)
+        with self.lock:
+            expected = self.expected[row]
+            diff = np.abs(got - expected)
+            mismatched = int(np.count_nonzero(diff))
+            self.row_stats[row] = (mismatched, int(diff.max()), int(diff.sum()))
+            # Uma linha reenviada substitui também o detalhe da divergência
+            self.mismatches.pop(row, None)
+            if mismatched:
+                col = int(np.flatnonzero(diff)[0])
+                quadrant, std = self.quadrants[row]
+                first = {'row': row, 'col': col, 'got': int(got[col]),
+                         'expected': int(expected[col]),
+                         'quadrant': int(quadrant[col]),
+                         'std': round(float(std[col]), 3)}
+                self.mismatches[row] = first
+            bad_rows = sum(1 for n, _, _ in self.row_stats.values() if n)
+            bad_pixels = sum(n for n, _, _ in self.row_stats.values())
+
+        if mismatched:
+            print(f"  ! Linha {row}: {mismatched} pixel(s) diferente(s) da "
+                  f"referência (máx {int(diff.max())}) | acumulado: "
+                  f"{bad_rows} linha(s), {bad_pixels} pixel(s)")
+            if self.stop_on_mismatch:
+                raise VerificationError(
+                    f"Divergência na linha {row}, coluna {first['col']}: "
+                    f"recebido {first['got']}, esperado {first['expected']} "
+                    f"(quadrante {first['quadrant']}, desvio {first['std']})")
+
+    def summary(self):
+        """Estatísticas das linhas conferidas."""
+        with self.lock:
+            stats = list(self.row_stats.values())
+            pixels = len(stats) * self.image.shape[1]
+            return {
+                'rows_checked': len(stats),
+                'rows_mismatched': sum(1 for n, _, _ in stats if n),
+                'pixels_mismatched': sum(n for n, _, _ in stats),
+                'max_abs_diff': max((m for _, m, _ in stats), default=0),
+                'mae': (sum(t for _, _, t in stats) / pixels) if pixels else 0.0,
+                'first_mismatch': (self.mismatches[min(self.mismatches)]
+                                   if self.mismatches else None),
+            }
+
+
+def print_verify_report(summary):
+    """Exibe o resultado da verificação contra a referência do host."""
     print(f"\n{'='*50}")
-    print(f"CAPTURANDO RESULTADO DA {phase_name}")
+    print("VERIFICAÇÃO CONTRA A REFERÊNCIA DO HOST")
     print(f"{'='*50}")
+    print(f"Linhas conferidas: {summary['rows_checked']} | "
+          f"divergentes: {summary['rows_mismatched']}")
+    print(f"Pixels divergentes: {summary['pixels_mismatched']} | "
+          f"MAE: {summary['mae']:.4f} | máx |dif|: {summary['max_abs_diff']}")
+    m = summary['first_mismatch']
+    if m:
+        print(f"Primeira divergência: linha {m['row']}, coluna {m['col']} "
+              f"(recebido {m['got']}, esperado {m['expected']}, da referência "
+              f"no quadrante {m['quadrant']} com desvio {m['std']})")
+    else:
+        print("OK Saída idêntica à referência")
+
+
+def new_phase_record(phase, port=''):
+    """
+    Registro de telemetria de uma fase.
+
+    Os campos '*_at' são instantes de time.monotonic(); summarize_phase()
+    converte o registro em métricas.
+    """
+    return {
+        'port': port,
+        'phase': phase,
+        'useful_rows': [],
+        'rows_sent': 0,
+        'rows_received': 0,
+        'rows_rejected': 0,
+        'device_messages': [],
+        'ready_seen': False,
+        'resync': False,
+        'bytes_sent': 0,
+        'bytes_sent_text': 0,
+        'bytes_received': 0,
+        'bytes_received_text': 0,
+        'handshake_at': None,
+        'ready_at': None,
+        'started_at': None,
+        'send_done_at': None,
+        'header_at': None,
+        'first_byte_at': None,       # primeiro byte da resposta (FASE 1: cabeçalho)
+        'rows_first_byte_at': None,  # primeiro byte das linhas filtradas
+        'row_times': [],
+    }
+
+
+def send_lines(ser, image_data, rows, verbose=True, compress=False,
+               record=None):
+    """Envia as linhas 'rows' (índices da imagem) sequencialmente."""
+    num_lines = len(rows)
+    if verbose:
+        print(
+            f"\nEnviando linhas {rows[0]}-{rows[-1]} ({num_lines} linhas)...")
+    buf = bytearray()
+    text_bytes = 0
+    for n, i in enumerate(rows, start=1):
+        line = image_data[i]
+        text_bytes += ascii_size(line)
+        if compress:
+            buf += encode_row(line)
+        else:
+            buf += (' '.join(str(p) for p in line) + '\n').encode('ascii')
+        if verbose and (n % 10 == 0 or n == num_lines):
+            print(f"  Enviadas {n}/{num_lines} linhas", end='\r')
+    if record is not None:
+        record['started_at'] = time.monotonic()
+    ser.write(buf)
+    ser.flush()
+    if record is not None:
+        record['send_done_at'] = time.monotonic()
+        record['rows_sent'] += num_lines
+        record['bytes_sent'] += len(buf)
+        record['bytes_sent_text'] += text_bytes
+    if verbose:
+        print()  # Nova linha
+        print("OK Envio concluído")
+
+
+def read_frame(ser, first, width):
+    """
+    Lê o restante de um quadro codificado cuja tag já foi lida.
+
+    Returns:
+        tuple: (linha como texto ou None se o quadro foi descartado,
+                bytes lidos, True se o quadro veio inteiro - com o tamanho
+                lido, a posição das linhas seguintes continua conhecida)
+    """
+    size = ser.read(1)
+    if not size:
+        print("  x Quadro truncado")
+        return None, 1, False
+    rest = ser.read(size[0] + 1)
+    nbytes = 2 + len(rest)
+    if len(rest) != size[0] + 1:
+        print("  x Quadro truncado")
+        return None, nbytes, False
+    payload, crc = rest[:-1], rest[-1]
+    if crc != crc8(first + size + payload):
+        print("  x Quadro com CRC inválido")
+        return None, nbytes, True
+    try:
+        pixels = decode_payload(first[0], payload, width)
+    except CodecError as e:
+        print(f"  x Quadro inválido: {e}")
+        return None, nbytes, True
+    return ' '.join(str(p) for p in pixels), nbytes, True
+
+
+def read_reply(ser, compress, width):
+    """
+    Lê a próxima resposta da placa: uma linha filtrada ou uma mensagem.
+
+    Returns:
+        tuple: (texto, True se é linha de pixels, bytes lidos); o texto é
+        None se um quadro foi descartado - como linha de pixels se o quadro
+        veio inteiro (CRC ou conteúdo inválido: a posição é conhecida), como
+        mensagem se veio truncado (o fluxo perdeu o alinhamento)
+    """
+    if compress:
+        first = ser.read(1)
+        if first and first[0] in TAG_NAMES:
+            line, nbytes, framed = read_frame(ser, first, width)
+            return line, framed, nbytes
+        # Mensagens de texto (ERROR, SKIP) continuam em ASCII
+        raw = first + ser.readline()
+        return raw.decode('ascii', errors='replace').strip(), False, len(raw)
+
+    raw = ser.readline()
+    # Bytes corrompidos viram U+FFFD e a linha falha em validate_row()
+    line = raw.decode('ascii', errors='replace').strip()
+    return line, not is_device_message(line), len(raw)
+
+
+def is_device_message(line):
+    """Mensagens e tokens da placa que não são linhas de pixels."""
+    return line.startswith(('ERROR', 'SKIP', '#'))
+
+
+def validate_row(line, width, max_val):
+    """
+    Confere uma linha filtrada recebida.
+
+    Returns:
+        bool: True se a linha tem 'width' inteiros entre 0 e max_val
+    """
+    values = line.split()
+    if len(values) != width:
+        return False
+    return all(v.isascii() and v.isdigit() and int(v) <= max_val
+               for v in values)
+
+
+def capture_filtered_lines(ser, expected_lines, phase_name, verbose=True,
+                           compress=False, width=None, record=None,
+                           on_row=None):
+    """
+    Captura linhas filtradas enviadas pelo STM32.
+
+    A captura termina ao completar 'expected_lines', ao receber #READY2# ou
+    SKIP (a placa encerrou a fase), após ROW_IDLE_TIMEOUT sem dados ou no
+    timeout total. Mensagens da placa são anotadas em
+    record['device_messages']. Um quadro descartado com o tamanho intacto
+    ocupa a sua posição como None (só essa linha é reenviada); um quadro
+    truncado encerra a captura, porque a posição das linhas seguintes fica
+    incerta. Se dado, on_row(índice, linha) é chamado a cada linha recebida
+    (linha None para um quadro descartado).
+
+    Returns:
+        list: Linhas capturadas, None nas posições de quadros descartados
+              (podem ser menos que 'expected_lines')
+    """
+    if verbose:
+        print(f"\n{'='*50}")
+        print(f"CAPTURANDO RESULTADO DA {phase_name}")
+        print(f"{'='*50}")
+        print(f"Aguardando {expected_lines} linhas filtradas...")
     lines_captured = []
     timeout_time = time.time() + 20
-    print(f"Aguardando {expected_lines} linhas filtradas...")
+    last_byte_time = None
     while time.time() < timeout_time:
         if ser.in_waiting > 0:
-            raw = ser.readline()
-            line = raw.decode('ascii', errors='ignore').strip()
-            if not line:
+            last_byte_time = time.time()
+            if record is not None:
+                now = time.monotonic()
+                if record['first_byte_at'] is None:
+                    record['first_byte_at'] = now
+                if record['rows_first_byte_at'] is None:
+                    record['rows_first_byte_at'] = now
+            line, is_row, nbytes = read_reply(ser, compress, width)
+            if record is not None:
+                record['bytes_received'] += nbytes
+            if line is None:
+                if not is_row:
+                    break  # Quadro truncado: fluxo fora de alinhamento
+            elif not line:
                 continue
-            if line.startswith('ERROR'):
+            elif not is_row:
+                if line == HANDSHAKE_READY:
+                    if record is not None:
+                        record['ready_seen'] = True
+                    break
                 print(f"  x STM32: {line}")
+                if record is not None:
+                    record['device_messages'].append(line)
+                if line.startswith('SKIP'):
+                    break
                 continue
+            if record is not None and line is not None:
+                record['bytes_received_text'] += len(line) + 1
+                record['rows_received'] += 1
+                record['row_times'].append(time.monotonic())
             lines_captured.append(line)
-            if len(lines_captured) % 10 == 0:
+            if on_row is not None:
+                on_row(len(lines_captured) - 1, line)
+            if verbose and len(lines_captured) % 10 == 0:
                 print(
                     f"  Linha {len(lines_captured)}/{expected_lines} capturada", end='\r')
             if len(lines_captured) >= expected_lines:
-                print(f"\nOK Todas as {expected_lines} linhas capturadas!")
+                if verbose:
+                    print(f"\nOK Todas as {expected_lines} linhas capturadas!")
                 return lines_captured
+        elif (last_byte_time is not None
+              and time.time() - last_byte_time > ROW_IDLE_TIMEOUT):
+            break
+        else:
+            time.sleep(0.001)
     print(
-        f"\nx Timeout! Capturadas apenas {len(lines_captured)}/{expected_lines} linhas")
-    return None
+        f"\nx Capturadas apenas {len(lines_captured)}/{expected_lines} linhas")
+    return lines_captured
 
 
 def wait_for_token(ser, token, total_timeout=30):
@@ -174,14 +660,15 @@ def wait_for_token(ser, token, total_timeout=30):
     return False
 
 
-def capture_pgm_header(ser):
+def capture_pgm_header(ser, verbose=True, record=None):
     """
     Captura o cabeçalho PGM (P2, dimensões, max_value).
 
     Returns:
         dict: {'width': int, 'height': int, 'max_val': int} ou None
     """
-    print("\nAguardando cabeçalho P2...")
+    if verbose:
+        print("\nAguardando cabeçalho P2...")
 
     timeout_time = time.time() + 20
     header_found = False
@@ -191,31 +678,54 @@ def capture_pgm_header(ser):
 
     while time.time() < timeout_time:
         if ser.in_waiting > 0:
-            line = ser.readline().decode('ascii', errors='ignore').strip()
+            if record is not None and record['first_byte_at'] is None:
+                record['first_byte_at'] = time.monotonic()
+            raw = ser.readline()
+            # O cabeçalho é texto também no modo --compress
+            if record is not None:
+                record['bytes_received'] += len(raw)
+                record['bytes_received_text'] += len(raw)
+            line = raw.decode('ascii', errors='replace').strip()
 
             if not line:
                 continue
 
+            if line.startswith('ERROR'):
+                print(f"  x STM32: {line}")
+                if record is not None:
+                    record['device_messages'].append(line)
+                continue
+
             # Detecta P2
             if line == 'P2' and not header_found:
-                print("OK Cabeçalho P2 detectado!")
+                if verbose:
+                    print("OK Cabeçalho P2 detectado!")
                 header_found = True
                 continue
 
-            # Lê dimensões
-            if header_found and width == 0:
-                parts = line.split()
-                if len(parts) == 2:
-                    width = int(parts[0])
-                    height = int(parts[1])
-                    print(f"OK Dimensões: {width}x{height}")
-                continue
+            # Qualquer outra coisa antes do P2 é um cabeçalho corrompido
+            if not header_found:
+                print(f"x Cabeçalho inválido: {line[:40]!r}")
+                return None
+
+            try:
+                # Lê dimensões
+                if width == 0:
+                    width, height = (int(v) for v in line.split())
+                    if verbose:
+                        print(f"OK Dimensões: {width}x{height}")
+                    continue
 
-            # Lê max_value
-            if header_found and max_val == 0 and width > 0:
+                # Lê max_value
                 max_val = int(line)
+            except ValueError:
+                print(f"x Cabeçalho inválido: {line[:40]!r}")
+                return None
+            if record is not None:
+                record['header_at'] = time.monotonic()
+            if verbose:
                 print(f"OK Max value: {max_val}")
-                return {'width': width, 'height': height, 'max_val': max_val}
+            return {'width': width, 'height': height, 'max_val': max_val}
 
     print("x Timeout ao aguardar cabeçalho!")
     return None
@@ -223,14 +733,23 @@ def capture_pgm_header(ser):
 
 def save_pgm_file(image_dict, output_path):
     """
-    Salva imagem capturada como arquivo PGM.
+    Salva imagem capturada como arquivo PGM (comprimido ou .npz conforme
+    o sufixo de output_path).
 
     Args:
         image_dict: Dicionário com width, height, max_val, data
         output_path: Caminho do arquivo de saída
     """
     try:
-        with open(output_path, 'w') as f:
+        if storage_format(output_path) == 'npz':
+            pixels = np.array([line.split() for line in image_dict['data']],
+                              dtype=np.int64)
+            write_npz(output_path, pixels.astype(np.uint8 if image_dict['max_val'] <= 255
+                                                 else np.uint16), image_dict['max_val'])
+            print(f"\nOK Imagem salva em: {output_path}")
+            return True
+
+        with open_pgm(output_path, 'wt') as f:
             f.write('P2\n')
             f.write(f"{image_dict['width']} {image_dict['height']}\n")
             f.write(f"{image_dict['max_val']}\n")
@@ -244,17 +763,546 @@ def save_pgm_file(image_dict, output_path):
         return False
 
 
+def start_phase2(ser, verbose=True, record=None, ready_seen=False):
+    """
+    Handshake da FASE 2: espera #READY2# e responde #GO2#.
+
+    Args:
+        ready_seen: #READY2# já foi lido durante a captura da FASE 1
+
+    Returns:
+        bool: False se o #READY2# não chegou (placa fora de sincronia)
+    """
+    if verbose:
+        print("\nAguardando pronto para FASE 2 (#READY2#)...")
+    if record is not None:
+        record['handshake_at'] = time.monotonic()
+    if not ready_seen and not wait_for_token(ser, HANDSHAKE_READY):
+        print("x Timeout aguardando READY2.")
+        return False
+    if record is not None:
+        record['ready_at'] = time.monotonic()
+    if verbose:
+        print("OK Recebido READY2. Enviando GO2.")
+    ser.reset_input_buffer()
+    time.sleep(0.05)
+    ser.write(HANDSHAKE_GO.encode('ascii'))
+    ser.flush()
+    time.sleep(0.05)
+    return True
+
+
+def resync(ser, compress=False, verbose=True):
+    """
+    Leva a placa de volta ao início da FASE 1 após uma fase com falha.
+
+    Envia #GO2# seguido de um terminador que nenhuma recepção aceita (linha
+    vazia no modo texto, tag inválida no modo --compress):
+
+    - recebendo linhas: a recepção falha (ERROR ou SKIP);
+    - aguardando #GO2#: a FASE 2 começa e falha na primeira linha (SKIP);
+    - enviando resultados: o marcador é consumido depois por um dos casos
+      acima.
+
+    Cada tentativa lê a resposta até RESYNC_QUIET segundos de silêncio; a
+    placa está sincronizada quando a última coisa recebida é um SKIP.
+
+    Returns:
+        bool: True se a placa voltou a aguardar a FASE 1
+    """
+    marker = (HANDSHAKE_GO + ('#' if compress else '\n')).encode('ascii')
+    ready = HANDSHAKE_READY.encode('ascii')
+    if verbose:
+        print("\nRessincronizando placa...")
+
+    for attempt in range(1, RESYNC_ATTEMPTS + 1):
+        ser.write(marker)
+        ser.flush()
+        buf = b''
+        last_byte_time = time.time()
+        deadline = time.time() + 30
+        while (time.time() - last_byte_time < RESYNC_QUIET
+               and time.time() < deadline):
+            if ser.in_waiting > 0:
+                buf += ser.read(ser.in_waiting)
+                last_byte_time = time.time()
+                if buf.rstrip().endswith(ready):
+                    break  # Placa aguardando #GO2#: próxima tentativa
+            else:
+                time.sleep(0.01)
+
+        tail = buf[buf.rfind(b'SKIP'):] if b'SKIP' in buf else b''
+        if tail and tail.count(b'\n') <= 1 and ready not in tail:
+            if verbose:
+                print(f"OK Placa sincronizada (tentativa {attempt})")
+            return True
+
+    print("x Placa não respondeu à ressincronização")
+    return False
+
+
+def new_device_stats(tag=''):
+    """Estatísticas de uma placa, preenchidas por run_device()."""
+    return {'port': tag, 'header': None, 'rows': 0, 'slot_times': [],
+            'phases': [], 'resyncs': 0}
+
+
+def run_device(ser, image_data, queue, results, verbose=True, tag='',
+               compress=False, verifier=None, stats=None):
+    """
+    Executa sessões (FASE 1 + FASE 2) em uma placa até esvaziar a fila.
+
+    Se a fila esvazia antes da FASE 2, a sessão é fechada com uma faixa
+    descartável para a placa voltar a aguardar a FASE 1.
+
+    Linhas inválidas voltam para a fila; se a fase terminou fora do
+    protocolo (timeout, mensagem de erro, cabeçalho corrompido), a placa é
+    ressincronizada e a sessão recomeça com a próxima faixa pendente.
+
+    Args:
+        ser: Porta serial aberta
+        image_data: Linhas da imagem original
+        queue: BandQueue compartilhada
+        results: Dicionário {linha: texto filtrado} preenchido aqui
+        tag: Identificação da placa nas mensagens
+        compress: Usa quadros RAW/DELTA/RLE em vez de texto
+        verifier: StreamVerifier opcional (confere cada linha ao chegar)
+        stats: Estatísticas a preencher (new_device_stats()); o chamador
+            mantém o que já foi medido mesmo se a transferência falhar
+
+    Returns:
+        dict: {'port', 'header', 'rows', 'slot_times', 'phases', 'resyncs'}
+    """
+    height = len(image_data)
+    width = len(image_data[0])
+    if stats is None:
+        stats = new_device_stats(tag)
+
+    def run_phase(phase, slot, record):
+        """Executa uma fase; retorna False se a placa saiu de sincronia."""
+        input_rows, line_rows = slot
+        useful = [r for r in line_rows if r is not None]
+        record['useful_rows'] = useful
+        stats['phases'].append(record)
+        if verbose:
+            print("\n" + "=" * 50)
+            print(f"FASE {phase}: Enviando linhas "
+                  f"{input_rows[0]}-{input_rows[-1]} ({len(input_rows)} linhas)")
+            if useful:
+                print(f"        STM32 processará linhas {useful[0]}-{useful[-1]}")
+            print("=" * 50)
+
+        t0 = time.monotonic()
+        send_lines(ser, image_data, input_rows, verbose, compress, record)
+        if verifier is not None:
+            # Calculada enquanto a placa recebe e filtra a faixa
+            verifier.prepare(useful)
+
+        checked = set()
+        in_order = True
+
+        def check_row(index, line):
+            # Depois de uma linha inválida a posição das seguintes não é
+            # confiável; elas são conferidas no fim da fase (só se a fase
+            # vier completa). Um quadro descartado mantém a posição.
+            nonlocal in_order
+            row = line_rows[index] if index < len(line_rows) else None
+            if not in_order or row is None or line is None:
+                return
+            if not validate_row(line, width, max_val):
+                in_order = False
+                return
+            verifier.check(row, line)
+            checked.add(row)
+
+        lines = []
+        if phase == 1:
+            # Cabeçalho PGM (enviado pelo STM32 após receber a FASE 1)
+            header = capture_pgm_header(ser, verbose, record)
+            if header:
+                stats['header'] = header
+        max_val = stats['header']['max_val'] if stats['header'] else 255
+        if phase == 2 or header:
+            lines = capture_filtered_lines(
+                ser, LINES_PER_PHASE, f"FASE {phase}", verbose, compress,
+                width, record, check_row if verifier is not None else None)
+
+        # Com menos linhas que o esperado (quadro truncado, timeout) não dá
+        # para saber qual linha faltou; com mensagem de erro a entrada da
+        # placa estava incompleta. Quadros descartados chegam como None na
+        # sua posição e só essas linhas são reenviadas.
+        complete = (len(lines) == LINES_PER_PHASE
+                    and not record['device_messages'])
+        accepted = []
+        for row, line in zip(line_rows, lines if complete else []):
+            if (row is not None and line is not None
+                    and validate_row(line, width, max_val)):
+                results[row] = line
+                accepted.append(row)
+        rejected = [r for r in useful if r not in accepted]
+        record['rows_rejected'] = len(rejected)
+        if verifier is not None:
+            for row in accepted:
+                if row not in checked:
+                    verifier.check(row, results[row])
+
+        queue.done(accepted)
+        if rejected:
+            print(f"  x [{tag}] FASE {phase}: {len(rejected)} linha(s) com "
+                  f"erro serão reenviadas")
+            queue.retry(rejected)
+
+        if accepted:
+            elapsed = time.monotonic() - t0
+            stats['rows'] += len(accepted)
+            stats['slot_times'].append(elapsed)
+            if not verbose:
+                print(f"  [{tag}] FASE {phase}: linhas {accepted[0]}-"
+                      f"{accepted[-1]} OK ({elapsed:.2f} s)")
+
+        if phase == 1:
+            return complete or (record['ready_seen']
+                                and not record['device_messages'])
+        return complete
+
+    def recover(record):
+        if record not in stats['phases']:
+            stats['phases'].append(record)
+        record['resync'] = True
+        stats['resyncs'] += 1
+        if not resync(ser, compress, verbose):
+            raise TransferError("Placa fora de sincronia")
+
+    while True:
+        slot = queue.take(1)
+        if slot is None:
+            break
+        record = new_phase_record(1, tag)
+        if not run_phase(1, slot, record):
+            recover(record)
+            continue
+
+        ready_seen = record['ready_seen']
+        record = new_phase_record(2, tag)
+        if not start_phase2(ser, verbose, record, ready_seen):
+            recover(record)
+            continue
+        slot = queue.take(2)
+        if slot is None:
+            # Fecha a sessão; as linhas devolvidas são descartadas
+            input_rows, line_rows = plan_slot(2, 0, height)
+            slot = (input_rows, [None] * len(line_rows))
+        if not run_phase(2, slot, record):
+            recover(record)
+
+    return stats
+
+
+def find_single_board_run(output_dir, image, compress, baudrate):
+    """
+    Execução com 1 placa mais recente para a mesma imagem, modo e baudrate,
+    lida da telemetria em 'output_dir' (filtered_<timestamp>.json).
+
+    Returns:
+        tuple: (tempo total em s, caminho do .json) ou None
+    """
+    best = None
+    try:
+        names = sorted(os.listdir(output_dir))
+    except OSError:
+        return None
+    for name in names:
+        if not (name.startswith('filtered_') and name.endswith('.json')):
+            continue
+        path = os.path.join(output_dir, name)
+        try:
+            with open(path) as f:
+                run = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if (len(run.get('ports') or []) == 1 and 'error' not in run
+                and run.get('total_time')
+                and os.path.abspath(run.get('image', '')) == os.path.abspath(image)
+                and run.get('compress') == compress
+                and run.get('baudrate') == baudrate):
+            best = (run['total_time'], path)
+    return best
+
+
+def print_fanout_report(device_stats, elapsed, height, single_run=None):
+    """
+    Resume a divisão entre as placas e compara com 1 placa.
+
+    O ganho só é exibido contra uma execução medida com 1 placa
+    (single_run, de find_single_board_run()); o modelo (fases x tempo
+    mediano por fase desta execução) é só uma estimativa.
+    """
+    slot_times = [t for s in device_stats for t in s['slot_times']]
+
+    # Fases que uma única placa precisaria para a mesma imagem, incluindo
+    # a FASE 2 descartável que fecha a sessão (como em 'elapsed')
+    queue = BandQueue(height)
+    bands = 0
+    phase = 1
+    while queue.take(phase) is not None:
+        bands += 1
+        phase = 2 if phase == 1 else 1
+    single_slots = bands + (phase == 2)
+    single_estimate = single_slots * statistics.median(slot_times)
+
+    print(f"\n{'='*50}")
+    print("DIVISÃO ENTRE PLACAS")
+    print(f"{'='*50}")
+    for s in device_stats:
+        mean = statistics.mean(s['slot_times']) if s['slot_times'] else 0.0
+        print(f"  {s['port']}: {s['rows']} linhas, {len(s['slot_times'])} "
+              f"fases, {mean:.2f} s/fase")
+    print(f"Tempo com {len(device_stats)} placas: {elapsed:.2f} s")
+    print(f"Modelo com 1 placa (estimativa, não medido): {single_estimate:.2f} s "
+          f"({single_slots} fases x {statistics.median(slot_times):.2f} s)")
+    if single_run is not None:
+        single_time, path = single_run
+        print(f"Medido com 1 placa: {single_time:.2f} s "
+              f"({os.path.basename(path)})")
+        print(f"Ganho: {single_time / elapsed:.2f}x")
+    else:
+        print("Ganho: sem execução com 1 placa para comparar (rode a mesma "
+              "imagem com uma só --port)")
+    if bands < 2 * len(device_stats):
+        print(f"AVISO: {bands} faixa(s) para {len(device_stats)} placas "
+              f"(menos de 2 por placa): cada placa ainda paga a FASE 2 "
+              f"descartável e a divisão não deve ganhar de 1 placa")
+
+
+def print_compression_report(device_stats):
+    """Exibe a razão de compressão do link (texto / bytes transmitidos)."""
+    phases = [p for s in device_stats for p in s['phases']]
+    sent = sum(p['bytes_sent'] for p in phases)
+    sent_text = sum(p['bytes_sent_text'] for p in phases)
+    recv = sum(p['bytes_received'] for p in phases)
+    recv_text = sum(p['bytes_received_text'] for p in phases)
+
+    print(f"\n{'='*50}")
+    print("COMPRESSÃO DO LINK")
+    print(f"{'='*50}")
+    print(f"Envio:    {sent_text} → {sent} bytes "
+          f"({sent_text / max(sent, 1):.2f}x)")
+    print(f"Recepção: {recv_text} → {recv} bytes "
+          f"({recv_text / max(recv, 1):.2f}x)")
+
+
+def summarize_phase(record, t0, baudrate):
+    """
+    Converte um registro de fase em métricas de telemetria.
+
+    Args:
+        record: Registro criado por new_phase_record()
+        t0: Instante de referência (início da execução)
+        baudrate: Baudrate configurado
+
+    Returns:
+        dict: Métricas da fase (tempos em segundos)
+    """
+    def since(start, end):
+        if start is None or end is None:
+            return None
+        return round(end - start, 6)
+
+    row_times = record['row_times']
+    last_row_at = row_times[-1] if row_times else None
+    useful = record['useful_rows']
+
+    summary = {
+        'port': record['port'],
+        'phase': record['phase'],
+        'useful_rows': [useful[0], useful[-1]] if useful else None,
+        'rows_sent': record['rows_sent'],
+        'rows_received': record['rows_received'],
+        'rows_rejected': record['rows_rejected'],
+        'device_messages': record['device_messages'],
+        'resync': record['resync'],
+        'bytes_sent': record['bytes_sent'],
+        'bytes_received': record['bytes_received'],
+        'bytes_sent_text': record['bytes_sent_text'],
+        'bytes_received_text': record['bytes_received_text'],
+        'start_offset': since(t0, record['handshake_at'] or record['started_at']),
+        'handshake_ready_wait': since(record['handshake_at'], record['ready_at']),
+        'handshake_latency': since(record['handshake_at'], record['started_at']),
+        'send_time': since(record['started_at'], record['send_done_at']),
+        'header_wait': since(record['send_done_at'], record['header_at']),
+        'first_byte_wait': since(record['send_done_at'], record['first_byte_at']),
+        'first_byte_to_last_row': since(record['first_byte_at'], last_row_at),
+        'duration': since(record['handshake_at'] or record['started_at'],
+                          last_row_at),
+    }
+
+    # Taxas efetivas frente ao baudrate configurado. O write() volta antes
+    # de os bytes saírem, então a subida vai até a primeira resposta da
+    # placa, descontado o HAL_Delay() do firmware antes dela (como em
+    # device_planner.calibrate_phases())
+    wait, delay = ((summary['header_wait'], DELAY_BEFORE_HEADER)
+                   if record['phase'] == 1
+                   else (summary['first_byte_wait'], DELAY_BEFORE_PHASE2))
+    upload_time = None
+    if summary['send_time'] is not None and wait is not None:
+        upload_time = summary['send_time'] + wait - delay
+        if upload_time <= 0:
+            upload_time = None
+    summary['upload_time'] = round(upload_time, 6) if upload_time else None
+    rx_time = summary['first_byte_to_last_row']
+    tx_bps = (record['bytes_sent'] * BITS_PER_BYTE / upload_time
+              if upload_time and record['bytes_sent'] else None)
+    rx_bps = (record['bytes_received'] * BITS_PER_BYTE / rx_time
+              if rx_time else None)
+    summary['tx_bps'] = round(tx_bps, 1) if tx_bps else None
+    summary['rx_bps'] = round(rx_bps, 1) if rx_bps else None
+    summary['tx_link_usage'] = round(tx_bps / baudrate, 4) if tx_bps else None
+    summary['rx_link_usage'] = round(rx_bps / baudrate, 4) if rx_bps else None
+
+    # Intervalos entre linhas recebidas e pausas (stalls), a partir do
+    # primeiro byte das linhas (o HAL_Delay após o cabeçalho não é pausa)
+    rows_start = record['rows_first_byte_at']
+    arrivals = ([rows_start] if rows_start else []) + row_times
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    if gaps:
+        median_gap = statistics.median(gaps)
+        threshold = max(STALL_FACTOR * median_gap, STALL_MIN_GAP)
+        stalls = [{'after_row': i, 'gap': round(g, 6)}
+                  for i, g in enumerate(gaps) if g > threshold]
+        summary['gap_median'] = round(median_gap, 6)
+        summary['gap_max'] = round(max(gaps), 6)
+        summary['stall_threshold'] = round(threshold, 6)
+        summary['stall_time'] = round(
+            sum(st['gap'] - median_gap for st in stalls), 6)
+        summary['stalls'] = stalls
+    return summary
+
+
+def write_telemetry(output_path, run_info, device_stats, t0, baudrate):
+    """
+    Grava a telemetria da execução em JSON.
+
+    Args:
+        output_path: Caminho do arquivo .json
+        run_info: Dados gerais da execução (imagem, portas, modo...)
+        device_stats: Estatísticas retornadas por run_device()
+        t0: Instante de início da transferência (time.monotonic())
+        baudrate: Baudrate configurado
+    """
+    phases = sorted((summarize_phase(p, t0, baudrate)
+                     for s in device_stats for p in s['phases']),
+                    key=lambda p: p['start_offset'] or 0)
+    totals = {
+        key: sum(p[key] for p in phases)
+        for key in ('rows_sent', 'rows_received', 'rows_rejected',
+                    'resync', 'bytes_sent', 'bytes_received',
+                    'bytes_sent_text', 'bytes_received_text')
+    }
+    totals['stall_time'] = round(sum(p.get('stall_time', 0) for p in phases), 6)
+    telemetry = dict(run_info, baudrate=baudrate, totals=totals, phases=phases)
+
+    try:
+        with open(output_path, 'w') as f:
+            json.dump(telemetry, f, indent=2, ensure_ascii=False)
+        print(f"OK Telemetria salva em: {output_path}")
+        return True
+    except OSError as e:
+        print(f"x Erro ao salvar telemetria: {e}")
+        return False
+
+
+def filter_on_devices(connections, image_data, compress=False, verifier=None,
+                      single_run=None):
+    """
+    Filtra a imagem distribuindo as faixas entre as placas conectadas.
+
+    Args:
+        connections: Lista de (nome da porta, serial.Serial)
+        image_data: Linhas da imagem original
+        compress: Usa quadros RAW/DELTA/RLE em vez de texto
+        verifier: StreamVerifier opcional
+        single_run: Execução medida com 1 placa para o relatório de ganho
+            (find_single_board_run())
+
+    Returns:
+        tuple: (header, lista de linhas filtradas, estatísticas por placa)
+
+    Raises:
+        TransferError: com o atributo device_stats (o que foi medido até a
+            falha, para a telemetria)
+    """
+    height = len(image_data)
+    queue = BandQueue(height)
+    results = {}
+    device_stats = [new_device_stats(port) for port, _ in connections]
+
+    if len(connections) == 1:
+        port, ser = connections[0]
+        try:
+            run_device(ser, image_data, queue, results, tag=port,
+                       compress=compress, verifier=verifier, stats=device_stats[0])
+        except TransferError as e:
+            e.device_stats = device_stats
+            raise
+        return device_stats[0]['header'], [results[r] for r in range(height)], \
+            device_stats
+
+    print(f"\nDistribuindo {height} linhas entre {len(connections)} placas...")
+    errors = []
+
+    def worker(index, port, ser):
+        try:
+            run_device(ser, image_data, queue, results, verbose=False, tag=port,
+                       compress=compress, verifier=verifier,
+                       stats=device_stats[index])
+        except (TransferError, serial.SerialException) as e:
+            errors.append(f"{port}: {e}")
+            queue.close()
+
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i, port, ser))
+               for i, (port, ser) in enumerate(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Até o fim de todas as placas, com as FASES 2 descartáveis que
+    # fecham as sessões (não só até a fila esvaziar)
+    elapsed = time.monotonic() - t0
+
+    if errors:
+        error = TransferError('; '.join(errors))
+        error.device_stats = device_stats
+        raise error
+
+    print_fanout_report(device_stats, elapsed, height, single_run)
+    header = next(s['header'] for s in device_stats if s['header'])
+    return header, [results[r] for r in range(height)], device_stats
+
+
 def main():
     """Função principal."""
-    # Verifica argumentos
-    if len(sys.argv) < 2:
-        print("Uso: python3 writer_reader.py <caminho_para_imagem.pgm>")
-        print("\nExemplo:")
-        print(
-            "  python3 writer_reader.py ../../v1-kuwahara/imgs_original/mona_lisa.ascii.pgm")
-        sys.exit(1)
-
-    pgm_file = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description="Envia imagem PGM ao STM32 e recebe o resultado filtrado",
+        epilog="Exemplo: python3 writer_reader.py "
+               "../../v1-kuwahara/imgs_original/mona_lisa.ascii.pgm")
+    parser.add_argument('pgm_file', help="Caminho para a imagem .pgm")
+    parser.add_argument('--port', action='append',
+                        help="Porta serial ou URL (ex.: socket://localhost:7777); "
+                             "repita para usar várias placas")
+    parser.add_argument('--baud', type=int, default=BAUD_RATE,
+                        help=f"Baudrate (padrão: {BAUD_RATE})")
+    parser.add_argument('--compress', action='store_true',
+                        help="Quadros RAW/DELTA/RLE (firmware com WIRE_CODEC)")
+    parser.add_argument('--verify', action='store_true',
+                        help="Confere cada linha com a referência do host")
+    parser.add_argument('--stop-on-mismatch', action='store_true',
+                        help="Interrompe na primeira divergência (implica --verify)")
+    parser.add_argument('--store', choices=FORMATS, default='pgm',
+                        help="Formato da captura gravada (padrão: pgm)")
+    args = parser.parse_args()
+
+    pgm_file = args.pgm_file
 
     # Verifica se arquivo existe
     if not os.path.exists(pgm_file):
@@ -266,7 +1314,6 @@ def main():
 
     # Verifica dimensões
     EXPECTED_SIZE = 90
-    BUFFER_SIZE = 46
 
     if width != EXPECTED_SIZE or height != EXPECTED_SIZE:
         print(
@@ -275,97 +1322,82 @@ def main():
         if response.lower() != 's':
             sys.exit(0)
 
-    # Seleciona porta serial
-    ports = list_serial_ports()
-    if not ports:
-        sys.exit(1)
-
-    port = select_port(ports)
+    # Seleciona porta(s) serial(is)
+    port_names = args.port
+    if not port_names:
+        ports = list_serial_ports()
+        if not ports:
+            sys.exit(1)
+        port_names = [select_port(ports)]
 
-    # Abre conexão serial
+    # Abre conexões seriais
+    connections = []
     try:
-        print(f"\n=== Conectando em {port} (115200 baud) ===")
-        ser = serial.Serial(
-            port=port,
-            baudrate=115200,
-            bytesize=serial.EIGHTBITS,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            timeout=1
-        )
+        for port in port_names:
+            print(f"\n=== Conectando em {port} ({args.baud} baud) ===")
+            connections.append((port, open_serial(port, args.baud)))
         time.sleep(2)  # Aguarda estabilização
         print("OK Conexão estabelecida\n")
 
-        # FASE 1: Envia linhas 0-45 (primeiras 46 linhas)
-        print("=" * 50)
-        print("FASE 1: Enviando primeiras 46 linhas (0-45)")
-        print("        STM32 processará linhas 0-44")
-        print("=" * 50)
-        send_lines(ser, image_data, 0, BUFFER_SIZE - 1)
-
-        # Captura cabeçalho PGM (enviado pelo STM32 após receber FASE 1)
-        header = capture_pgm_header(ser)
-        if not header:
-            print("\nx Erro ao capturar cabeçalho PGM!")
-            ser.close()
-            sys.exit(1)
-
-        # Captura primeiras 45 linhas filtradas (0-44)
-        # Armazenas primeiras 45 linhas filtradas
-        phase1_lines = capture_filtered_lines(ser, 45, "FASE 1")
-        if not phase1_lines:
-            print("\nx Erro ao capturar linhas da FASE 1!")
-            ser.close()
-            sys.exit(1)
-
-        # FASE 2 HANDSHAKE
-        print("\nAguardando pronto para FASE 2 (#READY2#)...")
-        if not wait_for_token(ser, HANDSHAKE_READY):
-            print("x Timeout aguardando READY2. Abortando.")
-            ser.close()
-            sys.exit(1)
-        print("OK Recebido READY2. Enviando GO2.")
-        ser.reset_input_buffer()
-        time.sleep(0.05)
-        ser.write(HANDSHAKE_GO.encode('ascii'))
-        ser.flush()
-        time.sleep(0.05)
+        verifier = None
+        if args.verify or args.stop_on_mismatch:
+            verifier = StreamVerifier(image_data, args.stop_on_mismatch)
 
-        print("\n" + "=" * 50)
-        print("FASE 2: Enviando últimas 46 linhas (44-89)")
-        print("        STM32 processará linhas 45-89")
-        print("        (Linha 44 reenviada para contexto do filtro)")
-        print("=" * 50)
-        send_lines(ser, image_data, 44, height - 1)
-
-        phase2_lines = capture_filtered_lines(ser, 45, "FASE 2")
-        if not phase2_lines:
-            print("\nx Erro ao capturar linhas da FASE 2!")
-            ser.close()
+        started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        output_dir = os.path.join(script_dir, '..', 'Core', 'pgms')
+        run_info = {
+            'image': pgm_file,
+            'output': None,
+            'started_at': started_at,
+            'ports': port_names,
+            'compress': args.compress,
+        }
+        single_run = None
+        if len(connections) > 1:
+            single_run = find_single_board_run(output_dir, pgm_file,
+                                               args.compress, args.baud)
+        t0 = time.monotonic()
+        try:
+            header, all_lines, device_stats = filter_on_devices(
+                connections, image_data, args.compress, verifier, single_run)
+            total_time = time.monotonic() - t0
+        except TransferError as e:
+            print(f"\nx {e}")
+            # Telemetria do que foi medido até a falha, sem imagem
+            run_info.update(error=str(e),
+                            total_time=round(time.monotonic() - t0, 6))
+            if verifier is not None:
+                run_info['verify'] = verifier.summary()
+            os.makedirs(output_dir, exist_ok=True)
+            write_telemetry(os.path.join(output_dir, f"failed_{timestamp}.json"),
+                            run_info, getattr(e, 'device_stats', []), t0, args.baud)
+            for _, ser in connections:
+                ser.close()
             sys.exit(1)
 
         print("\n" + "=" * 50)
         print("OK PROCESSAMENTO COMPLETO")
         print("=" * 50)
 
-        # Combina todas as linhas (45 + 45 = 90)
-        all_lines = phase1_lines + phase2_lines
+        if args.compress:
+            print_compression_report(device_stats)
+        if verifier is not None:
+            print_verify_report(verifier.summary())
 
         # Monta dicionário da imagem
         filtered_image = {
             'width': header['width'],
-            'height': header['height'],
+            'height': height,
             'max_val': header['max_val'],
             'data': all_lines
         }
 
         # Gera nome do arquivo com timestamp
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        output_filename = f"filtered_{timestamp}.pgm"
+        output_filename = with_format(f"filtered_{timestamp}.pgm", args.store)
 
         # Salva na pasta Core/pgms (relativo ao script)
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        output_dir = os.path.join(script_dir, '..', 'Core', 'pgms')
         os.makedirs(output_dir, exist_ok=True)  # Cria pasta se não existir
         output_path = os.path.join(output_dir, output_filename)
 
@@ -380,15 +1412,23 @@ def main():
         else:
             print("\nx Erro ao salvar arquivo.")
 
-        ser.close()
+        run_info.update(output=output_path, total_time=round(total_time, 6))
+        if verifier is not None:
+            run_info['verify'] = verifier.summary()
+        write_telemetry(os.path.join(output_dir, pgm_stem(output_path) + '.json'),
+                        run_info, device_stats, t0, args.baud)
+
+        for _, ser in connections:
+            ser.close()
 
     except serial.SerialException as e:
         print(f"\nERRO na comunicação serial: {e}")
         sys.exit(1)
     except KeyboardInterrupt:
         print("\n\nInterrompido pelo usuário!")
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
+        for _, ser in connections:
+            if ser.is_open:
+                ser.close()
         sys.exit(0)
 
 